@@ -0,0 +1,152 @@
+"""
+Generators for synthetic axr_options.ltx and settings.json files, shaped like the real ones:
+several sections, sorted and column aligned settings, namespaced mod/sub/key names and empty values.
+Run with: python -m benchmarks.generate <directory> [line_count] [overlap]
+"""
+
+import json
+import os
+import random
+import sys
+from typing import Any, Iterator
+
+INDENTATION = " " * 8
+NAME_COLUMN_WIDTH = 32  # The game pads names to this width before the =
+REAL_FILE_LINE_COUNT = 3192
+
+MODS = [
+    "3d_scopes", "EA_settings", "SMR", "arti_jamming", "beefs_nvgs", "fddar", "fftd",
+    "free_zoom", "gamma_walk_speed", "npe_module", "scop", "skill_system", "ssfx_module",
+    "zzz_player_injuries",
+]
+SUB_SECTIONS = ["ao", "bpcfg", "ftcfg", "gen", "il", "parallax", "shadows", "smr_loot", "ssr", "water"]
+KEYS = [
+    "enable", "quality_mcm", "cost_coef", "mapmpm", "zone_mode", "ammo_spawn", "meds_spawn",
+    "lod_max_mcm", "exposure_mcm", "intensity_mcm", "key_bind_toggle", "ads_mult",
+]
+OTHER_SECTIONS = ["modded_exes", "options", "pda_encyclopedia", "temp", "xrs_debug_tools"]
+
+
+def format_setting_line(name: str, value: str) -> str:
+    """Formats a setting line the way the game writes it, with an empty value written as 'name ='."""
+    line = f"{INDENTATION}{name:<{NAME_COLUMN_WIDTH}} ="
+    return f"{line} {value}\n" if value else f"{line}\n"
+
+
+def random_value(rng: random.Random) -> str:
+    return rng.choice(
+        [
+            "true",
+            "false",
+            str(rng.randint(-1, 500)),
+            f"{rng.random() * 4:.2f}",
+            "",
+            f"DIK_{rng.choice('ABCDEFGHIJ')}",
+        ]
+    )
+
+
+def generate_mcm_names(count: int, seed: int = 0) -> list[str]:
+    """Returns count unique, sorted, namespaced setting names like 'mod/sub/key' and 'mod/key'."""
+    rng = random.Random(seed)
+    names: set[str] = set()
+    while len(names) < count:
+        mod = rng.choice(MODS)
+        key = f"{rng.choice(KEYS)}_{rng.randint(0, count)}"
+        if rng.random() < 0.7:
+            names.add(f"{mod}/{rng.choice(SUB_SECTIONS)}/{key}")
+        else:
+            names.add(f"{mod}/{key}")
+
+    return sorted(names)
+
+
+def generate_options_lines(line_count: int = REAL_FILE_LINE_COUNT, seed: int = 0) -> Iterator[str]:
+    """
+    Yields the lines of a synthetic axr_options.ltx with about line_count lines.
+    Like the real file, about 60% of the lines are in the [mcm] section.
+    """
+    rng = random.Random(seed)
+
+    yield "[character_creation]\n"
+    for i in range(20):
+        yield format_setting_line(f"new_game_setting_{i:02d}", "")
+    yield " \n"
+    yield "[global_keybinds]\n"
+    yield format_setting_line("debug_demo_record", "DIK_NUMPAD0")
+    yield " \n"
+
+    remaining_lines = max(line_count - 25 - 2 * len(OTHER_SECTIONS), 2)
+    mcm_count = max(remaining_lines * 6 // 10, 1)
+
+    yield "[mcm]\n"
+    for name in generate_mcm_names(mcm_count, seed):
+        yield format_setting_line(name, random_value(rng))
+    yield " \n"
+
+    other_count = (remaining_lines - mcm_count) // len(OTHER_SECTIONS)
+    for section in OTHER_SECTIONS:
+        yield f"[{section}]\n"
+        for i in range(other_count):
+            yield format_setting_line(f"{section}_option_{i:07d}", random_value(rng))
+        yield " \n"
+
+
+def generate_user_settings(
+    default_mcm_names: list[str], count: int, overlap: float, seed: int = 0
+) -> dict[str, Any]:
+    """
+    Returns count user settings where the overlap fraction (0 to 1) are names from the default file
+    and the rest are new settings.
+    """
+    rng = random.Random(seed)
+    existing_count = min(round(count * overlap), len(default_mcm_names))
+    names = rng.sample(default_mcm_names, existing_count) + [
+        f"zz_new_mod/setting_{i}" for i in range(count - existing_count)
+    ]
+
+    return {
+        name: rng.choice([True, False, rng.randint(0, 100), round(rng.random(), 2), "value"])
+        for name in names
+    }
+
+
+def write_benchmark_files(
+    directory: str, line_count: int, overlap: float = 0.9, user_setting_count: int = 100, seed: int = 0
+) -> None:
+    """
+    Writes axr_options.ltx, axr_options_saved.ltx and settings.json to directory.
+    The saved file is the default file with the user settings applied. Raises OSError on failure.
+    """
+    lines = list(generate_options_lines(line_count, seed))
+    mcm_start = lines.index("[mcm]\n") + 1
+    mcm_end = lines.index(" \n", mcm_start)
+    mcm_names = [line.split("=", 1)[0].strip() for line in lines[mcm_start:mcm_end]]
+    user_settings = generate_user_settings(mcm_names, user_setting_count, overlap, seed)
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "axr_options.ltx"), "w") as default_file:
+        default_file.writelines(lines)
+
+    with open(os.path.join(directory, "axr_options_saved.ltx"), "w") as saved_file:
+        for line in lines:
+            name = line.split("=", 1)[0].strip()
+            if "=" in line and name in user_settings:
+                value = user_settings[name]
+                line = format_setting_line(name, str(value).lower() if isinstance(value, bool) else str(value))
+            saved_file.write(line)
+
+    with open(os.path.join(directory, "settings.json"), "w") as settings_file:
+        json.dump(user_settings, settings_file, indent=4)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m benchmarks.generate <directory> [line_count] [overlap]")
+        sys.exit(1)
+
+    write_benchmark_files(
+        sys.argv[1],
+        int(sys.argv[2]) if len(sys.argv) > 2 else REAL_FILE_LINE_COUNT,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 0.9,
+    )
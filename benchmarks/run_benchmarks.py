@@ -0,0 +1,316 @@
+"""
+Benchmarks for the parsing, merging and diffing of options files, on generated files of several sizes.
+Run with: python -m benchmarks.run_benchmarks [--sizes 3192 100000 1000000] [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.ltx_document import LtxDocument, MCM_SECTION
+from benchmarks.generate import REAL_FILE_LINE_COUNT, write_benchmark_files
+
+INPUT_FILE_NAMES = ["axr_options.ltx", "axr_options_saved.ltx", "settings.json"]
+# Parse, merge, diff and the whole pipeline, timed by the performance gate of tests/run_tests.py --perf
+PERF_BENCHMARKS = [
+    "LtxDocument_from_file",
+    "merge_settings",
+    "create_json_file_from_user_and_default_settings_diff",
+    "main",
+]
+PERF_SIZES = [REAL_FILE_LINE_COUNT, 30_000]
+# Small files are timed until this much time has passed, so their median isn't one noisy run
+PERF_MIN_TOTAL_SECONDS = 1.0
+# Slowdowns smaller than this are timer noise on the smallest files, not regressions
+MIN_REGRESSION_SECONDS = 0.002
+# The whole pipeline writes files, backups and caches, so its runs vary by more than the in-memory benchmarks
+MIN_REGRESSION_SECONDS_BY_BENCHMARK = {"main": 0.025}
+
+
+class BenchmarkContext:
+    """Generated input files of one size, loaded once and shared by every benchmark."""
+
+    def __init__(self, directory: str, line_count: int, overlap: float):
+        self.directory = directory
+        self.input_directory = os.path.join(directory, "input")
+        self.work_directory = os.path.join(directory, "work")
+        self.line_count = line_count
+
+        write_benchmark_files(self.input_directory, line_count, overlap)
+        self.default_path = os.path.join(self.input_directory, "axr_options.ltx")
+        with open(self.default_path, "r") as default_file:
+            self.default_lines = default_file.readlines()
+        with open(self.default_path, "rb") as default_file:
+            self.default_bytes = default_file.read()
+        with open(os.path.join(self.input_directory, "axr_options_saved.ltx"), "r") as saved_file:
+            self.saved_lines = saved_file.readlines()
+        with open(os.path.join(self.input_directory, "settings.json"), "r") as settings_file:
+            self.user_settings = json.load(settings_file)
+
+        self.mcm_lines, _, _ = mcm_manager.get_settings_section(self.default_lines, "[mcm]\n")
+        self.mcm_bytes = "".join(self.mcm_lines).encode()
+
+    def reset_work_directory(self):
+        """Gives the full pipeline a fresh copy of the inputs, without backups or caches from earlier runs."""
+        shutil.rmtree(self.work_directory, ignore_errors=True)
+        os.makedirs(self.work_directory)
+        for file_name in INPUT_FILE_NAMES:
+            shutil.copy(
+                os.path.join(self.input_directory, file_name),
+                os.path.join(self.work_directory, file_name),
+            )
+
+
+class Benchmark:
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[BenchmarkContext], Any],
+        before_each: Callable[[BenchmarkContext], Any] | None = None,
+    ):
+        self.name = name
+        self.run = run
+        self.before_each = before_each  # Untimed setup before every repetition
+
+
+def read_document_from_lines(context: BenchmarkContext) -> LtxDocument:
+    """Reads the default file in text mode and indexes it line by line, then tokenizes its [mcm] section."""
+    with open(context.default_path, "r") as default_file:
+        document = LtxDocument(default_file.readlines())
+    document.settings(MCM_SECTION)
+    return document
+
+
+def read_document_from_file(context: BenchmarkContext) -> LtxDocument:
+    """Reads the default file as bytes and indexes it with the ltx_tokenizer, then tokenizes its [mcm] section."""
+    document = LtxDocument.from_file(context.default_path)
+    document.settings(MCM_SECTION)
+    return document
+
+
+def run_full_pipeline(context: BenchmarkContext):
+    with contextlib.redirect_stdout(io.StringIO()):
+        mcm_manager.main([context.work_directory, "--no-cache"])
+
+
+BENCHMARKS = [
+    Benchmark(
+        "get_settings_section",
+        lambda context: mcm_manager.get_settings_section(context.default_lines, "[mcm]\n"),
+    ),
+    Benchmark(
+        "get_settings_section_bytes",
+        lambda context: mcm_manager.get_settings_section(context.default_bytes, "[mcm]\n"),
+    ),
+    Benchmark(
+        "parse_settings_from_lines",
+        lambda context: mcm_manager.parse_settings_from_lines(context.mcm_lines),
+    ),
+    Benchmark(
+        "parse_settings_from_bytes",
+        lambda context: mcm_manager.parse_settings_from_lines(context.mcm_bytes),
+    ),
+    Benchmark("LtxDocument_read_lines", read_document_from_lines),
+    Benchmark("LtxDocument_from_file", read_document_from_file),
+    Benchmark(
+        "LtxDocument_default_and_saved",
+        lambda context: (LtxDocument(context.default_lines), LtxDocument(context.saved_lines)),
+    ),
+    Benchmark(
+        "merge_settings",
+        lambda context: mcm_manager.merge_settings(context.default_lines, context.user_settings),
+    ),
+    Benchmark(
+        "create_json_file_from_user_and_default_settings_diff",
+        lambda context: mcm_manager.create_json_file_from_user_and_default_settings_diff(
+            context.default_lines, context.saved_lines, context.directory
+        ),
+    ),
+    Benchmark("main", run_full_pipeline, lambda context: context.reset_work_directory()),
+]
+
+
+def measure(
+    benchmark: Benchmark,
+    context: BenchmarkContext,
+    repeat: int,
+    trace_memory: bool = True,
+    min_total_seconds: float = 0.0,
+) -> dict[str, Any]:
+    """
+    Times repeat runs of a benchmark, or more until the runs took min_total_seconds, then runs it once more under
+    tracemalloc for its peak memory unless trace_memory is off, in which case the peak memory is reported as 0.
+    """
+    timings: list[float] = []
+    while len(timings) < repeat or sum(timings) < min_total_seconds:
+        if benchmark.before_each:
+            benchmark.before_each(context)
+        started_at = time.perf_counter()
+        benchmark.run(context)
+        timings.append(time.perf_counter() - started_at)
+
+    peak_memory = 0
+    if trace_memory:
+        if benchmark.before_each:
+            benchmark.before_each(context)
+        tracemalloc.start()
+        try:
+            benchmark.run(context)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    median_seconds = statistics.median(timings)
+    return {
+        "benchmark": benchmark.name,
+        "lines": context.line_count,
+        "repeat": len(timings),
+        "median_seconds": median_seconds,
+        "min_seconds": min(timings),
+        "ops_per_second": 1 / median_seconds if median_seconds else float("inf"),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run_benchmarks(
+    sizes: list[int],
+    repeat: int,
+    overlap: float,
+    names: list[str] | None = None,
+    trace_memory: bool = True,
+    min_total_seconds: float = 0.0,
+) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+    benchmarks = [benchmark for benchmark in BENCHMARKS if not names or benchmark.name in names]
+
+    for line_count in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            context = BenchmarkContext(directory, line_count, overlap)
+            for benchmark in benchmarks:
+                result = measure(benchmark, context, repeat, trace_memory, min_total_seconds)
+                print_result(result)
+                results.append(result)
+
+    return results
+
+
+def print_result(result: dict[str, Any], previous: dict[str, Any] | None = None):
+    line = (
+        f"{result['benchmark']:<55} {result['lines']:>9} lines "
+        f"{result['median_seconds'] * 1000:>11.3f} ms {result['ops_per_second']:>11.2f} ops/s "
+        f"{result['peak_memory_bytes'] / 1024 / 1024:>9.2f} MiB peak"
+    )
+    if previous:
+        line += f"  ({result['median_seconds'] / previous['median_seconds']:.2f}x time of previous run)"
+    print(line)
+
+
+def compare_results(results: list[dict[str, Any]], previous_results: list[dict[str, Any]]):
+    previous_by_key = {(result["benchmark"], result["lines"]): result for result in previous_results}
+
+    print("Compared to previous run:")
+    for result in results:
+        previous = previous_by_key.get((result["benchmark"], result["lines"]))
+        if previous:
+            print_result(result, previous)
+
+
+def find_regressions(
+    results: list[dict[str, Any]],
+    baseline_results: list[dict[str, Any]],
+    threshold: float,
+    min_seconds: float | None = None,
+) -> list[tuple[dict[str, Any], dict[str, Any]]]:
+    """
+    Returns (result, baseline result) of every result whose fastest run is more than threshold, e.g. 0.25 for
+    25%, and at least min_seconds slower than the same benchmark and size in the baseline. min_seconds defaults
+    to the noise floor of the benchmark. The fastest run is compared rather than the median, since noise only
+    ever makes a run slower. Results without a baseline aren't regressions.
+    """
+    baseline_by_key = {(result["benchmark"], result["lines"]): result for result in baseline_results}
+
+    regressions = []
+    for result in results:
+        baseline = baseline_by_key.get((result["benchmark"], result["lines"]))
+        noise_seconds = (
+            min_seconds
+            if min_seconds is not None
+            else MIN_REGRESSION_SECONDS_BY_BENCHMARK.get(result["benchmark"], MIN_REGRESSION_SECONDS)
+        )
+        if (
+            baseline
+            and result["min_seconds"] > baseline["min_seconds"] * (1 + threshold)
+            and result["min_seconds"] - baseline["min_seconds"] >= noise_seconds
+        ):
+            regressions.append((result, baseline))
+
+    return regressions
+
+
+def write_results(output_path: str, results: list[dict[str, Any]]):
+    """Writes results to a json file along with when and where they were measured. Raises OSError on failure."""
+    with open(output_path, "w") as output_file:
+        json.dump(
+            {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.node(),
+                "results": results,
+            },
+            output_file,
+            indent=2,
+        )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark the options file handling.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[REAL_FILE_LINE_COUNT, 100_000, 1_000_000],
+        help="Line counts of the generated options files.",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark.")
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=0.9,
+        help="Fraction of the user settings that exist in the default file.",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        dest="names",
+        help="Only run this benchmark. Can be given several times.",
+    )
+    parser.add_argument("--output", help="Write the results to this json file.")
+    parser.add_argument("--compare", help="Results json of an earlier run to compare with.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat, args.overlap, args.names)
+
+    if args.output:
+        write_results(args.output, results)
+
+    if args.compare:
+        with open(args.compare, "r") as previous_file:
+            compare_results(results, json.load(previous_file)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import IO, Any, Callable
+from classes.compression import COMPRESSORS, FAST_LEVEL
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupEntry:
+    def __init__(self, hash: str, timestamp: str, size: int, compression: str):
+        self.hash = hash
+        self.timestamp = timestamp
+        self.size = size
+        self.compression = compression
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.hash}.ltx.{self.compression}"
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.strptime(self.timestamp, TIMESTAMP_FORMAT)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "hash": self.hash,
+            "timestamp": self.timestamp,
+            "size": self.size,
+            "compression": self.compression,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "BackupEntry":
+        return cls(data["hash"], data["timestamp"], data["size"], data["compression"])
+
+    def __repr__(self):
+        return f"{self.timestamp}  {self.hash[:12]}  {self.size} bytes"
+
+
+class BackupStore:
+    """
+    Content addressed backups of axr_options.ltx.
+
+    Every snapshot is stored compressed under the sha256 of its contents, so identical snapshots are only stored once.
+    index.json lists the snapshots, oldest first, so listing never has to open the snapshots themselves.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, directory: str, compression: str = "xz"):
+        if compression not in COMPRESSORS:
+            raise ValueError(
+                f"Unknown compression {compression}. Must be one of {', '.join(COMPRESSORS)}."
+            )
+
+        self.directory = directory
+        self.compression = compression
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, self.INDEX_FILE_NAME)
+
+    def entries(self) -> list[BackupEntry]:
+        """Returns all snapshots in the store, oldest first."""
+        if not os.path.exists(self.index_path):
+            return []
+
+        with open(self.index_path, "r") as index_file:
+            return [BackupEntry.from_dict(entry) for entry in json.load(index_file)]
+
+    def snapshot_file(self, source_path: str, timestamp: str) -> BackupEntry | None:
+        """
+        Stores a snapshot of the file at source_path. Returns None if a snapshot with the same contents already exists,
+        that snapshot is then moved to timestamp, so retention keeps it as one of the newest. Raises OSError on failure.
+        """
+        content_hash, size = hash_file(source_path)
+        entries = self.entries()
+        stored = next((entry for entry in entries if entry.hash == content_hash), None)
+        if stored is not None:
+            stored.timestamp = timestamp
+            self._write_index([entry for entry in entries if entry is not stored] + [stored])
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        entry = BackupEntry(content_hash, timestamp, size, self.compression)
+
+        with open(source_path, "rb") as source:
+            self._write_atomically(
+                os.path.join(self.directory, entry.file_name),
+                lambda file: self._compress(source, file),
+            )
+
+        self._write_index(entries + [entry])
+        return entry
+
+    def find(self, reference: str) -> BackupEntry:
+        """
+        Returns the snapshot matching reference, which is a hash prefix or a timestamp prefix, e.g. 20250101.
+        The newest snapshot is used if a timestamp prefix matches several. Raises ValueError if nothing matches,
+        or if a hash prefix is ambiguous.
+        """
+        entries = self.entries()
+
+        hash_matches = [entry for entry in entries if entry.hash.startswith(reference)]
+        if len(hash_matches) > 1:
+            raise ValueError(f"Backup hash {reference} is ambiguous.")
+        if hash_matches:
+            return hash_matches[0]
+
+        timestamp_matches = [
+            entry for entry in entries if entry.timestamp.startswith(reference)
+        ]
+        if timestamp_matches:
+            return timestamp_matches[-1]
+
+        raise ValueError(f"No backup matches {reference}.")
+
+    def restore(self, reference: str, destination_path: str) -> BackupEntry:
+        """
+        Unpacks the snapshot matching reference to destination_path. Only that snapshot is read.
+        Raises ValueError if no snapshot matches and OSError on failure.
+        """
+        entry = self.find(reference)
+
+        with COMPRESSORS[entry.compression](
+            os.path.join(self.directory, entry.file_name), "rb"
+        ) as snapshot:
+            self._write_atomically(
+                destination_path, lambda file: shutil.copyfileobj(snapshot, file, CHUNK_SIZE)
+            )
+
+        return entry
+
+    def read_snapshot(self, entry: BackupEntry) -> bytes:
+        """Returns the uncompressed contents of a snapshot. Raises OSError on failure."""
+        with COMPRESSORS[entry.compression](os.path.join(self.directory, entry.file_name), "rb") as snapshot:
+            return snapshot.read()
+
+    def apply_retention(
+        self, keep_last: int, keep_daily: int, keep_weekly: int
+    ) -> list[BackupEntry]:
+        """
+        Removes snapshots that aren't kept by any of the rules, returning the removed snapshots.
+        Kept are the keep_last newest snapshots, plus the newest snapshot of each of the keep_daily latest days,
+        plus the newest snapshot of each of the keep_weekly latest weeks.
+        """
+        entries = self.entries()
+        if len(entries) <= keep_last:
+            # Every snapshot is one of the last ones, without going through the dates
+            return []
+
+        newest_first = sorted(entries, key=lambda entry: entry.timestamp, reverse=True)
+
+        kept_hashes = {entry.hash for entry in newest_first[:keep_last]}
+        for keep_count, period in [
+            (keep_daily, lambda entry: entry.created_at.date()),
+            (keep_weekly, lambda entry: entry.created_at.isocalendar()[:2]),
+        ]:
+            seen_periods: set[Any] = set()
+            for entry in newest_first:
+                if len(seen_periods) >= keep_count:
+                    break
+                if period(entry) not in seen_periods:
+                    seen_periods.add(period(entry))
+                    kept_hashes.add(entry.hash)
+
+        removed = [entry for entry in entries if entry.hash not in kept_hashes]
+        if not removed:
+            return []
+
+        self._write_index([entry for entry in entries if entry.hash in kept_hashes])
+        for entry in removed:
+            os.remove(os.path.join(self.directory, entry.file_name))
+
+        return removed
+
+    def _compress(self, source: IO[bytes], destination: IO[bytes]):
+        # Fast level, a backup is written on every run and rarely read
+        with COMPRESSORS[self.compression](destination, "wb", FAST_LEVEL) as compressed:
+            shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+
+    def _write_index(self, entries: list[BackupEntry]):
+        contents = json.dumps([entry.to_dict() for entry in entries], indent=2)
+        self._write_atomically(self.index_path, lambda file: file.write(contents.encode()))
+
+    def _write_atomically(self, path: str, write: Callable[[IO[bytes]], Any]):
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(os.path.abspath(path)), delete=False
+        ) as file:
+            try:
+                write(file)
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+
+        if os.path.exists(path):
+            shutil.copymode(path, file.name)
+        os.replace(file.name, path)
+
+
+def hash_file(path: str) -> tuple[str, int]:
+    """Returns the sha256 hex digest and size of the file at path. Raises OSError on failure."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return digest.hexdigest(), size
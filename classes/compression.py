@@ -0,0 +1,84 @@
+import contextlib
+import io
+import locale
+from typing import IO, Callable, Iterator
+
+# Level for files written on every run, like backups, where speed matters more than a few KiB.
+# xz at level 1 packs an options file about 12x faster than at its default level 6, for about 20% more bytes
+FAST_LEVEL = 1
+
+
+def open_xz(file, mode: str = "rb", level: int | None = None) -> IO[bytes]:
+    """Opens an xz file like lzma.open, at level when writing or lzma's default level if it is None."""
+    import lzma  # Only imported once a file is compressed, most runs never need it
+
+    return lzma.open(file, mode, preset=level if "w" in mode else None)
+
+
+def open_gz(file, mode: str = "rb", level: int | None = None) -> IO[bytes]:
+    """Opens a gz file like gzip.open, at level when writing or gzip's default level if it is None."""
+    import gzip  # Only imported once a file is compressed, most runs never need it
+
+    return gzip.open(file, mode, compresslevel=9 if level is None else level)
+
+
+COMPRESSORS: dict[str, Callable[..., IO[bytes]]] = {
+    "xz": open_xz,
+    "gz": open_gz,
+}
+MAGIC_BYTES = {
+    "xz": b"\xfd7zXZ\x00",
+    "gz": b"\x1f\x8b",
+}
+MAGIC_LENGTH = max(len(magic) for magic in MAGIC_BYTES.values())
+
+
+def detect_compression(path: str) -> str | None:
+    """
+    Returns "gz" or "xz" if the file at path is compressed, going by its first bytes and not its name, or None.
+    Raises OSError on failure.
+    """
+    with open(path, "rb") as file:
+        head = file.read(MAGIC_LENGTH)
+
+    for compression, magic in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+
+    return None
+
+
+def open_input(path: str, mode: str = "r") -> IO:
+    """
+    Opens a file for reading like open, decompressing it while it is read if it is gz or xz compressed. Only a
+    buffer of the decompressed data is held at a time, so a compressed file can be streamed line by line without
+    unpacking it first. Raises OSError on failure.
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, mode)
+
+    decompressed = COMPRESSORS[compression](path, "rb")
+    if "b" in mode:
+        return decompressed
+
+    return io.TextIOWrapper(decompressed, encoding=locale.getpreferredencoding(False))
+
+
+@contextlib.contextmanager
+def output_stream(file: IO[bytes], compression: str | None, text: bool = True) -> Iterator[IO]:
+    """
+    Gives a file object writing to the binary file, compressing if compression is "gz" or "xz". Text is written
+    like a file opened with open(path, "w"). file is left open, with everything written to it.
+    """
+    stream = COMPRESSORS[compression](file, "wb") if compression else file
+    wrapper = io.TextIOWrapper(stream, encoding=locale.getpreferredencoding(False)) if text else None
+    try:
+        yield wrapper if wrapper is not None else stream
+    finally:
+        if wrapper is not None:
+            # Flushes what is left, closing the wrapper would close file as well
+            wrapper.detach()
+        if compression:
+            # Writes the end of the compressed data, file itself stays open
+            stream.close()
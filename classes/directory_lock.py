@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class DirectoryLock:
+    """
+    Exclusive lock on a directory, held by locking a lock file in it with flock, or msvcrt.locking on Windows.
+    Used so two processes never write the same axr_options.ltx at the same time. Threads of one process first
+    wait for each other on a thread lock per directory, so only one of them polls the lock file.
+
+    The system releases the lock when the process holding it ends, so a lock file left by a killed process
+    doesn't lock anything. The lock file holds the pid of the process holding the lock and is removed on release.
+
+    Example:
+        with DirectoryLock(path):
+            ...
+    """
+
+    LOCK_FILE_NAME = ".mcm_manager.lock"
+
+    _thread_locks: dict[str, threading.Lock] = {}
+    _thread_locks_lock = threading.Lock()
+
+    def __init__(self, directory: str, timeout: float = 60, poll_interval: float = 0.05):
+        self.lock_path = os.path.join(directory, self.LOCK_FILE_NAME)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        with self._thread_locks_lock:
+            self._thread_lock = self._thread_locks.setdefault(
+                os.path.abspath(self.lock_path), threading.Lock()
+            )
+
+    def acquire(self):
+        """Waits until the lock is free and takes it. Raises TimeoutError if it isn't freed within timeout."""
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=max(self.timeout, 0)):
+            raise TimeoutError(
+                f"Could not lock {os.path.dirname(self.lock_path)}, it is in use by another thread."
+            )
+
+        try:
+            self._acquire_file(deadline)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def _acquire_file(self, deadline: float):
+        while True:
+            file_descriptor = os.open(self.lock_path, os.O_CREAT | os.O_RDWR)
+            if _try_lock(file_descriptor):
+                if self._is_lock_file(file_descriptor):
+                    os.ftruncate(file_descriptor, 0)
+                    os.write(file_descriptor, str(os.getpid()).encode())
+                    self._file_descriptor = file_descriptor
+                    return
+                # Released and removed after we opened it, the next holder locks a new lock file
+                _unlock(file_descriptor)
+                os.close(file_descriptor)
+                continue
+
+            os.close(file_descriptor)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Could not lock {os.path.dirname(self.lock_path)}, it is in use by another process."
+                )
+            time.sleep(self.poll_interval)
+
+    def _is_lock_file(self, file_descriptor: int) -> bool:
+        try:
+            return os.path.samestat(os.fstat(file_descriptor), os.stat(self.lock_path))
+        except FileNotFoundError:
+            return False
+
+    def release(self):
+        try:
+            if os.name == "nt":
+                _unlock(self._file_descriptor)
+                os.close(self._file_descriptor)
+                try:
+                    os.remove(self.lock_path)
+                except PermissionError:
+                    # Windows can't remove a file another process has open, it stays for that process to lock
+                    pass
+            else:
+                # Removed while still locked, so a process that opened it before sees it is gone once it locks it
+                os.remove(self.lock_path)
+                _unlock(self._file_descriptor)
+                os.close(self._file_descriptor)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self) -> "DirectoryLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+
+def _try_lock(file_descriptor: int) -> bool:
+    """Locks an open lock file without waiting. Returns False if another process holds the lock."""
+    try:
+        if os.name == "nt":
+            msvcrt.locking(file_descriptor, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(file_descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+
+    return True
+
+
+def _unlock(file_descriptor: int):
+    if os.name == "nt":
+        # msvcrt.locking works from the current position, which moved when the pid was written
+        os.lseek(file_descriptor, 0, os.SEEK_SET)
+        msvcrt.locking(file_descriptor, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(file_descriptor, fcntl.LOCK_UN)
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from classes.ltx_document import LtxDocument
+
+CACHED_DOCUMENT_COUNT = 16
+
+
+class DocumentCache:
+    """
+    An LRU cache of parsed options files in memory, keyed by path and mtime, for a long running process that is
+    asked about the same files again and again. Safe to use from several threads.
+
+    A file whose mtime, ctime or size changed is parsed again. Files are loaded outside the lock, so a slow parse
+    doesn't hold up requests for other files. Two threads asking for the same changed file at the same time can
+    both parse it. Whoever writes a cached file should invalidate it, as a write within the mtime granularity of
+    the file system and keeping the size can't be noticed.
+
+    A result computed from a cached document, like a diff, can be kept with it by memoized. It is dropped along
+    with the document, so the cache size bounds the results too.
+    """
+
+    def __init__(
+        self,
+        load_document: Callable[[str], LtxDocument] = LtxDocument.from_file,
+        cached_document_count: int = CACHED_DOCUMENT_COUNT,
+    ):
+        self.load_document = load_document
+        self.cached_document_count = cached_document_count
+        self.hits = 0
+        self.misses = 0
+        # Path to the file's signature, its document and the last result memoized for the document
+        self._documents: OrderedDict[
+            str, tuple[tuple[int, int, int], LtxDocument, dict[Hashable, Any]]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> LtxDocument:
+        """Returns the parsed document of the file at path, parsing it if it isn't cached. Raises OSError on failure."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._documents.get(path)
+            if cached is not None and cached[0] == signature:
+                self._documents.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        document = self.load_document(path)
+
+        with self._lock:
+            self._documents[path] = (signature, document, {})
+            self._documents.move_to_end(path)
+            while len(self._documents) > self.cached_document_count:
+                self._documents.popitem(last=False)
+
+        return document
+
+    def memoized(self, path: str, document: LtxDocument, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Returns compute(), a result of document, the cached document of the file at path. The result is kept with
+        the document, and given again while the document is cached and asked for with the same key. Only the last
+        key is kept per document. A document that is no longer cached for path isn't memoized for.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            cached = self._documents.get(path)
+            if cached is not None and cached[1] is document and key in cached[2]:
+                return cached[2][key]
+
+        result = compute()
+
+        with self._lock:
+            cached = self._documents.get(path)
+            if cached is not None and cached[1] is document:
+                cached[2].clear()
+                cached[2][key] = result
+
+        return result
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._documents.pop(os.path.abspath(path), None)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
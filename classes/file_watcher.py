@@ -0,0 +1,146 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+# inotify(7) events that can mean a watched file changed
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class FileWatcher:
+    """
+    Reports which of a set of files changed, by comparing os.stat results.
+
+    On Linux the watcher sleeps on inotify until something happens in the watched directories; elsewhere,
+    or if inotify isn't available, it polls every poll_interval seconds. Changes are debounced: a burst of
+    events is reported once, after no further change has been seen for debounce seconds.
+    """
+
+    def __init__(self, paths: list[str], debounce: float = 0.5, poll_interval: float = 1.0):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._inotify = _Inotify.create({os.path.dirname(path) for path in self.paths})
+        self._signatures: dict[str, tuple[int, int, int] | None] = {}
+        self.refresh()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def refresh(self, paths: list[str] | None = None):
+        """Takes the current state of the files, or only of paths, as unchanged, e.g. after writing them ourselves."""
+        for path in self.paths if paths is None else map(os.path.abspath, paths):
+            self._signatures[path] = _signature(path)
+
+    def wait_for_changes(self, timeout: float | None = None) -> set[str]:
+        """
+        Blocks until at least one file changed and the changes have settled, returning the changed paths.
+        Returns an empty set if nothing changed within timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed_paths: set[str] = set()
+        last_change_at = 0.0
+
+        while True:
+            now = time.monotonic()
+            if changed_paths:
+                wait_time = max(0.0, last_change_at + self.debounce - now)
+            else:
+                wait_time = self.poll_interval
+                if deadline is not None:
+                    if now >= deadline:
+                        return changed_paths
+                    wait_time = min(wait_time, deadline - now)
+
+            self._wait(wait_time)
+
+            newly_changed = self._changed_paths()
+            if newly_changed:
+                changed_paths |= newly_changed
+                last_change_at = time.monotonic()
+            elif changed_paths and time.monotonic() - last_change_at >= self.debounce:
+                return changed_paths
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _wait(self, seconds: float):
+        if self._inotify is not None:
+            self._inotify.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _changed_paths(self) -> set[str]:
+        changed_paths: set[str] = set()
+        for path in self.paths:
+            signature = _signature(path)
+            if signature != self._signatures[path]:
+                self._signatures[path] = signature
+                changed_paths.add(path)
+
+        return changed_paths
+
+
+class _Inotify:
+    """Minimal ctypes binding of inotify, used only to wake up the watcher early."""
+
+    def __init__(self, libc: ctypes.CDLL, file_descriptor: int):
+        self._libc = libc
+        self.file_descriptor = file_descriptor
+
+    @classmethod
+    def create(cls, directories: set[str]) -> "_Inotify | None":
+        """Returns an inotify instance watching directories, or None if inotify isn't available."""
+        if not sys.platform.startswith("linux"):
+            return None
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            file_descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if file_descriptor < 0:
+            return None
+
+        inotify = cls(libc, file_descriptor)
+        for directory in directories:
+            if libc.inotify_add_watch(file_descriptor, os.fsencode(directory), WATCH_MASK) < 0:
+                inotify.close()
+                return None
+
+        return inotify
+
+    def wait(self, seconds: float):
+        """Waits up to seconds for an event, then discards the pending events."""
+        readable, _, _ = select.select([self.file_descriptor], [], [], seconds)
+        if not readable:
+            return
+
+        try:
+            while os.read(self.file_descriptor, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.file_descriptor)
+
+
+def _signature(path: str) -> tuple[int, int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
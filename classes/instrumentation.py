@@ -0,0 +1,165 @@
+import time
+from typing import Any, Callable
+
+
+class PhaseStats:
+    """Timing, peak memory and counts (e.g. lines, settings) recorded for one phase of a run."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.peak_memory_bytes: int | None = None
+        self.counts: dict[str, int] = {}
+
+    def count(self, **counts: int):
+        """Records counts for the phase, e.g. phase.count(lines=len(lines))."""
+        self.counts.update(counts)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "counts": self.counts,
+        }
+
+
+class _RecordedPhase:
+    def __init__(self, instrumentation: "Instrumentation", name: str):
+        self._instrumentation = instrumentation
+        self.stats = PhaseStats(name)
+
+    def count(self, **counts: int):
+        self.stats.count(**counts)
+
+    def __enter__(self) -> "_RecordedPhase":
+        if self._instrumentation.trace_memory:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.stats.seconds = time.perf_counter() - self._started_at
+        if self._instrumentation.trace_memory:
+            import tracemalloc
+
+            _, self.stats.peak_memory_bytes = tracemalloc.get_traced_memory()
+        self._instrumentation._finish(self.stats)
+
+
+class _NullPhase:
+    """Returned when nothing is recording, so an instrumented phase costs one attribute check."""
+
+    def count(self, **counts: int):
+        pass
+
+    def __enter__(self) -> "_NullPhase":
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+NULL_PHASE = _NullPhase()
+
+
+class Instrumentation:
+    """
+    Records the phases of a run when enabled, or when a collector is registered.
+
+    Peak memory is traced for the whole process, so phases whose memory is recorded have to run one after another.
+    The total is the wall clock time from enabling until the last phase finished, not the sum of the phases.
+
+    Example:
+        with instrumentation.phase("merge") as phase:
+            merged = merge_settings(default, user_settings)
+            phase.count(lines=len(merged))
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.phases: list[PhaseStats] = []
+        self.collectors: list[Callable[[PhaseStats], Any]] = []
+        # Whether enable started tracing memory, tracing an embedding program started is left running
+        self._started_tracing = False
+        self._started_at = 0.0
+        self._last_finished_at = 0.0
+
+    def enable(self, trace_memory: bool = True):
+        """Starts recording phases, including their peak memory if trace_memory is set."""
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory:
+            # Only imported once memory is traced, importing it takes about as long as a small merge
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        self._started_at = self._last_finished_at = time.perf_counter()
+
+    def disable(self):
+        self.enabled = False
+        if self._started_tracing:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.trace_memory = False
+
+    def reset(self):
+        self.phases = []
+        self._started_at = self._last_finished_at = time.perf_counter()
+
+    def total_seconds(self) -> float:
+        """Returns the wall clock time from enabling, or the last reset, until the last recorded phase finished."""
+        return self._last_finished_at - self._started_at if self.phases else 0.0
+
+    def register_collector(self, collector: Callable[[PhaseStats], Any]):
+        """Calls collector with the PhaseStats of every finished phase, e.g. to forward them to another program."""
+        self.collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[PhaseStats], Any]):
+        self.collectors.remove(collector)
+
+    def phase(self, name: str) -> _RecordedPhase | _NullPhase:
+        if not self.enabled and not self.collectors:
+            return NULL_PHASE
+
+        return _RecordedPhase(self, name)
+
+    def _finish(self, stats: PhaseStats):
+        if self.enabled:
+            self.phases.append(stats)
+            self._last_finished_at = time.perf_counter()
+        for collector in self.collectors:
+            collector(stats)
+
+    def summary(self) -> str:
+        """Returns the recorded phases as a table."""
+        rows = [f"{'Phase':<24} {'Time (ms)':>12} {'Peak memory (KiB)':>18}  Counts"]
+        for stats in self.phases:
+            peak_memory = (
+                f"{stats.peak_memory_bytes / 1024:.1f}"
+                if stats.peak_memory_bytes is not None
+                else "-"
+            )
+            counts = ", ".join(f"{name}={value}" for name, value in stats.counts.items())
+            rows.append(
+                f"{stats.name:<24} {stats.seconds * 1000:>12.3f} {peak_memory:>18}  {counts}"
+            )
+        rows.append(f"{'total (wall clock)':<24} {self.total_seconds() * 1000:>12.3f}")
+
+        return "\n".join(rows)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "phases": [stats.to_dict() for stats in self.phases],
+            "total_seconds": self.total_seconds(),
+        }
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,202 @@
+import inspect
+import json
+import os
+import socket
+import socketserver
+import stat
+from typing import Any, Callable
+
+# Error codes of the JSON-RPC 2.0 specification
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+# Server errors, in the range the specification leaves to applications
+INVALID_INPUT = -32000  # A method raised ValueError, e.g. a section is missing
+IO_ERROR = -32001  # A method raised OSError
+
+Address = tuple[str, int] | str  # (host, port), or the path of a Unix socket
+
+
+class JsonRpcError(Exception):
+    """An error response of a JSON-RPC call."""
+
+    def __init__(self, code: int, message: str, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def to_dict(self) -> dict[str, Any]:
+        error: dict[str, Any] = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+class JsonRpcServer:
+    """
+    A JSON-RPC 2.0 server on a local TCP or Unix socket. Requests and responses are single lines of json, so
+    a client can keep its connection open and send requests one after another.
+
+    Every connection is handled in its own thread, so the methods have to be thread safe. A method raising
+    ValueError or OSError is answered with an INVALID_INPUT or IO_ERROR error, and the server keeps running.
+
+    Example:
+        server = JsonRpcServer({"add": lambda a, b: a + b}, ("127.0.0.1", 0))
+        threading.Thread(target=server.serve_forever).start()
+    """
+
+    def __init__(self, methods: dict[str, Callable[..., Any]], address: Address):
+        self.methods = methods
+
+        if isinstance(address, str):
+            if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+                raise OSError("Unix sockets are not supported on this platform, use a port instead")
+            # A socket left behind by a server that didn't shut down cleanly would make binding fail
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.remove(address)
+            self._server: socketserver.BaseServer = _ThreadingUnixServer(address, _RequestHandler)
+        else:
+            self._server = _ThreadingTcpServer(address, _RequestHandler)
+        self._server.json_rpc = self  # type: ignore[attr-defined]
+
+    @property
+    def address(self) -> Address:
+        """The address the server listens on, with the actual port if it was started on port 0."""
+        return self._server.server_address
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stops serve_forever, which has to be running in another thread."""
+        self._server.shutdown()
+
+    def close(self):
+        self._server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def handle_request(self, line: bytes) -> dict[str, Any] | None:
+        """Returns the response to a request line, or None if it is a notification, which has no id."""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error_response(None, JsonRpcError(PARSE_ERROR, "Parse error"))
+
+        if (
+            not isinstance(request, dict)
+            or request.get("jsonrpc") != "2.0"
+            or not isinstance(request.get("method"), str)
+        ):
+            request_id = request.get("id") if isinstance(request, dict) else None
+            return _error_response(request_id, JsonRpcError(INVALID_REQUEST, "Invalid request"))
+
+        try:
+            response = {"jsonrpc": "2.0", "id": request.get("id"), "result": self._call(request)}
+        except JsonRpcError as error:
+            response = _error_response(request.get("id"), error)
+        except ValueError as error:
+            response = _error_response(request.get("id"), JsonRpcError(INVALID_INPUT, str(error)))
+        except OSError as error:
+            response = _error_response(request.get("id"), JsonRpcError(IO_ERROR, str(error)))
+        except Exception as error:
+            # A bug in one method shouldn't take down the server
+            print(f"{request['method']} failed.", repr(error))
+            response = _error_response(request.get("id"), JsonRpcError(INTERNAL_ERROR, repr(error)))
+
+        return response if "id" in request else None
+
+    def _call(self, request: dict[str, Any]) -> Any:
+        method = self.methods.get(request["method"])
+        if method is None:
+            raise JsonRpcError(METHOD_NOT_FOUND, f"Method {request['method']} not found")
+
+        params = request.get("params", {})
+        if not isinstance(params, (dict, list)):
+            raise JsonRpcError(INVALID_PARAMS, "params must be an object or an array")
+        args, kwargs = (params, {}) if isinstance(params, list) else ([], params)
+
+        # Checked up front, so a TypeError raised inside the method isn't reported as invalid params
+        try:
+            inspect.signature(method).bind(*args, **kwargs)
+        except TypeError as error:
+            raise JsonRpcError(INVALID_PARAMS, str(error)) from None
+
+        return method(*args, **kwargs)
+
+
+class JsonRpcClient:
+    """
+    Calls the methods of a JsonRpcServer over one connection. Not thread safe, use a client per thread.
+    Raises JsonRpcError when the server answers with an error and OSError on connection failure.
+    """
+
+    def __init__(self, address: Address, timeout: float | None = 30):
+        if isinstance(address, str):
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(timeout)
+            connection.connect(address)
+        else:
+            connection = socket.create_connection(address, timeout)
+
+        self._connection = connection
+        self._file = connection.makefile("rwb")
+        self._next_id = 1
+
+    def call(self, method: str, **params: Any) -> Any:
+        request_id = self._next_id
+        self._next_id += 1
+
+        request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            raise OSError("The server closed the connection")
+        response = json.loads(line)
+
+        if "error" in response:
+            error = response["error"]
+            raise JsonRpcError(error["code"], error["message"], error.get("data"))
+        return response["result"]
+
+    def close(self):
+        self._file.close()
+        self._connection.close()
+
+    def __enter__(self) -> "JsonRpcClient":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def _error_response(request_id: Any, error: JsonRpcError) -> dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": error.to_dict()}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        json_rpc: JsonRpcServer = self.server.json_rpc  # type: ignore[attr-defined]
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            response = json_rpc.handle_request(line)
+            if response is not None:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _ThreadingTcpServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
@@ -0,0 +1,170 @@
+import hashlib
+import io
+from typing import Any, Union
+from classes.ltx_tokenizer import decode_text, index_sections, read_buffer, tokenize_settings
+from classes.setting import Setting
+
+MCM_SECTION = "mcm"
+SECTION_SEPARATOR = "::"  # settings.json names like "global_keybinds::debug_demo_record"
+
+
+def split_setting_name(name: str) -> tuple[str, str]:
+    """Splits a settings.json name into section and key. Names without a section belong to [mcm]."""
+    section_name, separator, key = name.partition(SECTION_SEPARATOR)
+    return (section_name, key) if separator else (MCM_SECTION, name)
+
+
+def group_settings_by_section(user_settings: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Returns the settings.json settings as section name to key to value, keeping their order."""
+    grouped: dict[str, dict[str, Any]] = {}
+    for name, value in user_settings.items():
+        section_name, key = split_setting_name(name)
+        grouped.setdefault(section_name, {})[key] = value
+
+    return grouped
+
+
+class LtxDocument:
+    """
+    An options file (axr_options.ltx) that is tokenized once.
+
+    While reading the lines we record where every part of every section starts and ends. The settings of a
+    section, and the line number of every setting, are tokenized the first time the section is used.
+    Lookups after that don't rescan the file, and sections that are never used are never tokenized.
+    A part runs from its header to the next header, without its trailing blank lines, so blank lines
+    between settings don't end a section. A section whose header is repeated has several parts, the
+    settings of all parts are indexed together and a later part overrides an earlier one. The line numbers of
+    every copy of a repeated setting are kept as well, so all of them can be updated.
+    The hash of the contents is computed the first time it is asked for as well.
+    """
+
+    def __init__(
+        self, lines: list[str], section_parts: dict[str, list[tuple[int, int]]] | None = None
+    ):
+        self.lines = lines
+        # Filled per section by _tokenize_section
+        self.section_settings: dict[str, dict[str, Setting]] = {}
+        self.section_line_numbers: dict[str, dict[str, int]] = {}
+        self.section_repeated_line_numbers: dict[str, dict[str, list[int]]] = {}
+        self._content_hash: str | None = None
+        if section_parts is not None:
+            # Already indexed from the text of the file
+            self.section_parts = section_parts
+            return
+
+        self.section_parts: dict[str, list[tuple[int, int]]] = {}
+        self._index_sections()
+
+    @classmethod
+    def from_file(cls, path: str) -> "LtxDocument":
+        """
+        Reads the options file at path as bytes and indexes its sections with the ltx_tokenizer.
+        Raises OSError on failure and UnicodeDecodeError if it can't be decoded.
+        """
+        return cls.from_bytes(read_buffer(path))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LtxDocument":
+        """Parses the contents of an options file, like from_file. Raises UnicodeDecodeError if it can't be decoded."""
+        text = decode_text(data)
+        return cls(io.StringIO(text).readlines(), index_sections(text))
+
+    @classmethod
+    def of(cls, contents: Union[list[str], "LtxDocument"]) -> "LtxDocument":
+        """Returns contents as a document, tokenizing it only if it isn't one already."""
+        return contents if isinstance(contents, LtxDocument) else cls(contents)
+
+    def _index_sections(self):
+        current_section: str | None = None
+        part_start = 0
+        part_end = 0
+
+        for i, line in enumerate(self.lines):
+            if line.startswith("["):
+                self._close_part(current_section, part_start, part_end)
+                current_section = line.strip()[1:-1]
+                part_start = i
+                part_end = i + 1
+                continue
+
+            # Blank lines only belong to a part if more of the section follows them
+            if current_section is not None and line.strip(" ") != "\n":
+                part_end = i + 1
+
+        self._close_part(current_section, part_start, part_end)
+
+    def _close_part(self, section_name: str | None, start: int, end: int):
+        if section_name is not None:
+            self.section_parts.setdefault(section_name, []).append((start, end))
+
+    def _tokenize_section(self, section_name: str):
+        settings: dict[str, Setting] = {}
+        line_numbers: dict[str, int] = {}
+        repeated_line_numbers: dict[str, list[int]] = {}
+        for start, end in self.parts(section_name):
+            part_settings, part_line_numbers, part_repeated_line_numbers = tokenize_settings(
+                self.lines[start + 1 : end], start + 1
+            )
+            for name in part_line_numbers.keys() & line_numbers.keys():
+                # Repeated across parts
+                repeated_line_numbers[name] = repeated_line_numbers.get(name, [line_numbers[name]]) + (
+                    part_repeated_line_numbers.pop(name, None) or [part_line_numbers[name]]
+                )
+            repeated_line_numbers.update(part_repeated_line_numbers)
+            settings.update(part_settings)
+            line_numbers.update(part_line_numbers)
+
+        self.section_line_numbers[section_name] = line_numbers
+        self.section_repeated_line_numbers[section_name] = repeated_line_numbers
+        self.section_settings[section_name] = settings
+
+    def has_section(self, section_name: str) -> bool:
+        return section_name in self.section_parts
+
+    def section(self, section_name: str) -> tuple[list[str], int, int]:
+        """
+        Returns the lines of the first part of a section, along with the index of its header and its exclusive
+        end index. Raises ValueError if section is not present.
+        """
+        start, end = self.parts(section_name)[0]
+        return self.lines[start + 1 : end], start, end
+
+    def parts(self, section_name: str) -> list[tuple[int, int]]:
+        """
+        Returns the header index and exclusive end index of every part of a section, in file order.
+        Raises ValueError if section is not present.
+        """
+        try:
+            return self.section_parts[section_name]
+        except KeyError:
+            raise ValueError(f"[{section_name}] is not present in options file") from None
+
+    def settings(self, section_name: str) -> dict[str, Setting]:
+        """Returns setting name to Setting for a section. Raises ValueError if section is not present."""
+        if section_name not in self.section_settings:
+            self._tokenize_section(section_name)
+        return self.section_settings[section_name]
+
+    def line_numbers(self, section_name: str) -> dict[str, int]:
+        """Returns setting name to line number for a section. Raises ValueError if section is not present."""
+        if section_name not in self.section_line_numbers:
+            self._tokenize_section(section_name)
+        return self.section_line_numbers[section_name]
+
+    def setting_line_numbers(self, section_name: str, setting_name: str) -> list[int]:
+        """
+        Returns the line numbers of every copy of a setting in a section, in file order, or an empty list if the
+        section doesn't have it. Raises ValueError if section is not present.
+        """
+        line_number = self.line_numbers(section_name).get(setting_name)
+        if line_number is None:
+            return []
+        return self.section_repeated_line_numbers[section_name].get(setting_name) or [line_number]
+
+    def content_hash(self) -> str:
+        """Returns the sha256 of the lines as hex, which is only computed the first time for a document."""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(
+                "".join(self.lines).encode("utf-8", "surrogateescape")
+            ).hexdigest()
+        return self._content_hash
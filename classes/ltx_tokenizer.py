@@ -0,0 +1,157 @@
+import io
+import locale
+import operator
+import sys
+from typing import Iterator, Union
+from classes.compression import open_input
+from classes.setting import Setting
+
+Buffer = Union[bytes, bytearray]
+
+_partition_on_separator = operator.methodcaller("partition", "=")
+_name_part = operator.itemgetter(0)
+_value_part = operator.itemgetter(2)
+
+
+def iter_header_offsets(data: str | Buffer) -> Iterator[tuple[int, int]]:
+    """
+    Yields the offset of every section header line, a line starting with '[', and the offset of its line break.
+    Works on text and on bytes, and only the headers are looked at in Python, the search for them is done by find.
+    """
+    newline, header_start = ("\n", "\n[") if isinstance(data, str) else (b"\n", b"\n[")
+    if data[:1] in ("[", b"["):
+        start = 0
+    else:
+        start = data.find(header_start) + 1
+        if start == 0:
+            return
+
+    while True:
+        line_end = data.find(newline, start)
+        line_end = len(data) if line_end == -1 else line_end
+        yield start, line_end
+
+        start = data.find(header_start, line_end) + 1
+        if start == 0:
+            return
+
+
+def index_sections(text: str) -> dict[str, list[tuple[int, int]]]:
+    """
+    Returns section name to the header index and exclusive end index of every part of the section, for the text
+    of an options file with '\n' line endings. Same as LtxDocument finds them line by line, but only the headers
+    are looked at in Python, line numbers are counted by str.count.
+    """
+    section_parts: dict[str, list[tuple[int, int]]] = {}
+    headers = list(iter_header_offsets(text))
+    line_number = 0
+    position = 0
+
+    for i, (header_start, header_end) in enumerate(headers):
+        line_number += text.count("\n", position, header_start)
+        position = header_start
+
+        body_start = min(header_end + 1, len(text))
+        body_end = headers[i + 1][0] if i + 1 < len(headers) else len(text)
+        body_length = _trimmed_length(text, body_start, body_end)
+        body_line_count = text.count("\n", body_start, body_start + body_length)
+        if body_length and text[body_start + body_length - 1] != "\n":
+            body_line_count += 1  # The last line of the file has no line break
+
+        # Same as line.strip()[1:-1], the line already starts with '['
+        section_name = text[header_start:header_end].strip()[1:-1]
+        section_parts.setdefault(section_name, []).append(
+            (line_number, line_number + 1 + body_line_count)
+        )
+
+    return section_parts
+
+
+def tokenize_settings(
+    lines: list[str], first_line_number: int = 0
+) -> tuple[dict[str, Setting], dict[str, int], dict[str, list[int]]]:
+    """
+    Returns setting name to Setting, setting name to line number and repeated setting name to all its line
+    numbers for the setting lines in lines, which start at first_line_number. Lines are split on their first '='
+    by map and zip over the whole list instead of one line at a time. A name that is repeated gets its last value
+    and line number.
+    """
+    line_indices = [i for i, line in enumerate(lines) if "=" in line]
+    parts = list(map(_partition_on_separator, map(lines.__getitem__, line_indices)))
+    names = list(map(sys.intern, map(str.strip, map(_name_part, parts))))
+    values = map(sys.intern, map(str.strip, map(_value_part, parts)))
+
+    settings = dict(zip(names, map(Setting, names, values)))
+    setting_line_numbers = [first_line_number + i for i in line_indices]
+    line_numbers = dict(zip(names, setting_line_numbers))
+
+    repeated_line_numbers: dict[str, list[int]] = {}
+    if len(line_numbers) < len(names):
+        # Only files with repeated names pay for finding them
+        for name, line_number in zip(names, setting_line_numbers):
+            repeated_line_numbers.setdefault(name, []).append(line_number)
+        repeated_line_numbers = {
+            name: numbers for name, numbers in repeated_line_numbers.items() if len(numbers) > 1
+        }
+
+    return settings, line_numbers, repeated_line_numbers
+
+
+def _trimmed_length(text: str, start: int, end: int) -> int:
+    """Returns the length of text[start:end] without its trailing blank lines, which contain only spaces."""
+    content_end = end
+    while content_end > start and text[content_end - 1] in " \n":
+        content_end -= 1
+    if content_end == start:
+        return 0
+
+    line_end = text.find("\n", content_end, end)
+    return end - start if line_end == -1 else line_end + 1 - start
+
+
+def parse_settings(data: Buffer, encoding: str | None = None) -> dict[str, Setting]:
+    """Returns setting name to Setting for every setting line in data, like parse_settings_from_lines."""
+    settings, _, _ = tokenize_settings(io.StringIO(decode_text(data, encoding)).readlines())
+    return settings
+
+
+def section_lines(
+    data: Buffer, section_name: str, encoding: str | None = None
+) -> tuple[list[str], int, int]:
+    """
+    Returns the decoded lines of the first part of a section, with the index of its header and its exclusive end
+    index, like get_settings_section. Headers are searched for in the bytes and only the section is decoded.
+    Raises ValueError if the section is not present.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    headers = iter_header_offsets(data)
+    for header_start, header_end in headers:
+        if data[header_start:header_end].strip()[1:-1].decode(encoding) == section_name:
+            break
+    else:
+        raise ValueError(f"[{section_name}] is not present in options file")
+
+    next_header = next(headers, None)
+    body = decode_text(data[header_end + 1 : next_header[0] if next_header else len(data)], encoding)
+    lines = io.StringIO(body[: _trimmed_length(body, 0, len(body))]).readlines()
+
+    start = data[:header_start].count(b"\n")
+    return lines, start, start + 1 + len(lines)
+
+
+def decode_text(data: Buffer, encoding: str | None = None) -> str:
+    """Decodes data with the line endings translated to '\\n', like reading the file in text mode."""
+    text = data.decode(encoding or locale.getpreferredencoding(False))
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    return text
+
+
+def read_buffer(path: str) -> bytes:
+    """
+    Returns the contents of the file at path as bytes. A gz or xz compressed file is decompressed in memory.
+    Raises OSError on failure.
+    """
+    with open_input(path, "rb") as file:
+        return file.read()
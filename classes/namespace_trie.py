@@ -0,0 +1,65 @@
+import fnmatch
+from typing import Iterable
+
+SEPARATOR = "/"
+ANY_DEPTH = "**"  # Pattern segment matching zero or more namespaces
+GLOB_CHARACTERS = "*?["
+_NAME = None  # Key of the full setting name in a node, never a segment since segments are strings
+
+
+def has_glob(pattern: str) -> bool:
+    return any(character in pattern for character in GLOB_CHARACTERS)
+
+
+class NamespaceTrie:
+    """
+    Setting names like 'fftd/bpcfg/mapmpm' stored as a tree of their '/' separated namespaces.
+
+    Matching a pattern walks the tree one segment at a time. A literal segment is a single lookup and a glob
+    segment like '*' or '*_spawn' is only compared with the children of the current namespace, so the cost
+    follows the number of matching names instead of the number of names in the tree.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.root: dict = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        node = self.root
+        for segment in name.split(SEPARATOR):
+            node = node.setdefault(segment, {})
+        node[_NAME] = name
+
+    def match(self, pattern: str) -> list[str]:
+        """
+        Returns the names matching pattern. Segments are matched with fnmatch
+        rules, '*' doesn't cross a '/', and a '**' segment matches any number of namespaces.
+
+        Example: trie.match("fftd/*/mapmpm"), trie.match("SMR/smr_loot/*_spawn"), trie.match("fftd/**")
+        """
+        matches: list[str] = []
+        self._match(self.root, pattern.split(SEPARATOR), 0, matches)
+        # A pattern with several '**' segments can reach a name in more than one way
+        return list(dict.fromkeys(matches))
+
+    def _match(self, node: dict, segments: list[str], index: int, matches: list[str]):
+        if index == len(segments):
+            if _NAME in node:
+                matches.append(node[_NAME])
+            return
+
+        segment = segments[index]
+        if segment == ANY_DEPTH:
+            self._match(node, segments, index + 1, matches)
+            for child_segment, child in node.items():
+                if child_segment is not _NAME:
+                    self._match(child, segments, index, matches)
+        elif not has_glob(segment):
+            child = node.get(segment)
+            if child is not None:
+                self._match(child, segments, index + 1, matches)
+        else:
+            for child_segment, child in node.items():
+                if child_segment is not _NAME and fnmatch.fnmatchcase(child_segment, segment):
+                    self._match(child, segments, index + 1, matches)
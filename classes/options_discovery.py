@@ -0,0 +1,192 @@
+import concurrent.futures
+import fnmatch
+import json
+import os
+import tempfile
+import time
+from typing import Any
+from classes.parse_cache import MTIME_GRANULARITY_NS
+
+OPTIONS_FILE_PATTERN = "axr_options*.ltx"
+INDEX_VERSION = 1
+SCAN_WORKERS = 8
+
+
+class DiscoveredFile:
+    """An options file found in a GAMMA install, with where it was found."""
+
+    def __init__(self, path: str, kind: str, mod: str | None, mtime_ns: int):
+        self.path = path
+        self.kind = kind  # "mod" for mods/<mod>/gamedata/configs, "game" for appdata, "saved" or "other"
+        self.mod = mod
+        self.mtime_ns = mtime_ns
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"path": self.path, "kind": self.kind, "mod": self.mod, "mtime_ns": self.mtime_ns}
+
+    def __repr__(self):
+        return f"{self.kind:<6} {self.path}"
+
+
+class OptionsFileScanner:
+    """
+    Finds every axr_options.ltx and its variants, like axr_options_saved.ltx, in a GAMMA install.
+
+    Options files only live in gamedata/configs, so below a gamedata directory only configs is entered, which
+    skips the textures, meshes and sounds that make up most of the files of an install. Directories are
+    listed with os.scandir on a pool of threads, one directory per task, so slow disks and network shares
+    are read in parallel.
+
+    What every directory contained is kept in an index file along with the directory's mtime. A directory
+    whose mtime didn't change is not listed again, only its subdirectories are checked, so a later scan only
+    revisits the subtrees that changed. Writing a file doesn't change the mtime of its directory, so the options
+    files of a directory that isn't listed again are still stat'ed for their own mtime.
+    """
+
+    def __init__(self, root: str, index_path: str | None = None, workers: int = SCAN_WORKERS):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.workers = workers
+        self.listed_directories = 0
+        self.reused_directories = 0
+
+    def scan(self) -> list[DiscoveredFile]:
+        """Returns the options files below root, sorted by path. Raises OSError if root can't be read."""
+        if not os.path.isdir(self.root):
+            raise NotADirectoryError(f"{self.root} is not a directory")
+
+        index = self._read_index()
+        new_index: dict[str, dict[str, Any]] = {}
+        found: list[DiscoveredFile] = []
+        self.listed_directories = 0
+        self.reused_directories = 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._scan_directory, (), index.get(""))}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    parts, entry, reused = future.result()
+                    if entry is None:
+                        continue
+
+                    relative_path = "/".join(parts)
+                    new_index[relative_path] = entry
+                    if reused:
+                        self.reused_directories += 1
+                    else:
+                        self.listed_directories += 1
+
+                    for name, mtime_ns in entry["files"]:
+                        found.append(_discovered_file(self.root, parts + (name,), mtime_ns))
+                    for name in entry["subdirectories"]:
+                        subdirectory = parts + (name,)
+                        pending.add(
+                            executor.submit(self._scan_directory, subdirectory, index.get("/".join(subdirectory)))
+                        )
+
+        self._write_index(new_index)
+        return sorted(found, key=lambda discovered: discovered.path)
+
+    def _scan_directory(
+        self, parts: tuple[str, ...], cached: dict[str, Any] | None
+    ) -> tuple[tuple[str, ...], dict[str, Any] | None, bool]:
+        """Returns the files and subdirectories to enter of a directory, from the index if it didn't change."""
+        path = os.path.join(self.root, *parts)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            # Removed while scanning
+            return parts, None, False
+
+        # A directory changed again within the mtime granularity of when it was listed can't be trusted
+        if (
+            cached is not None
+            and cached["mtime_ns"] == mtime_ns
+            and cached["listed_at_ns"] - mtime_ns > MTIME_GRANULARITY_NS
+        ):
+            return parts, {**cached, "files": _stat_files(path, cached["files"])}, True
+
+        entry: dict[str, Any] = {"mtime_ns": mtime_ns, "listed_at_ns": time.time_ns(), "files": [], "subdirectories": []}
+        try:
+            with os.scandir(path) as directory_entries:
+                for directory_entry in directory_entries:
+                    if directory_entry.is_dir(follow_symlinks=False):
+                        if _may_contain_options_files(parts + (directory_entry.name,)):
+                            entry["subdirectories"].append(directory_entry.name)
+                    elif fnmatch.fnmatchcase(directory_entry.name.lower(), OPTIONS_FILE_PATTERN):
+                        entry["files"].append((directory_entry.name, directory_entry.stat().st_mtime_ns))
+        except PermissionError:
+            # Not ours to read, nothing in it can be merged anyway
+            pass
+
+        return parts, entry, False
+
+    def _read_index(self) -> dict[str, dict[str, Any]]:
+        if self.index_path is None:
+            return {}
+
+        try:
+            with open(self.index_path, "r") as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            # A missing or broken index just means listing everything
+            return {}
+
+        if not isinstance(index, dict) or index.get("version") != INDEX_VERSION or index.get("root") != self.root:
+            return {}
+
+        return index["directories"]
+
+    def _write_index(self, directories: dict[str, dict[str, Any]]):
+        if self.index_path is None:
+            return
+
+        index = {"version": INDEX_VERSION, "root": self.root, "directories": directories}
+        try:
+            with tempfile.NamedTemporaryFile(
+                "w", dir=os.path.dirname(os.path.abspath(self.index_path)), delete=False
+            ) as index_file:
+                json.dump(index, index_file)
+            os.replace(index_file.name, self.index_path)
+        except OSError as error:
+            # Not being able to keep the index only makes the next scan slower
+            print(f"Could not write discovery index {self.index_path}.", error)
+
+
+def _may_contain_options_files(parts: tuple[str, ...]) -> bool:
+    """Returns whether the directory at parts, relative to the install, can contain options files below it."""
+    lowered = [part.lower() for part in parts]
+    if lowered[-1].startswith("."):
+        return False
+    if "gamedata" in lowered[:-1]:
+        # Only gamedata/configs itself, options files aren't read from anywhere else in gamedata
+        return lowered[lowered.index("gamedata") + 1 :] == ["configs"]
+
+    return True
+
+
+def _stat_files(path: str, files: list[tuple[str, int]]) -> list[tuple[str, int]]:
+    """Returns the files listed in the directory at path, with their current mtime."""
+    stated_files: list[tuple[str, int]] = []
+    for name, _ in files:
+        try:
+            stated_files.append((name, os.stat(os.path.join(path, name)).st_mtime_ns))
+        except OSError:
+            # Removed while scanning
+            continue
+
+    return stated_files
+
+
+def _discovered_file(root: str, parts: tuple[str, ...], mtime_ns: int) -> DiscoveredFile:
+    lowered = [part.lower() for part in parts]
+    kind, mod = "other", None
+    if len(parts) >= 5 and lowered[-5] == "mods" and lowered[-3:-1] == ["gamedata", "configs"]:
+        kind, mod = "mod", parts[-4]
+    elif "appdata" in lowered[:-1]:
+        kind = "game"
+    elif "saved" in lowered[-1]:
+        kind = "saved"
+
+    return DiscoveredFile(os.path.join(root, *parts), kind, mod, mtime_ns)
@@ -0,0 +1,106 @@
+import os
+import pickle
+import tempfile
+import time
+from typing import Iterable
+from classes.backup_store import hash_file
+from classes.ltx_document import LtxDocument, MCM_SECTION
+
+# Bump when LtxDocument changes, so documents pickled by older versions are parsed again
+CACHE_VERSION = 7
+# Files modified this close to when the cache was written can change again without changing mtime
+MTIME_GRANULARITY_NS = 2_000_000_000
+
+
+class ParseCache:
+    """
+    Caches the parsed LtxDocument of an options file in <file>.parsecache next to it.
+
+    The cache is used without reading the file if its size, mtime and ctime haven't changed. If they have changed,
+    the file is hashed and the cache is still used if the contents are the same. The sections every run uses are
+    tokenized before the document is cached, so a cached document doesn't tokenize them again.
+    """
+
+    CACHE_SUFFIX = ".parsecache"
+
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+        self.cache_path = source_path + self.CACHE_SUFFIX
+
+    def load_document(self, tokenized_sections: Iterable[str] = (MCM_SECTION,)) -> LtxDocument:
+        """
+        Returns the parsed document, from the cache if it is still valid. When the file is parsed, the
+        tokenized_sections it has are tokenized before it is cached. Raises OSError on failure.
+        """
+        stat = os.stat(self.source_path)
+        cache = self._read_cache()
+
+        if cache is not None:
+            if (
+                cache["size"] == stat.st_size
+                and cache["mtime_ns"] == stat.st_mtime_ns
+                and cache["ctime_ns"] == stat.st_ctime_ns
+                and cache["cached_at_ns"] - stat.st_mtime_ns > MTIME_GRANULARITY_NS
+            ):
+                return cache["document"]
+
+            content_hash, _ = hash_file(self.source_path)
+            if cache["hash"] == content_hash:
+                self._write_cache(cache["document"], content_hash, stat)
+                return cache["document"]
+        else:
+            content_hash, _ = hash_file(self.source_path)
+
+        document = LtxDocument.from_file(self.source_path)
+        for section_name in tokenized_sections:
+            if document.has_section(section_name):
+                document.settings(section_name)
+        self._write_cache(document, content_hash, stat)
+        return document
+
+    def clear(self):
+        """Removes the cache file if there is one."""
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    def _read_cache(self) -> dict | None:
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                cache = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A broken or outdated cache is just parsed again
+            return None
+
+        if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+            return None
+
+        return cache
+
+    def _write_cache(self, document: LtxDocument, content_hash: str, stat: os.stat_result):
+        cache = {
+            "version": CACHE_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "ctime_ns": stat.st_ctime_ns,
+            "cached_at_ns": time.time_ns(),
+            "hash": content_hash,
+            "document": document,
+        }
+
+        try:
+            # A temporary file of its own, threads of the service can write the cache of the same file at once
+            with tempfile.NamedTemporaryFile(
+                "wb", dir=os.path.dirname(os.path.abspath(self.cache_path)), suffix=".tmp", delete=False
+            ) as cache_file:
+                try:
+                    pickle.dump(cache, cache_file, pickle.HIGHEST_PROTOCOL)
+                except BaseException:
+                    cache_file.close()
+                    os.unlink(cache_file.name)
+                    raise
+            os.replace(cache_file.name, self.cache_path)
+        except OSError as error:
+            # Not being able to cache shouldn't stop the merge
+            print(f"Could not write parse cache {self.cache_path}.", error)
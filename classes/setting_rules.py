@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from typing import Any
+from classes.ltx_document import LtxDocument, MCM_SECTION, SECTION_SEPARATOR, split_setting_name
+from classes.namespace_trie import NamespaceTrie, has_glob
+
+CACHED_FILE_COUNT = 8
+
+
+class _ResolvedFile:
+    """Tries and pattern matches of one default file's sections."""
+
+    def __init__(self, document: LtxDocument):
+        self.document = document
+        self.tries: dict[str, NamespaceTrie] = {}
+        self.matches: dict[tuple[str, str], list[str]] = {}
+
+    def match(self, section_name: str, pattern: str) -> list[str]:
+        key = (section_name, pattern)
+        if key not in self.matches:
+            if section_name not in self.tries:
+                self.tries[section_name] = NamespaceTrie(self.document.settings(section_name))
+            self.matches[key] = self.tries[section_name].match(pattern)
+
+        return self.matches[key]
+
+
+class RuleResolver:
+    """
+    Expands rules in settings.json, names with glob patterns like "fftd/*/mapmpm" or "SMR/smr_loot/*_spawn",
+    into the setting names of the default file they match.
+
+    The matched names are cached per content hash of the default file, so resolving again against an
+    unchanged file, e.g. after settings.json changed in watch mode, doesn't build or walk a trie again.
+    The hash is kept by the document, so it is computed once per document and not on every resolve.
+    """
+
+    def __init__(self, cached_file_count: int = CACHED_FILE_COUNT):
+        self.cached_file_count = cached_file_count
+        self._resolved_files: OrderedDict[str, _ResolvedFile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(
+        self, user_settings: dict[str, Any], document: LtxDocument
+    ) -> tuple[dict[str, Any], list[str]]:
+        """
+        Returns user_settings with every rule replaced by the names it matches, along with the rules matching
+        nothing. Names given explicitly override rules, and a later rule overrides an earlier one.
+        A rule can be prefixed with a section like other names, e.g. "global_keybinds::debug_*".
+        """
+        rules = [name for name in user_settings if has_glob(name)]
+        if not rules:
+            return user_settings, []
+
+        resolved_file = self._resolved_file(document)
+        explicit_names = {name for name in user_settings if not has_glob(name)}
+        resolved: dict[str, Any] = {}
+        unmatched_rules: list[str] = []
+
+        for name, value in user_settings.items():
+            if name in explicit_names:
+                resolved[name] = value
+                continue
+
+            section_name, pattern = split_setting_name(name)
+            if not document.has_section(section_name):
+                unmatched_rules.append(name)
+                continue
+
+            matches = resolved_file.match(section_name, pattern)
+            if not matches:
+                unmatched_rules.append(name)
+            for key in matches:
+                matched_name = key if section_name == MCM_SECTION else f"{section_name}{SECTION_SEPARATOR}{key}"
+                if matched_name not in explicit_names:
+                    resolved[matched_name] = value
+
+        return resolved, unmatched_rules
+
+    def clear(self):
+        with self._lock:
+            self._resolved_files.clear()
+
+    def _resolved_file(self, document: LtxDocument) -> _ResolvedFile:
+        content_hash = document.content_hash()
+
+        with self._lock:
+            resolved_file = self._resolved_files.pop(content_hash, None) or _ResolvedFile(document)
+            self._resolved_files[content_hash] = resolved_file
+            while len(self._resolved_files) > self.cached_file_count:
+                self._resolved_files.popitem(last=False)
+
+        return resolved_file
+
+
+rule_resolver = RuleResolver()
@@ -0,0 +1,108 @@
+import json
+from typing import IO, Any, Callable, Iterable, Iterator
+from classes.three_way_merge import MISSING, UnsortedSectionError, ensure_sorted, merge_join, sorted_settings
+from classes.typed_values import ValueColumn, changed_rows, json_value
+
+# Settings compared at once as typed columns, which bounds the memory of a diff of any size
+COLUMN_BATCH_SIZE = 4096
+
+
+class SettingsDiff:
+    """Names of the settings the user added, removed or changed compared to the default file."""
+
+    def __init__(self):
+        self.added: list[str] = []
+        self.removed: list[str] = []
+        self.changed: list[str] = []
+
+    def to_dict(self) -> dict[str, list[str]]:
+        return {"added": self.added, "removed": self.removed, "changed": self.changed}
+
+
+def iter_settings_diff(
+    default_settings: Iterable[tuple[str, ...]],
+    user_settings: Iterable[tuple[str, ...]],
+    diff: SettingsDiff,
+    tolerance: float = 0.0,
+) -> Iterator[tuple[str, Any]]:
+    """
+    Walks two sections sorted by name, whose items start with (name, value), with two cursors.
+    Yields (name, json user value) of the settings that were added or changed and records every difference in diff.
+    Values are compared by type in batches of columns, so 0.8 and 0.80 are the same and numbers at most tolerance
+    apart are equal.
+    """
+    batch: list[tuple[str, tuple[str, ...] | None, tuple[str, ...]]] = []
+    for name, (default, user) in merge_join(default_settings, user_settings):
+        if user is MISSING:
+            diff.removed.append(name)
+            continue
+        # The same text is the same value, only the rest has to be classified
+        if default is not MISSING and default[1] == user[1]:
+            continue
+
+        batch.append((name, default, user))
+        if len(batch) == COLUMN_BATCH_SIZE:
+            yield from _diff_batch(batch, diff, tolerance)
+            batch = []
+
+    yield from _diff_batch(batch, diff, tolerance)
+
+
+def _diff_batch(
+    batch: list[tuple[str, tuple[str, ...] | None, tuple[str, ...]]], diff: SettingsDiff, tolerance: float
+) -> Iterator[tuple[str, Any]]:
+    default_column = ValueColumn("" if default is MISSING else default[1] for _, default, _ in batch)
+    user_column = ValueColumn(user[1] for _, _, user in batch)
+
+    for (name, default, user), changed, kind, value in zip(
+        batch, changed_rows(default_column, user_column, tolerance), user_column.kinds, user_column.values
+    ):
+        if default is MISSING:
+            diff.added.append(name)
+        elif changed:
+            diff.changed.append(name)
+        else:
+            continue
+        yield name, json_value(user[1], kind, value)
+
+
+def write_settings_diff_json(
+    get_default_settings: Callable[[], Iterable[tuple[str, ...]]],
+    get_user_settings: Callable[[], Iterable[tuple[str, ...]]],
+    output: IO[str],
+    tolerance: float = 0.0,
+) -> SettingsDiff:
+    """
+    Writes the added and changed user settings to output as a json object while diffing, so only the names of
+    the differences and one batch of values are kept in memory. The output is the same as json.dumps of the
+    differences, with booleans and numbers as json types where Setting.format_value writes them back unchanged.
+    The getters return the settings of a section, they are called again if a section turns out to be unsorted.
+    """
+    try:
+        return _write_json(
+            ensure_sorted(get_default_settings()), ensure_sorted(get_user_settings()), output, tolerance
+        )
+    except UnsortedSectionError:
+        output.seek(0)
+        output.truncate()
+        return _write_json(
+            sorted_settings(get_default_settings()), sorted_settings(get_user_settings()), output, tolerance
+        )
+
+
+def _write_json(
+    default_settings: Iterable[tuple[str, ...]],
+    user_settings: Iterable[tuple[str, ...]],
+    output: IO[str],
+    tolerance: float,
+) -> SettingsDiff:
+    diff = SettingsDiff()
+    separator = ""
+
+    output.write("{")
+    for name, value in iter_settings_diff(default_settings, user_settings, diff, tolerance):
+        output.write(f"{separator}{json.dumps(name)}: {json.dumps(value)}")
+        separator = ", "
+    output.write("}")
+
+    return diff
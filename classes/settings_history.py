@@ -0,0 +1,212 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Callable, Iterator
+from classes.backup_store import BackupStore, TIMESTAMP_FORMAT, hash_file
+from classes.ltx_document import LtxDocument, MCM_SECTION, SECTION_SEPARATOR, split_setting_name
+
+KINDS = ("default", "saved")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    release TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    ingested_at TEXT NOT NULL,
+    UNIQUE (release, kind)
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+
+CREATE TABLE IF NOT EXISTS settings (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    release TEXT NOT NULL,
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS settings_release_key ON settings (release, key);
+CREATE INDEX IF NOT EXISTS settings_file ON settings (file_id);
+"""
+
+
+class SettingsHistory:
+    """
+    A SQLite database of the settings of every options file ingested, per GAMMA release.
+
+    Every release has at most one file of each kind, "default" for axr_options.ltx and "saved" for
+    axr_options_saved.ltx. Files are identified by their sha256: a file already stored for the release is skipped
+    without parsing it, and a file stored for another release has its rows copied inside the database.
+    The settings of a file are inserted with one executemany in a single transaction, and are indexed on
+    (release, key), so the history of a setting is one index lookup per release.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "SettingsHistory":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def ingest_file(self, path: str, release: str, kind: str, document: LtxDocument | None = None) -> bool:
+        """
+        Stores the settings of the options file at path for release, using document if it was already parsed.
+        Returns False if the file was already stored for release. Raises OSError on failure.
+        """
+        content_hash, _ = hash_file(path)
+        return self._store(
+            content_hash,
+            release,
+            kind,
+            os.path.abspath(path),
+            lambda: document or LtxDocument.from_file(path),
+        )
+
+    def ingest_backups(self, store: BackupStore, kind: str = "default") -> int:
+        """
+        Stores every snapshot of a backup store, with its timestamp as the release. Snapshots are only
+        decompressed if their hash isn't stored yet. Returns the number of snapshots stored. Raises OSError on failure.
+        """
+        stored_count = 0
+        for entry in store.entries():
+            if self._store(
+                entry.hash,
+                entry.timestamp,
+                kind,
+                os.path.join(os.path.abspath(store.directory), entry.file_name),
+                lambda: LtxDocument.from_bytes(store.read_snapshot(entry)),
+            ):
+                stored_count += 1
+
+        return stored_count
+
+    def releases(self, kind: str = "default") -> list[str]:
+        """Returns the releases that have a file of kind, oldest first by their natural order, e.g. 0.9 before 0.10."""
+        rows = self.connection.execute("SELECT release FROM files WHERE kind = ?", (kind,)).fetchall()
+        return sorted((release for (release,) in rows), key=_natural_key)
+
+    def setting_history(self, name: str, kind: str = "default") -> list[tuple[str, str | None]]:
+        """Returns (release, value) of a setting for every release, oldest first. The value is None if it is missing."""
+        section_name, key = split_setting_name(name)
+        history: list[tuple[str, str | None]] = []
+
+        for release in self.releases(kind):
+            row = self.connection.execute(
+                "SELECT settings.value FROM settings JOIN files ON files.id = settings.file_id "
+                "WHERE settings.release = ? AND settings.key = ? AND settings.section = ? AND files.kind = ?",
+                (release, key, section_name, kind),
+            ).fetchone()
+            history.append((release, row[0] if row else None))
+
+        return history
+
+    def setting_changes(self, name: str, kind: str = "default") -> list[tuple[str, str | None, str | None]]:
+        """Returns (release, previous value, value) for every release in which a setting changed, appeared or went."""
+        changes: list[tuple[str, str | None, str | None]] = []
+        previous_value: str | None = None
+
+        for release, value in self.setting_history(name, kind):
+            if value != previous_value:
+                changes.append((release, previous_value, value))
+            previous_value = value
+
+        return changes
+
+    def added_settings(self, release: str, kind: str = "default") -> list[str]:
+        """Returns the settings release has and the release before it hasn't. Raises ValueError if it is unknown."""
+        return self._missing_from(release, self._previous_release(release, kind), kind)
+
+    def removed_settings(self, release: str, kind: str = "default") -> list[str]:
+        """Returns the settings the release before release has and release hasn't. Raises ValueError if unknown."""
+        previous_release = self._previous_release(release, kind)
+        if previous_release is None:
+            return []
+
+        return self._missing_from(previous_release, release, kind)
+
+    def _store(
+        self, content_hash: str, release: str, kind: str, source: str, load_document: Callable[[], LtxDocument]
+    ) -> bool:
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}, not {kind}")
+
+        stored = self.connection.execute(
+            "SELECT id, release, kind FROM files WHERE hash = ?", (content_hash,)
+        ).fetchall()
+        if any(stored_release == release and stored_kind == kind for _, stored_release, stored_kind in stored):
+            return False
+
+        # Parsed before the transaction starts, so the database isn't locked while parsing
+        document = None if stored else load_document()
+
+        with self.connection:
+            replaced = self.connection.execute(
+                "SELECT id FROM files WHERE release = ? AND kind = ?", (release, kind)
+            ).fetchone()
+            if replaced:
+                self.connection.execute("DELETE FROM settings WHERE file_id = ?", replaced)
+                self.connection.execute("DELETE FROM files WHERE id = ?", replaced)
+
+            file_id = self.connection.execute(
+                "INSERT INTO files (hash, release, kind, source, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                (content_hash, release, kind, source, datetime.now().strftime(TIMESTAMP_FORMAT)),
+            ).lastrowid
+
+            if document is None:
+                self.connection.execute(
+                    "INSERT INTO settings (file_id, release, section, key, value) "
+                    "SELECT ?, ?, section, key, value FROM settings WHERE file_id = ?",
+                    (file_id, release, stored[0][0]),
+                )
+            else:
+                self.connection.executemany(
+                    "INSERT INTO settings (file_id, release, section, key, value) VALUES (?, ?, ?, ?, ?)",
+                    _setting_rows(file_id, release, document),
+                )
+
+        return True
+
+    def _previous_release(self, release: str, kind: str) -> str | None:
+        releases = self.releases(kind)
+        if release not in releases:
+            raise ValueError(f"Release {release} is not in the history")
+
+        index = releases.index(release)
+        return releases[index - 1] if index > 0 else None
+
+    def _missing_from(self, release: str, other_release: str | None, kind: str) -> list[str]:
+        """Returns the names of the settings of release that other_release doesn't have."""
+        rows = self.connection.execute(
+            "SELECT settings.section, settings.key FROM settings JOIN files ON files.id = settings.file_id "
+            "WHERE settings.release = ? AND files.kind = ? AND NOT EXISTS ("
+            "    SELECT 1 FROM settings AS other JOIN files AS other_file ON other_file.id = other.file_id"
+            "    WHERE other.release = ? AND other.key = settings.key AND other.section = settings.section"
+            "    AND other_file.kind = ?"
+            ") ORDER BY settings.section, settings.key",
+            (release, kind, other_release, kind),
+        ).fetchall()
+
+        return [
+            key if section_name == MCM_SECTION else f"{section_name}{SECTION_SEPARATOR}{key}"
+            for section_name, key in rows
+        ]
+
+
+def _setting_rows(file_id: int, release: str, document: LtxDocument) -> Iterator[tuple[int, str, str, str, str]]:
+    for section_name in document.section_parts:
+        for key, setting in document.settings(section_name).items():
+            yield file_id, release, section_name, key, setting.value
+
+
+def _natural_key(release: str) -> list[str | int]:
+    # Splitting on digit runs alternates text and numbers, so the lists always compare like with like
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", release)]
@@ -0,0 +1,361 @@
+import bisect
+import locale
+import os
+import shutil
+import tempfile
+from typing import IO, Any
+from classes.ltx_document import (
+    MCM_SECTION,
+    SECTION_SEPARATOR,
+    LtxDocument,
+    group_settings_by_section,
+    split_setting_name,
+)
+from classes.compression import detect_compression, open_input, output_stream
+from classes.setting import Setting
+
+INDENTATION = " " * 8  # This is how MCM settings are indented in the default axr_options.ltx
+CHUNK_SIZE = 1024 * 1024
+PLAN_VERSION = 1
+REPLACE, INSERT, DELETE = "replace", "insert", "delete"
+
+
+class PlannedChange:
+    """
+    One line of a change plan. line is the 0-based line of the file the plan was made for, an inserted line goes
+    before it. Names outside of [mcm] are written as "section::name", like in settings.json.
+    """
+
+    __slots__ = ("line", "operation", "name", "old_value", "new_value")
+
+    def __init__(self, line: int, operation: str, name: str, old_value: str | None, new_value: str | None):
+        self.line = line
+        self.operation = operation
+        self.name = name
+        self.old_value = old_value  # None for inserts
+        self.new_value = new_value  # None for deletes
+
+    def to_list(self) -> list[Any]:
+        return [self.line, self.operation, self.name, self.old_value, self.new_value]
+
+    @classmethod
+    def from_list(cls, data: Any) -> "PlannedChange":
+        """Returns the change saved with to_list. Raises ValueError if data doesn't have its shape and types."""
+        if not isinstance(data, list) or len(data) != 5:
+            raise ValueError(f"{data} is not a planned change")
+
+        line, operation, name, old_value, new_value = data
+        if (
+            not isinstance(line, int)
+            or isinstance(line, bool)
+            or operation not in (REPLACE, INSERT, DELETE)
+            or not isinstance(name, str)
+            or not isinstance(old_value, str if operation != INSERT else type(None))
+            or not isinstance(new_value, str if operation != DELETE else type(None))
+        ):
+            raise ValueError(f"{data} is not a planned change")
+        return cls(line, operation, name, old_value, new_value)
+
+    def __repr__(self):
+        if self.operation == INSERT:
+            return f"{self.line + 1:>7} + {self.name} = {self.new_value}"
+        if self.operation == DELETE:
+            return f"{self.line + 1:>7} - {self.name} = {self.old_value}"
+        return f"{self.line + 1:>7} ~ {self.name} = {self.old_value} -> {self.new_value}"
+
+
+class SettingsPatch:
+    """
+    The minimal set of line changes that applies user settings to an options file.
+
+    Changed settings only get their value replaced, so the rest of the line keeps its original bytes, including
+    the column alignment the game writes. New settings are inserted at their sorted position in the section.
+    Applying the patch copies every unchanged byte range of the file as it is.
+
+    A patch is planned as a list of PlannedChange, which can be saved with plan() and applied later with
+    from_plan(), after checking that the lines it changes still hold the values it was planned for. The
+    reverse_plan() of a patch undoes it on the patched file, touching only the changed lines.
+    """
+
+    def __init__(
+        self,
+        source_path: str,
+        line_offsets: list[int],
+        splices: list[tuple[int, int, list[bytes]]],
+        changes: list[PlannedChange] | None = None,
+    ):
+        self.source_path = source_path
+        self.line_offsets = line_offsets  # Byte offset of every line, plus the file size
+        self.splices = splices  # (start line, exclusive end line, replacement lines), in file order
+        self.changes = changes or []  # In file order, inserts before the change of the line they go before
+
+    @classmethod
+    def for_user_settings(cls, source_path: str, user_settings: dict[str, Any]) -> "SettingsPatch":
+        """
+        Computes the patch that applies user_settings to the options file at source_path. Names without a
+        section:: prefix are in the [mcm] section. Raises ValueError if a section is not present and OSError on failure.
+        """
+        with open_input(source_path, "rb") as source:
+            raw_lines = source.read().splitlines(keepends=True)
+
+        encoding = locale.getpreferredencoding(False)
+        document = LtxDocument(
+            [line.decode(encoding).rstrip("\r\n") + "\n" for line in raw_lines]
+        )
+
+        changes: list[PlannedChange] = []
+        for section_name, section_user_settings in group_settings_by_section(user_settings).items():
+            section_lines, section_start, section_end = document.section(section_name)
+            line_numbers = document.line_numbers(section_name)
+            added_lines: list[tuple[str, str, str]] = []
+
+            for setting_name, value in section_user_settings.items():
+                new_value = Setting(setting_name, value).format_value()
+                name = _plan_name(section_name, setting_name)
+                if setting_name in line_numbers and setting_name != "":
+                    # Every copy of a repeated setting is updated, like merge_settings does
+                    for line_number in document.setting_line_numbers(section_name, setting_name):
+                        old_value = document.lines[line_number].partition("=")[2].strip()
+                        if old_value != new_value:
+                            changes.append(PlannedChange(line_number, REPLACE, name, old_value, new_value))
+                else:
+                    added_lines.append((f"{INDENTATION}{Setting(setting_name, value)}", name, new_value))
+
+            section_is_sorted = all(
+                section_lines[i] <= section_lines[i + 1] for i in range(len(section_lines) - 1)
+            )
+            for line, name, new_value in sorted(added_lines):
+                # Unsorted sections get new settings appended, sorting them would change far more lines
+                insert_at = (
+                    section_start + 1 + bisect.bisect_right(section_lines, line)
+                    if section_is_sorted
+                    else section_end
+                )
+                changes.append(PlannedChange(insert_at, INSERT, name, None, new_value))
+
+        return cls._from_changes(source_path, raw_lines, changes, encoding)
+
+    @classmethod
+    def from_plan(cls, source_path: str, plan: dict[str, Any]) -> "SettingsPatch":
+        """
+        Returns the patch of a plan saved with plan(). Raises ValueError if the file at source_path changed since
+        the plan was made, so a line it changes doesn't hold the setting and value it was planned for, and
+        OSError on failure.
+        """
+        with open_input(source_path, "rb") as source:
+            raw_lines = source.read().splitlines(keepends=True)
+
+        if (
+            not isinstance(plan, dict)
+            or plan.get("version") != PLAN_VERSION
+            or not isinstance(plan.get("changes"), list)
+        ):
+            raise ValueError("Not a change plan of this version of the tool")
+        if plan.get("line_count") != len(raw_lines):
+            raise ValueError(
+                f"{source_path} has {len(raw_lines)} lines, the plan was made for a file of {plan['line_count']}"
+            )
+
+        encoding = locale.getpreferredencoding(False)
+        changes = [PlannedChange.from_list(change) for change in plan["changes"]]
+        header_lines = [i for i, line in enumerate(raw_lines) if line.startswith(b"[")]
+        for change in changes:
+            if change.operation == INSERT:
+                if not 0 <= change.line <= len(raw_lines):
+                    raise ValueError(f"Line {change.line + 1} to insert {change.name} at is not in {source_path}")
+                continue
+
+            line = raw_lines[change.line].decode(encoding) if 0 <= change.line < len(raw_lines) else ""
+            setting = Setting.from_line(line) if "=" in line else None
+            # The same name can be in several sections, so the line has to be in the section of the change too
+            header_index = bisect.bisect_right(header_lines, change.line) - 1
+            section_name = (
+                raw_lines[header_lines[header_index]].decode(encoding).strip()[1:-1] if header_index >= 0 else None
+            )
+            if (
+                setting is None
+                or (section_name, setting.name) != split_setting_name(change.name)
+                or setting.value != change.old_value
+            ):
+                raise ValueError(
+                    f"Line {change.line + 1} of {source_path} is not {change.name} = {change.old_value} anymore"
+                )
+
+        return cls._from_changes(source_path, raw_lines, changes, encoding)
+
+    @classmethod
+    def _from_changes(
+        cls, source_path: str, raw_lines: list[bytes], changes: list[PlannedChange], encoding: str
+    ) -> "SettingsPatch":
+        """Turns planned changes into the splices that apply them to raw_lines."""
+        newline = _line_ending(raw_lines[0]) if raw_lines else b"\n"
+        newline = newline or b"\n"
+
+        # Stable, so inserts at the same line keep their sorted order
+        changes = sorted(changes, key=lambda change: (change.line, change.operation != INSERT))
+        changed_lines: dict[int, list[bytes]] = {}
+        inserted_lines: dict[int, list[bytes]] = {}
+
+        for change in changes:
+            if change.operation == REPLACE:
+                changed_lines[change.line] = [
+                    _replace_value(raw_lines[change.line], change.new_value.encode(encoding))
+                ]
+            elif change.operation == DELETE:
+                changed_lines[change.line] = []
+            else:
+                # A missing last newline has to be added before anything can be inserted after the line
+                if change.line == len(raw_lines) and raw_lines:
+                    last_line = changed_lines.get(change.line - 1, [raw_lines[-1]])
+                    if last_line and not _line_ending(last_line[0]):
+                        changed_lines[change.line - 1] = [last_line[0] + newline]
+                key = split_setting_name(change.name)[1]
+                line = f"{INDENTATION}{Setting(key, change.new_value)}"
+                inserted_lines.setdefault(change.line, []).append(line.rstrip("\n").encode(encoding) + newline)
+
+        line_offsets = [0]
+        for line in raw_lines:
+            line_offsets.append(line_offsets[-1] + len(line))
+
+        splices = [
+            (line_number, line_number, lines) for line_number, lines in inserted_lines.items()
+        ] + [
+            (line_number, line_number + 1, lines) for line_number, lines in changed_lines.items()
+        ]
+        splices.sort(key=lambda splice: (splice[0], splice[1]))
+
+        return cls(source_path, line_offsets, splices, changes)
+
+    def is_empty(self) -> bool:
+        return not self.splices
+
+    def plan(self) -> dict[str, Any]:
+        """Returns the changes of the patch as a json serializable plan for from_plan."""
+        return {
+            "version": PLAN_VERSION,
+            "line_count": len(self.line_offsets) - 1,
+            "changes": [change.to_list() for change in self.changes],
+        }
+
+    def reverse_plan(self) -> dict[str, Any]:
+        """
+        Returns the plan that undoes this patch on the patched file. Inserted lines are deleted again and replaced
+        values get their old value back, so undoing costs as much as the patch and not a copy of the whole file.
+        """
+        reversed_changes: list[PlannedChange] = []
+        shift = 0  # Lines inserted minus lines deleted before the current line
+        for change in self.changes:
+            line = change.line + shift
+            if change.operation == INSERT:
+                reversed_changes.append(PlannedChange(line, DELETE, change.name, change.new_value, None))
+                shift += 1
+            elif change.operation == DELETE:
+                reversed_changes.append(PlannedChange(line, INSERT, change.name, None, change.old_value))
+                shift -= 1
+            else:
+                reversed_changes.append(PlannedChange(line, REPLACE, change.name, change.new_value, change.old_value))
+
+        return {
+            "version": PLAN_VERSION,
+            "line_count": len(self.line_offsets) - 1 + shift,
+            "changes": [change.to_list() for change in reversed_changes],
+        }
+
+    def apply(self, destination_path: str | None = None, compression: str | None = None) -> None:
+        """
+        Writes the patched file to destination_path, defaulting to the source file, through a temporary file
+        that replaces it atomically, compressed if compression is "gz" or "xz". Does nothing if the patch is empty
+        and would overwrite the source with the same compression. Raises OSError on failure.
+        """
+        destination_path = destination_path or self.source_path
+        if (
+            self.is_empty()
+            and os.path.abspath(destination_path) == os.path.abspath(self.source_path)
+            and detect_compression(self.source_path) == compression
+        ):
+            return
+
+        # sendfile would copy the compressed bytes of the source, or go around the compression of the destination
+        copy_directly = compression is None and detect_compression(self.source_path) is None
+
+        with open_input(self.source_path, "rb") as source, tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(os.path.abspath(destination_path)), delete=False
+        ) as destination_file:
+            try:
+                with output_stream(destination_file, compression, text=False) as destination:
+                    copied_until_line = 0
+                    for start, end, lines in self.splices:
+                        _copy_byte_range(
+                            source,
+                            destination,
+                            self.line_offsets[copied_until_line],
+                            self.line_offsets[start],
+                            copy_directly,
+                        )
+                        destination.writelines(lines)
+                        copied_until_line = end
+
+                    _copy_byte_range(
+                        source,
+                        destination,
+                        self.line_offsets[copied_until_line],
+                        self.line_offsets[-1],
+                        copy_directly,
+                    )
+            except BaseException:
+                destination_file.close()
+                os.unlink(destination_file.name)
+                raise
+
+        shutil.copymode(self.source_path, destination_file.name)
+        os.replace(destination_file.name, destination_path)
+
+
+def _plan_name(section_name: str, setting_name: str) -> str:
+    return setting_name if section_name == MCM_SECTION else f"{section_name}{SECTION_SEPARATOR}{setting_name}"
+
+
+def _line_ending(line: bytes) -> bytes:
+    return line[len(line.rstrip(b"\r\n")) :]
+
+
+def _replace_value(line: bytes, value: bytes) -> bytes:
+    """Replaces the value of a 'name = value' line, keeping the name, its alignment and the line ending."""
+    name_part = line[: line.index(b"=") + 1]
+    line_ending = _line_ending(line)
+
+    return name_part + (b" " + value if value else b"") + line_ending
+
+
+def _copy_byte_range(source: IO[bytes], destination: IO[bytes], start: int, end: int, copy_directly: bool = True):
+    """
+    Copies bytes start to end of source to the current position of destination. With copy_directly both have to
+    be plain files, and the bytes are copied between their file descriptors by the kernel where possible.
+    """
+    count = end - start
+    if count <= 0:
+        return
+
+    if copy_directly and hasattr(os, "sendfile"):
+        destination.flush()
+        try:
+            while count > 0:
+                sent = os.sendfile(destination.fileno(), source.fileno(), start, count)
+                if sent == 0:
+                    break
+                start += sent
+                count -= sent
+            # sendfile writes through the file descriptor, so the file object has to catch up
+            destination.seek(0, os.SEEK_END)
+            return
+        except OSError:
+            # Not every platform can sendfile between regular files, copy the rest by hand
+            destination.seek(0, os.SEEK_END)
+
+    source.seek(start)
+    while count > 0:
+        chunk = source.read(min(CHUNK_SIZE, count))
+        if not chunk:
+            break
+        destination.write(chunk)
+        count -= len(chunk)
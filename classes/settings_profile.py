@@ -0,0 +1,110 @@
+import hashlib
+import json
+import locale
+import os
+import threading
+from collections import OrderedDict
+from typing import Any
+
+EXTENDS_KEY = "extends"
+CACHED_PROFILE_COUNT = 8
+
+
+class ProfileError(ValueError):
+    """Raised when a profile isn't valid json, isn't a json object of settings or extends itself."""
+
+
+class ProfileResolver:
+    """
+    Resolves a settings.json that extends other profile files into one flat mapping of settings.
+
+    A profile is a json object of settings with an optional "extends" list of profile files, relative to the
+    profile itself. The profiles it extends are applied in the order they are listed and then its own settings,
+    so a per-machine profile extending the team's base profile overrides every key it sets again.
+
+    The resolved settings of a profile are cached along with the hashes of all its layers. As long as no layer
+    changed, resolving again only hashes the files, nothing is parsed or merged.
+    """
+
+    def __init__(self, cached_profile_count: int = CACHED_PROFILE_COUNT):
+        self.cached_profile_count = cached_profile_count
+        self._resolved_profiles: OrderedDict[str, tuple[dict[str, str], dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, profile_path: str) -> dict[str, Any]:
+        """
+        Returns the flat settings of the profile at profile_path. Raises OSError on failure and ProfileError if
+        a layer isn't a json object or the extends chain leads back to a profile in it.
+        """
+        profile_path = os.path.abspath(profile_path)
+        with self._lock:
+            resolved = self._resolved_profiles.get(profile_path)
+
+        if resolved is None or not all(
+            _hash_file(layer_path) == layer_hash for layer_path, layer_hash in resolved[0].items()
+        ):
+            layer_hashes: dict[str, str] = {}
+            resolved = layer_hashes, self._resolve_layer(profile_path, layer_hashes, [])
+
+        with self._lock:
+            self._resolved_profiles[profile_path] = resolved
+            self._resolved_profiles.move_to_end(profile_path)
+            while len(self._resolved_profiles) > self.cached_profile_count:
+                self._resolved_profiles.popitem(last=False)
+
+        # A copy, so the caller can't change the cached settings
+        return dict(resolved[1])
+
+    def layer_paths(self, profile_path: str) -> list[str]:
+        """Returns the paths of the profile and every profile it extends, as of the last time it was resolved."""
+        resolved = self._resolved_profiles.get(os.path.abspath(profile_path))
+        return list(resolved[0]) if resolved else [os.path.abspath(profile_path)]
+
+    def clear(self):
+        with self._lock:
+            self._resolved_profiles.clear()
+
+    def _resolve_layer(self, path: str, layer_hashes: dict[str, str], chain: list[str]) -> dict[str, Any]:
+        if path in chain:
+            raise ProfileError(f"{path} extends itself through {' -> '.join(chain)}")
+
+        with open(path, "rb") as profile_file:
+            data = profile_file.read()
+        layer_hashes[path] = hashlib.sha256(data).hexdigest()
+
+        try:
+            profile = json.loads(data.decode(locale.getpreferredencoding(False)))
+        except ValueError as error:
+            raise ProfileError(f"{path} is not valid json: {error}") from error
+        if not isinstance(profile, dict):
+            raise ProfileError(f"{path} is not a json object of settings")
+
+        extends = profile.pop(EXTENDS_KEY, [])
+        if isinstance(extends, str):
+            extends = [extends]
+        if not isinstance(extends, list) or not all(isinstance(base, str) for base in extends):
+            raise ProfileError(f'"{EXTENDS_KEY}" in {path} must be a list of profile files')
+
+        settings: dict[str, Any] = {}
+        for base in extends:
+            base_path = os.path.abspath(os.path.join(os.path.dirname(path), base))
+            settings.update(self._resolve_layer(base_path, layer_hashes, chain + [path]))
+
+        # Keys set again move to the end, so the rules of this layer come after the rules it overrides
+        for name in profile:
+            settings.pop(name, None)
+        settings.update(profile)
+
+        return settings
+
+
+def _hash_file(path: str) -> str | None:
+    try:
+        with open(path, "rb") as profile_file:
+            return hashlib.sha256(profile_file.read()).hexdigest()
+    except OSError:
+        # A layer that can't be read anymore is resolved again, which reports the error
+        return None
+
+
+profile_resolver = ProfileResolver()
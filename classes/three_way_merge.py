@@ -0,0 +1,272 @@
+import os
+import shutil
+import tempfile
+from typing import IO, Iterable, Iterator
+from classes.compression import open_input, output_stream
+from classes.setting import Setting
+
+MISSING = None
+
+
+class UnsortedSectionError(ValueError):
+    """Raised while streaming when a section turns out not to be sorted by setting name."""
+
+
+class SectionReader:
+    """
+    Reads the settings of one section from an iterator of lines, stopping at the next section header.
+    The blank lines at the end of the section and the header after it are kept in end_lines, so the caller
+    can continue with the rest of the file.
+
+    With keep_other_lines, the lines that aren't settings, like comments and blank lines between settings, are
+    kept too. They are given with the setting following them, and the ones after the last setting are left in
+    other_lines.
+    """
+
+    def __init__(self, lines: Iterator[str], keep_other_lines: bool = False):
+        self.lines = lines
+        self.keep_other_lines = keep_other_lines
+        self.end_lines: list[str] = []
+        self.other_lines: list[str] = []
+
+    def __iter__(self) -> Iterator[tuple[str, ...]]:
+        """
+        Yields (name, value, line) for every setting line of the section, with keep_other_lines
+        (name, value, line, other lines before it).
+        """
+        for line in self.lines:
+            if line.startswith("["):
+                self.end_lines.append(line)
+                return
+            # Blank lines only end the section if no settings follow them
+            if line.strip(" ") == "\n":
+                self.end_lines.append(line)
+                continue
+            if self.keep_other_lines:
+                self.other_lines.extend(self.end_lines)
+            self.end_lines.clear()
+            if "=" not in line:
+                if self.keep_other_lines:
+                    self.other_lines.append(line)
+                continue
+
+            setting = Setting.from_line(line, "=")
+            if self.keep_other_lines:
+                other_lines, self.other_lines = self.other_lines, []
+                yield setting.name, setting.value, line, other_lines
+            else:
+                yield setting.name, setting.value, line
+
+
+def skip_to_section(lines: Iterable[str], section_header: str) -> Iterator[str]:
+    """Consumes lines up to and including section_header, returning the iterator. Raises ValueError if not present."""
+    lines = iter(lines)
+    for line in lines:
+        if line == section_header:
+            return lines
+
+    raise ValueError(f"{section_header.strip()} is not present in options file")
+
+
+def ensure_sorted(settings: Iterable[tuple[str, ...]]) -> Iterator[tuple[str, ...]]:
+    """Passes settings through, raising UnsortedSectionError when a name isn't greater than the one before it."""
+    previous_name: str | None = None
+    for setting in settings:
+        if previous_name is not None and setting[0] <= previous_name:
+            raise UnsortedSectionError(f"{setting[0]} comes after {previous_name}")
+        previous_name = setting[0]
+        yield setting
+
+
+def sorted_settings(settings: Iterable[tuple[str, ...]]) -> list[tuple[str, ...]]:
+    """Sorts settings by name. For duplicate names the last one wins, like when parsing into a dict."""
+    return sorted({setting[0]: setting for setting in settings}.values())
+
+
+def merge_join(*sources: Iterable[tuple[str, ...]]) -> Iterator[tuple[str, list[tuple[str, ...] | None]]]:
+    """
+    Walks several sections sorted by name in one pass. The items of a source are tuples starting with the name.
+    Yields every name with, per source, its item or None if the source doesn't have it.
+    """
+    if len(sources) == 2:
+        # The diff joins two sections, which doesn't need the search for the smallest name of any number of them
+        yield from _merge_join_two(*sources)
+        return
+
+    cursors = [iter(source) for source in sources]
+    heads = [next(cursor, None) for cursor in cursors]
+
+    while any(head is not None for head in heads):
+        name = min(head[0] for head in heads if head is not None)
+        row: list[tuple[str, ...] | None] = []
+        for i, head in enumerate(heads):
+            if head is not None and head[0] == name:
+                row.append(head)
+                heads[i] = next(cursors[i], None)
+            else:
+                row.append(MISSING)
+        yield name, row
+
+
+def _merge_join_two(
+    first: Iterable[tuple[str, ...]], second: Iterable[tuple[str, ...]]
+) -> Iterator[tuple[str, list[tuple[str, ...] | None]]]:
+    first_cursor, second_cursor = iter(first), iter(second)
+    first_head, second_head = next(first_cursor, None), next(second_cursor, None)
+
+    while first_head is not None and second_head is not None:
+        if first_head[0] == second_head[0]:
+            yield first_head[0], [first_head, second_head]
+            first_head, second_head = next(first_cursor, None), next(second_cursor, None)
+        elif first_head[0] < second_head[0]:
+            yield first_head[0], [first_head, MISSING]
+            first_head = next(first_cursor, None)
+        else:
+            yield second_head[0], [MISSING, second_head]
+            second_head = next(second_cursor, None)
+
+    while first_head is not None:
+        yield first_head[0], [first_head, MISSING]
+        first_head = next(first_cursor, None)
+    while second_head is not None:
+        yield second_head[0], [MISSING, second_head]
+        second_head = next(second_cursor, None)
+
+
+class ThreeWayMerge:
+    """
+    Merges a user's saved options file from an old GAMMA release into the options file of a new release.
+
+    The [mcm] sections of the old default, new default and saved file are walked together in a single merge-join
+    pass, so no file is loaded into memory. For every setting:
+    - changed only by the modpack (saved equals old default): the new default is used
+    - changed only by the user (new default equals old default): the saved value is used
+    - changed by both to different values: a conflict, resolved in favour of prefer ("saved" or "new")
+
+    Sections that aren't sorted by name are detected and merged again after sorting them. The lines of the new
+    default's section that aren't settings, like comments, are kept before the setting they were before.
+    """
+
+    def __init__(
+        self,
+        old_default_path: str,
+        new_default_path: str,
+        saved_path: str,
+        section_header: str = "[mcm]\n",
+        prefer: str = "saved",
+    ):
+        if prefer not in ("saved", "new"):
+            raise ValueError(f"prefer must be saved or new, not {prefer}")
+
+        self.old_default_path = old_default_path
+        self.new_default_path = new_default_path
+        self.saved_path = saved_path
+        self.section_header = section_header
+        self.prefer = prefer
+        self._reset_report()
+
+    def _reset_report(self):
+        self.modpack_changes: list[str] = []
+        self.user_changes: list[str] = []
+        self.conflicts: list[dict[str, str | None]] = []
+
+    def write(self, destination_path: str, compression: str | None = None) -> None:
+        """
+        Writes the merged file to destination_path through a temporary file, so it can be one of the inputs,
+        compressed if compression is "gz" or "xz". The inputs can be gz or xz compressed too.
+        Raises ValueError if a file has no section and OSError on failure.
+        """
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(os.path.abspath(destination_path)), delete=False
+        ) as destination_file:
+            try:
+                try:
+                    with output_stream(destination_file, compression) as destination:
+                        self._write_lines(destination, presorted=True)
+                except UnsortedSectionError:
+                    destination_file.seek(0)
+                    destination_file.truncate()
+                    with output_stream(destination_file, compression) as destination:
+                        self._write_lines(destination, presorted=False)
+            except BaseException:
+                destination_file.close()
+                os.unlink(destination_file.name)
+                raise
+
+        if os.path.exists(self.new_default_path):
+            shutil.copymode(self.new_default_path, destination_file.name)
+        os.replace(destination_file.name, destination_path)
+
+    def report(self) -> dict[str, object]:
+        return {
+            "modpack_changes": self.modpack_changes,
+            "user_changes": self.user_changes,
+            "conflicts": self.conflicts,
+        }
+
+    def _write_lines(self, destination: IO[str], presorted: bool):
+        self._reset_report()
+
+        with open_input(self.old_default_path) as old_file, open_input(
+            self.new_default_path
+        ) as new_file, open_input(self.saved_path) as saved_file:
+            old_section = SectionReader(skip_to_section(old_file, self.section_header))
+            saved_section = SectionReader(skip_to_section(saved_file, self.section_header))
+
+            new_lines = iter(new_file)
+            for line in new_lines:
+                destination.write(line)
+                if line == self.section_header:
+                    break
+            else:
+                raise ValueError(f"{self.section_header.strip()} is not present in {self.new_default_path}")
+            new_section = SectionReader(new_lines, keep_other_lines=True)
+
+            if presorted:
+                sources = [ensure_sorted(old_section), ensure_sorted(new_section), ensure_sorted(saved_section)]
+            else:
+                sources = [
+                    sorted_settings(old_section),
+                    sorted_settings(new_section),
+                    sorted_settings(saved_section),
+                ]
+
+            destination.writelines(self._merged_lines(merge_join(*sources)))
+
+            destination.writelines(new_section.other_lines)
+            destination.writelines(new_section.end_lines)
+            destination.writelines(new_lines)
+
+    def _merged_lines(
+        self, rows: Iterator[tuple[str, list[tuple[str, ...] | None]]]
+    ) -> Iterator[str]:
+        for name, (old, new, saved) in rows:
+            old_value, new_value, saved_value = (
+                side[1] if side is not MISSING else None for side in (old, new, saved)
+            )
+
+            if saved_value == new_value:
+                chosen = saved if saved is not MISSING else new
+            elif saved_value == old_value:
+                chosen = new
+                self.modpack_changes.append(name)
+            elif new_value == old_value:
+                chosen = saved
+                self.user_changes.append(name)
+            else:
+                chosen = saved if self.prefer == "saved" else new
+                self.conflicts.append(
+                    {
+                        "name": name,
+                        "old_default": old_value,
+                        "new_default": new_value,
+                        "saved": saved_value,
+                        "resolved_to": self.prefer,
+                    }
+                )
+
+            if new is not MISSING:
+                # Comments of the new release stay, even above a setting the user removed
+                yield from new[3]
+            if chosen is not MISSING:
+                yield chosen[2]
@@ -0,0 +1,78 @@
+import math
+import re
+from typing import Any, Iterable
+
+# Kinds of values, a column keeps one byte per value
+TEXT, BOOL, INT, FLOAT = range(4)
+NUMERIC_KINDS = (INT, FLOAT)
+# Larger integers can't be compared exactly as doubles, so they are kept as text
+MAX_EXACT_INT = 2**53
+
+# Only spellings of numbers, e.g. not "007", "+1" or "True"
+_INT_PATTERN = re.compile(r"-?(?:0|[1-9][0-9]*)")
+_FLOAT_PATTERN = re.compile(r"-?(?:[0-9]+\.[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?|-?[0-9]+[eE][-+]?[0-9]+")
+_BOOLS = {"true": True, "false": False}
+
+
+def parse_value(text: str) -> tuple[int, Any]:
+    """
+    Returns the kind and typed value of an options file value, e.g. (FLOAT, 0.8) for "0.80". Numbers a double
+    can't hold, like "1e999", stay text.
+    """
+    if text in _BOOLS:
+        return BOOL, _BOOLS[text]
+    if _INT_PATTERN.fullmatch(text):
+        value = int(text)
+        if abs(value) <= MAX_EXACT_INT:
+            return INT, value
+    elif _FLOAT_PATTERN.fullmatch(text):
+        value = float(text)
+        if math.isfinite(value):
+            return FLOAT, value
+
+    return TEXT, text
+
+
+def json_value(text: str, kind: int, value: Any) -> Any:
+    """
+    Returns the value to write to json for a value parsed from text. Numbers that Setting.format_value wouldn't
+    write back as the same text, e.g. "0.80", "1e3" or "-0", are written as their text instead.
+    """
+    if kind == BOOL:
+        return value
+    if kind in NUMERIC_KINDS and str(value) == text:
+        return value
+
+    return text
+
+
+class ValueColumn:
+    """A column of options file values, each classified once as bool, int, float or text by parse_value."""
+
+    __slots__ = ("kinds", "values")
+
+    def __init__(self, texts: Iterable[str]):
+        self.kinds = bytearray()
+        self.values: list[Any] = []
+        for text in texts:
+            kind, value = parse_value(text)
+            self.kinds.append(kind)
+            self.values.append(value)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+def changed_rows(default: ValueColumn, user: ValueColumn, tolerance: float = 0.0) -> list[bool]:
+    """
+    Returns per row whether the user value differs from the default value. Numbers differ when they are more than
+    tolerance apart, so 0.8 and 0.80 or 1 and 1.0 are the same. Other values differ when their kind or value differs.
+    """
+    return [
+        abs(default_value - user_value) > tolerance
+        if default_kind in NUMERIC_KINDS and user_kind in NUMERIC_KINDS
+        else default_kind != user_kind or default_value != user_value
+        for default_kind, user_kind, default_value, user_value in zip(
+            default.kinds, user.kinds, default.values, user.values
+        )
+    ]
@@ -1,41 +1,1251 @@
+import argparse
+import contextlib
+import functools
+import io
+import itertools
 import json
+import operator
+import shutil
+import tempfile
+import time
 import typing
 import sys
 from datetime import datetime
 from classes.setting import Setting
+from classes import ltx_tokenizer
+from classes.ltx_document import (
+    LtxDocument,
+    MCM_SECTION,
+    group_settings_by_section,
+    split_setting_name,
+)
+from classes.backup_store import BackupEntry, BackupStore
+from classes.compression import COMPRESSORS, detect_compression, open_input, output_stream
+from classes.directory_lock import DirectoryLock
+from classes.document_cache import CACHED_DOCUMENT_COUNT, DocumentCache
+from classes.instrumentation import instrumentation
+from classes.parse_cache import ParseCache
+from classes.settings_patch import SettingsPatch
+from classes.setting_rules import rule_resolver
+from classes.settings_profile import ProfileError, profile_resolver
+from classes.settings_diff import SettingsDiff, write_settings_diff_json
+from classes.three_way_merge import ThreeWayMerge
 import os
 
-path = sys.argv[1] if len(sys.argv) > 1 else "."
+# Only for annotations, the subcommands that need these import them when they run to keep startup fast
+if typing.TYPE_CHECKING:
+    import concurrent.futures
+    from classes.options_discovery import DiscoveredFile
 
+# Threads reading the input files and writing the backup and generated_user_settings.json
+IO_WORKERS = 4
+# Below this many bytes of options files, starting the threads takes longer than the work they would overlap
+CONCURRENT_IO_MIN_BYTES = 4 * 1024 * 1024
+DEFAULT_SERVICE_PORT = 8765
 
-def main():
-    current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-    check_create_required_files()
+
+class InlineExecutor:
+    """
+    Runs what is submitted to it right away on the calling thread, in place of a thread pool. Results and errors
+    come back through result() of what submit returns, like from a Future.
+    """
+
+    def __enter__(self) -> "InlineExecutor":
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def submit(self, function: typing.Callable[..., typing.Any], *args: typing.Any) -> "CompletedCall":
+        return CompletedCall(function, args)
+
+
+class CompletedCall:
+    """The outcome of a function run by InlineExecutor."""
+
+    __slots__ = ("_result", "_error")
+
+    def __init__(self, function: typing.Callable[..., typing.Any], args: tuple):
+        self._result = None
+        self._error: Exception | None = None
+        try:
+            self._result = function(*args)
+        except Exception as error:
+            self._error = error
+
+    def result(self) -> typing.Any:
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def main(argv: list[str] | None = None) -> int | None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["restore"]:
+        return 0 if restore_backup(argv[1:]) else 1
+    if argv[:1] == ["batch"]:
+        return 0 if batch_merge(argv[1:]) else 1
+    if argv[:1] == ["three-way"]:
+        return 0 if three_way_merge(argv[1:]) else 1
+    if argv[:1] == ["history"]:
+        return 0 if settings_history(argv[1:]) else 1
+    if argv[:1] == ["serve"]:
+        return 0 if serve(argv[1:]) else 1
+    if argv[:1] == ["discover"]:
+        return 0 if discover(argv[1:]) else 1
+
+    args = parse_arguments(argv)
+    if args.profile or args.stats_json:
+        instrumentation.reset()
+        instrumentation.enable()
 
     try:
-        with open(f"{path}/settings.json", "r") as user_settings_file:
-            user_settings = json.load(user_settings_file)
+        if args.dry_run:
+            return 0 if plan_merge(args.path, args) else 1
+        if args.apply_plan:
+            return 0 if apply_merge_plan(args.path, args) else 1
+        if args.watch:
+            watch(args.path, args)
+        else:
+            run_merge(args.path, args)
+    except OSError as error:
+        print("Something went wrong while reading or writing to files.", error)
+        return 1
+    except ProfileError as error:
+        print("Could not read the user settings. Is a profile not valid json or does it extend itself?", error)
+        return 1
+    except ValueError as error:
+        # E.g. an options file that can't be decoded
+        print("Could not read the options files.", error)
+        return 1
+    finally:
+        if instrumentation.enabled:
+            report_instrumentation(args)
+            instrumentation.disable()
 
-        with open(f"{path}/axr_options.ltx", "r") as default_file:
-            default = default_file.readlines()
 
-        with open(f"{path}/axr_options_saved.ltx", "r") as user_axr_ltx_settings_file:
-            user_axr_ltx_settings = user_axr_ltx_settings_file.readlines()
+def run_merge(path: str, args: argparse.Namespace) -> None:
+    """
+    Runs the whole pipeline for the directory at path: backup, diff warning, merge and generated_user_settings.json.
+    The input files are read concurrently, and the backup and generated_user_settings.json are written in the
+    background while merging, except for small options files and with --profile or --stats-json, which need the
+    phases one after another to tell their time and peak memory apart. The directory is locked while running.
+    Raises OSError on failure.
+    """
+    check_create_required_files(path)
+
+    if instrumentation.enabled or options_files_size(path) < CONCURRENT_IO_MIN_BYTES:
+        executor: "concurrent.futures.Executor | InlineExecutor" = InlineExecutor()
+    else:
+        import concurrent.futures
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=IO_WORKERS)
+    # The executor is shut down, waiting for the background writes, before the directory is unlocked
+    with DirectoryLock(path), executor:
+        with instrumentation.phase("read") as phase:
+            user_settings, user_axr_ltx_settings, default = read_inputs(path, args, executor)
+            phase.count(
+                lines=len(default.lines) + len(user_axr_ltx_settings.lines),
+                user_settings=len(user_settings),
+            )
+
+        if args.history_release:
+            with instrumentation.phase("history"):
+                # In stream mode the default document only has some sections, so it is parsed again
+                record_history(
+                    path, args.history_release, None if args.stream else default, user_axr_ltx_settings
+                )
+
+        backup = executor.submit(
+            make_store_backup_phase, path, datetime.now().strftime("%Y%m%d_%H%M%S"), args
+        )
+        # Only reads the documents in memory, so it doesn't have to wait for the merge
+        generated_json = executor.submit(
+            write_generated_user_settings, default, user_axr_ltx_settings, path, args.diff_tolerance
+        )
+
+        write_merged_default_file(path, default, user_settings, args, backup)
+        # The merge can stop before waiting for the backup, its errors are reported all the same
+        backup.result()
+        generated_json.result()
+
+
+def options_files_size(path: str) -> int:
+    """Returns the size in bytes of axr_options.ltx and axr_options_saved.ltx in path. Raises OSError on failure."""
+    return os.path.getsize(f"{path}/axr_options.ltx") + os.path.getsize(f"{path}/axr_options_saved.ltx")
+
+
+def read_inputs(
+    path: str, args: argparse.Namespace, executor: "concurrent.futures.Executor | InlineExecutor"
+) -> tuple[dict[str, typing.Any], LtxDocument, LtxDocument]:
+    """
+    Reads settings.json, axr_options_saved.ltx and axr_options.ltx in path concurrently on executor, each file
+    being parsed as soon as it is read. Returns the user settings, the saved document and the default document.
+    Raises the error of the first of them that failed, in that order, OSError on failure.
+    """
+    user_settings = executor.submit(read_user_settings, path, args.settings_profile)
+    saved = executor.submit(read_parsed_document, f"{path}/axr_options_saved.ltx", args)
+
+    if args.stream:
+        # Which sections of the default file are read depends on the user settings
+        default = read_default_document(path, args, user_settings.result())
+    else:
+        default = executor.submit(read_parsed_document, f"{path}/axr_options.ltx", args).result()
+
+    return user_settings.result(), saved.result(), default
+
+
+def read_parsed_document(file_path: str, args: argparse.Namespace) -> LtxDocument:
+    """Reads an options file like read_document and tokenizes its [mcm] section, which every step uses."""
+    document = read_document(file_path, args)
+    if document.has_section(MCM_SECTION):
+        document.settings(MCM_SECTION)
+
+    return document
+
+
+def make_store_backup_phase(path: str, timestamp: str, args: argparse.Namespace) -> None:
+    """Runs make_store_backup as the backup phase, so it can run in the background. Raises OSError on failure."""
+    with instrumentation.phase("backup"):
+        make_store_backup(path, timestamp, args)
 
-        make_file_backup(default, f"{path}/axr_options_backup_{current_datetime}.ltx")
-        print_settings_and_default_file_diff(default, user_settings)
 
-        with open(f"{path}/axr_options.ltx", "w") as default_file:
-            default_file.writelines(merge_settings(default, user_settings))
+def write_generated_user_settings(
+    default: LtxDocument, user_axr_ltx_settings: LtxDocument, path: str, tolerance: float = 0.0
+) -> None:
+    """Writes generated_user_settings.json in path as the generate_json phase. Raises OSError on failure."""
+    with instrumentation.phase("generate_json") as phase:
+        diff = create_json_file_from_user_and_default_settings_diff(
+            default, user_axr_ltx_settings, path, tolerance
+        )
+        phase.count(lines=len(user_axr_ltx_settings.lines))
+        if diff:
+            phase.count(
+                added=len(diff.added), removed=len(diff.removed), changed=len(diff.changed)
+            )
 
+
+def watch(path: str, args: argparse.Namespace) -> None:
+    """
+    Runs the pipeline, then keeps the parsed files in memory and re-runs the affected phases whenever
+    settings.json, axr_options.ltx or axr_options_saved.ltx change, until interrupted.
+    A change to settings.json only re-runs the merge, a change to axr_options_saved.ltx only regenerates
+    generated_user_settings.json. Raises OSError if the first run fails.
+    """
+    settings_path = os.path.join(path, args.settings_profile or "settings.json")
+    default_path = f"{path}/axr_options.ltx"
+    saved_path = f"{path}/axr_options_saved.ltx"
+    from classes.file_watcher import FileWatcher
+
+    check_create_required_files(path)
+
+    with DirectoryLock(path):
+        user_settings = read_user_settings(path, args.settings_profile)
+        user_axr_ltx_settings = read_document(saved_path, args)
+        default = read_default_document(path, args, user_settings)
+
+        write_merged_default_file(path, default, user_settings, args)
         create_json_file_from_user_and_default_settings_diff(
-            default, user_axr_ltx_settings, path
+            default, user_axr_ltx_settings, path, args.diff_tolerance
         )
+        default = read_default_document(path, args, user_settings)
+
+    # Every layer of the settings profile is watched, the layers a profile extends can change too
+    layer_paths = profile_resolver.layer_paths(settings_path)
+    watcher = FileWatcher(
+        [*layer_paths, default_path, saved_path], args.debounce, args.poll_interval
+    )
+    print(f"Watching {path} for changes. Press Ctrl+C to stop.")
+
+    try:
+        while True:
+            changed_paths = watcher.wait_for_changes()
+            settings_changed = not changed_paths.isdisjoint(layer_paths)
+            default_changed = os.path.abspath(default_path) in changed_paths
+            saved_changed = os.path.abspath(saved_path) in changed_paths
+
+            try:
+                with DirectoryLock(path):
+                    if settings_changed:
+                        user_settings = read_user_settings(path, args.settings_profile)
+                        if profile_resolver.layer_paths(settings_path) != layer_paths:
+                            # The extends chain changed, so the watched layers have to change with it
+                            layer_paths = profile_resolver.layer_paths(settings_path)
+                            watcher.close()
+                            watcher = FileWatcher(
+                                [*layer_paths, default_path, saved_path], args.debounce, args.poll_interval
+                            )
+                    if saved_changed:
+                        user_axr_ltx_settings = read_document(saved_path, args)
+                    if default_changed:
+                        default = read_default_document(path, args, user_settings)
+
+                    if default_changed or saved_changed:
+                        create_json_file_from_user_and_default_settings_diff(
+                            default, user_axr_ltx_settings, path, args.diff_tolerance
+                        )
+                    if default_changed or settings_changed:
+                        write_merged_default_file(path, default, user_settings, args)
+                        # Our own write isn't a change to react to, but the document has to match the file again
+                        watcher.refresh([default_path])
+                        default = read_default_document(path, args, user_settings)
+            except (OSError, ValueError) as error:
+                print("Something went wrong while reading or writing to files.", error)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        watcher.close()
+
+
+def report_instrumentation(args: argparse.Namespace) -> None:
+    """Prints and/or writes the phases recorded by the instrumentation, as requested by the arguments."""
+    if args.profile:
+        print(instrumentation.summary())
+
+    if args.stats_json:
+        try:
+            with open(args.stats_json, "w") as stats_file:
+                json.dump(instrumentation.to_dict(), stats_file, indent=2)
+        except OSError as error:
+            print("Could not write stats json.", error)
+
+
+def read_user_settings(path: str, profile: str | None = None) -> dict[str, typing.Any]:
+    """
+    Reads settings.json in path, or the profile file relative to path, with the profiles it extends resolved
+    into one mapping. Raises OSError on failure and ProfileError if a profile isn't valid json or extends itself.
+    """
+    return profile_resolver.resolve(os.path.join(path, profile or "settings.json"))
+
+
+def read_default_document(
+    path: str, args: argparse.Namespace, user_settings: dict[str, typing.Any]
+) -> LtxDocument:
+    """
+    Reads axr_options.ltx in path. In stream mode only the [mcm] section and the sections named in
+    user_settings are read. Raises OSError on failure.
+    """
+    if args.stream:
+        # Only these sections are kept in memory, the rest of the file is streamed when merging
+        section_names = {MCM_SECTION, *group_settings_by_section(user_settings)}
+        with open_input(f"{path}/axr_options.ltx") as default_file:
+            return LtxDocument(list(iter_sections(default_file, section_names)))
+
+    return read_document(f"{path}/axr_options.ltx", args)
+
+
+def write_merged_default_file(
+    path: str,
+    default: LtxDocument,
+    user_settings: dict[str, typing.Any],
+    args: argparse.Namespace,
+    backup: "concurrent.futures.Future | None" = None,
+) -> None:
+    """
+    Backs up axr_options.ltx in path, expands the rules in the user settings, warns about unknown user settings
+    and writes the merge of the user settings into axr_options.ltx. If backup is given the backup is already
+    running, and nothing is written before it finished. Raises OSError on failure.
+    """
+    if backup is None:
+        make_store_backup_phase(path, datetime.now().strftime("%Y%m%d_%H%M%S"), args)
+
+    with instrumentation.phase("resolve_rules") as phase:
+        user_settings = resolve_setting_rules(default, user_settings)
+        phase.count(user_settings=len(user_settings))
+
+    with instrumentation.phase("validate") as phase:
+        print_settings_and_default_file_diff(default, user_settings)
+        phase.count(user_settings=len(user_settings))
+
+    if args.stream:
+        # The sections were read up front, so a missing one can stop the merge before anything is written
+        missing_sections = [
+            section_name
+            for section_name in {MCM_SECTION, *group_settings_by_section(user_settings)}
+            if not default.has_section(section_name)
+        ]
+        if missing_sections:
+            print_merge_error(ValueError(f"[{missing_sections[0]}] is not present in options file"))
+            return
+
+        # Merging and writing happen in the same pass
+        wait_for_backup(backup)
+        with instrumentation.phase("merge_and_write") as phase:
+            write_merged_settings(
+                f"{path}/axr_options.ltx", f"{path}/axr_options.ltx", user_settings, args.output_compression
+            )
+            phase.count(user_settings=len(user_settings))
+    elif args.incremental:
+        try:
+            with instrumentation.phase("merge") as phase:
+                patch = SettingsPatch.for_user_settings(
+                    f"{path}/axr_options.ltx", user_settings
+                )
+                phase.count(changes=len(patch.splices))
+
+            wait_for_backup(backup)
+            with instrumentation.phase("write"):
+                patch.apply(compression=args.output_compression)
+        except ValueError as error:
+            print_merge_error(error)
+    else:
+        with instrumentation.phase("merge") as phase:
+            merged = merge_settings(default, user_settings)
+            phase.count(lines=len(merged), user_settings=len(user_settings))
+
+        # Leaving an unchanged file alone also keeps its parse cache valid
+        wait_for_backup(backup)
+        with instrumentation.phase("write") as phase:
+            default_path = f"{path}/axr_options.ltx"
+            if merged != default.lines or detect_compression(default_path) != args.output_compression:
+                write_options_file(default_path, merged, args.output_compression)
+                phase.count(lines=len(merged))
+
+
+def plan_merge(path: str, args: argparse.Namespace) -> bool:
+    """
+    Prints the line changes an incremental merge of the user settings would make to axr_options.ltx in path,
+    without writing anything, and saves them as a change plan to args.plan_output if given. Returns False if a section is
+    missing. Raises OSError on failure.
+    """
+    default_path = f"{path}/axr_options.ltx"
+    with DirectoryLock(path):
+        user_settings = read_user_settings(path, args.settings_profile)
+        default = read_document(default_path, args)
+        user_settings = resolve_setting_rules(default, user_settings)
+        try:
+            patch = SettingsPatch.for_user_settings(default_path, user_settings)
+        except ValueError as error:
+            print_merge_error(error)
+            return False
+
+    for change in patch.changes:
+        print(change)
+    print(f"{len(patch.changes)} changes planned for {default_path}, nothing was written.")
+
+    if args.plan_output:
+        with open(args.plan_output, "w") as plan_file:
+            json.dump(patch.plan(), plan_file)
+
+    return True
+
+
+def apply_merge_plan(path: str, args: argparse.Namespace) -> bool:
+    """
+    Applies the change plan at args.apply_plan to axr_options.ltx in path, touching only the lines it changes,
+    and saves the plan that undoes it. The file is backed up first, like before a merge. Returns False if the
+    plan doesn't fit the file anymore. Raises OSError on failure.
+    """
+    default_path = f"{path}/axr_options.ltx"
+    undo_path = args.undo_output or f"{path}/undo_plan.json"
+    try:
+        with open(args.apply_plan, "r") as plan_file:
+            plan = json.load(plan_file)
+
+        with DirectoryLock(path):
+            patch = SettingsPatch.from_plan(default_path, plan)
+            # Saved first, an undo plan of changes that weren't applied is refused as it doesn't fit the file
+            with open(undo_path, "w") as undo_file:
+                json.dump(patch.reverse_plan(), undo_file)
+            make_store_backup(path, datetime.now().strftime("%Y%m%d_%H%M%S"), args)
+            patch.apply(compression=args.output_compression)
+    except ValueError as error:
+        print("Could not apply the plan.", error)
+        return False
+
+    print(f"Applied {len(patch.changes)} changes to {default_path}. Apply {undo_path} to undo them.")
+    return True
+
+
+def wait_for_backup(backup: "concurrent.futures.Future | None") -> None:
+    """Waits for the backup running in the background, if any, so nothing is written before it. Raises its error."""
+    if backup is not None:
+        backup.result()
+
+
+def parse_arguments(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Merge settings.json into axr_options.ltx."
+    )
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default=".",
+        help="Directory containing settings.json and the axr_options files.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and merge again whenever settings.json or the options files change.",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds to wait for changes to settle before merging in watch mode.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks for changes in watch mode, when inotify isn't available.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time, peak memory and sizes of every phase of the run.",
+    )
+    parser.add_argument(
+        "--stats-json",
+        help="Write the time, peak memory and sizes of every phase of the run to this json file.",
+    )
+    plan_mode = parser.add_mutually_exclusive_group()
+    plan_mode.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the changes --incremental would make to axr_options.ltx without writing anything.",
+    )
+    plan_mode.add_argument(
+        "--apply-plan",
+        metavar="FILE",
+        help="Apply a change plan saved with --dry-run --plan-output to axr_options.ltx, instead of merging. "
+        "Needs --incremental too.",
+    )
+    parser.add_argument("--plan-output", metavar="FILE", help="Save the changes of --dry-run as a plan to this file.")
+    parser.add_argument(
+        "--undo-output",
+        metavar="FILE",
+        help="Where --apply-plan saves the plan that undoes it. Defaults to undo_plan.json in path.",
+    )
+    add_merge_arguments(parser)
+
+    args = parser.parse_args(argv)
+    if args.watch and (args.dry_run or args.apply_plan):
+        parser.error("--watch can't be used with --dry-run or --apply-plan.")
+    if (args.dry_run or args.apply_plan) and not args.incremental:
+        # A plan holds the line changes of an incremental merge, the full merge rewrites and sorts whole sections
+        parser.error("--dry-run and --apply-plan plan the changes of --incremental, add --incremental.")
+
+    return args
+
+
+def add_merge_arguments(parser: argparse.ArgumentParser):
+    """Adds the arguments shared by every command that runs the merge pipeline."""
+    merge_mode = parser.add_mutually_exclusive_group()
+    merge_mode.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream axr_options.ltx through the merge instead of loading the whole file.",
+    )
+    merge_mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only rewrite the lines of axr_options.ltx that change, keeping the rest byte for byte.",
+    )
+    parser.add_argument(
+        "--settings-profile",
+        metavar="FILE",
+        help="Settings file to merge instead of settings.json, relative to the directory. "
+        'Profiles it "extends" are applied first.',
+    )
+    parser.add_argument(
+        "--history-release",
+        metavar="RELEASE",
+        help="Store the options files in history.sqlite as this release, e.g. 0.9.3, before merging.",
+    )
+    parser.add_argument(
+        "--diff-tolerance",
+        type=float,
+        default=0.0,
+        metavar="TOLERANCE",
+        help="Numbers in axr_options_saved.ltx at most this far from the default aren't written to "
+        "generated_user_settings.json.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the options files without reading or writing the parse cache.",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove the parse cache of the options files before parsing them.",
+    )
+    parser.add_argument(
+        "--backup-compression",
+        choices=list(COMPRESSORS),
+        default="xz",
+        help="Compression used for new backups.",
+    )
+    parser.add_argument(
+        "--output-compression",
+        choices=list(COMPRESSORS),
+        help="Compress the merged axr_options.ltx with xz or gz. Compressed input files are always read.",
+    )
+    parser.add_argument(
+        "--keep-last",
+        type=int,
+        default=10,
+        help="Number of most recent backups to keep.",
+    )
+    parser.add_argument(
+        "--keep-daily",
+        type=int,
+        default=7,
+        help="Number of days to keep the last backup of.",
+    )
+    parser.add_argument(
+        "--keep-weekly",
+        type=int,
+        default=4,
+        help="Number of weeks to keep the last backup of.",
+    )
+
+
+def batch_merge(argv: list[str]) -> bool:
+    """
+    Runs the merge pipeline for many directories in parallel, each in its own process.
+    Prints a report of every directory and returns whether all of them succeeded.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mcm_manager batch",
+        description="Merge settings.json into axr_options.ltx for many directories.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Directories containing settings.json and the axr_options files.",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="File listing one directory per line. Relative paths are relative to the manifest.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    add_merge_arguments(parser)
+    args = parser.parse_args(argv)
+
+    paths = list(args.paths)
+    if args.manifest:
+        try:
+            paths += read_manifest(args.manifest)
+        except OSError as error:
+            print("Could not read manifest.", error)
+            return False
+
+    if not paths:
+        parser.error("No directories given. Pass directories or --manifest.")
+
+    # Two entries for the same directory would only wait on each other's lock
+    unique_paths = list(dict.fromkeys(os.path.realpath(path) for path in paths))
+
+    import concurrent.futures
+
+    started_at = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(
+            executor.map(run_batch_item, unique_paths, itertools.repeat(args))
+        )
+
+    print_batch_report(results, time.perf_counter() - started_at)
+    return all(result["success"] for result in results)
+
+
+def run_batch_item(path: str, args: argparse.Namespace) -> dict[str, typing.Any]:
+    """Runs the merge pipeline for one directory of a batch, capturing its output instead of printing it."""
+    output = io.StringIO()
+    error: str | None = None
+    started_at = time.perf_counter()
+
+    with contextlib.redirect_stdout(output):
+        try:
+            run_merge(path, args)
+        except Exception as exception:
+            error = str(exception) or type(exception).__name__
+
+    return {
+        "path": path,
+        "success": error is None,
+        "seconds": time.perf_counter() - started_at,
+        "output": output.getvalue(),
+        "error": error,
+    }
+
+
+def read_manifest(manifest_path: str) -> list[str]:
+    """
+    Reads directories from a manifest file, one per line. Empty lines and lines starting with # are ignored.
+    Raises OSError on failure.
+    """
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "r") as manifest:
+        return [
+            os.path.join(manifest_directory, line.strip())
+            for line in manifest
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+
+def print_batch_report(results: list[dict[str, typing.Any]], total_seconds: float):
+    for result in results:
+        if result["output"].strip():
+            print(f"--- {result['path']}")
+            print(result["output"].rstrip())
+
+    print("Batch report:")
+    for result in results:
+        status = "OK" if result["success"] else "FAILED"
+        line = f"  {status:<6} {result['seconds']:8.3f}s  {result['path']}"
+        if result["error"]:
+            line += f"  ({result['error']})"
+        print(line)
+
+    succeeded = sum(1 for result in results if result["success"])
+    print(
+        f"{succeeded} succeeded, {len(results) - succeeded} failed in {total_seconds:.3f}s"
+    )
+
+
+def restore_backup(argv: list[str]) -> bool:
+    """
+    Restores or lists backups of axr_options.ltx made by previous runs. The directory is locked while restoring,
+    like while merging. Returns False on failure.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mcm_manager restore",
+        description="Restore axr_options.ltx from a backup.",
+    )
+    parser.add_argument(
+        "reference",
+        nargs="?",
+        help="Hash prefix or timestamp prefix (e.g. 20250101_1200) of the backup to restore.",
+    )
+    parser.add_argument(
+        "--path",
+        default=".",
+        help="Directory containing axr_options.ltx and the backups directory.",
+    )
+    parser.add_argument(
+        "--output",
+        help="File to restore to. Defaults to axr_options.ltx in path.",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List available backups and exit."
+    )
+    args = parser.parse_args(argv)
+
+    store = BackupStore(f"{args.path}/backups")
+    try:
+        if args.list or args.reference is None:
+            for entry in store.entries():
+                print(entry)
+            return True
+
+        output_path = args.output or f"{args.path}/axr_options.ltx"
+        with DirectoryLock(args.path):
+            # Keep what we are about to overwrite, if it is already backed up that backup becomes the newest
+            if os.path.exists(output_path):
+                store.snapshot_file(output_path, datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+            entry = store.restore(args.reference, output_path)
+        print(f"Restored backup {entry.timestamp} ({entry.hash[:12]}) to {output_path}")
+    except ValueError as error:
+        print("Could not restore backup.", error)
+        return False
     except OSError as error:
         print("Something went wrong while reading or writing to files.", error)
+        return False
+
+    return True
+
+
+def three_way_merge(argv: list[str]) -> bool:
+    """
+    Merges a saved options file from an old release into the options file of a new release, and reports which
+    settings the modpack changed, which the user changed and where both changed. Returns False on failure.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mcm_manager three-way",
+        description="Merge axr_options_saved.ltx into a new release's axr_options.ltx, using the old release's "
+        "axr_options.ltx as the common base.",
+    )
+    parser.add_argument("old_default", help="axr_options.ltx of the previous release.")
+    parser.add_argument("new_default", help="axr_options.ltx of the new release.")
+    parser.add_argument("saved", help="axr_options_saved.ltx with the user's settings.")
+    parser.add_argument(
+        "--output",
+        help="File to write the merged options to. Defaults to axr_options_merged.ltx next to new_default.",
+    )
+    parser.add_argument("--report", help="Also write the change and conflict report to this json file.")
+    parser.add_argument(
+        "--prefer",
+        choices=["saved", "new"],
+        default="saved",
+        help="Value to keep when the modpack and the user changed a setting differently. Defaults to saved.",
+    )
+    parser.add_argument(
+        "--output-compression",
+        choices=list(COMPRESSORS),
+        help="Compress the merged file with xz or gz. Compressed input files are always read.",
+    )
+    args = parser.parse_args(argv)
+
+    output_path = args.output or os.path.join(
+        os.path.dirname(args.new_default), "axr_options_merged.ltx"
+    )
+    merge = ThreeWayMerge(args.old_default, args.new_default, args.saved, prefer=args.prefer)
+    try:
+        merge.write(output_path, args.output_compression)
+        if args.report:
+            with open(args.report, "w") as report_file:
+                json.dump(merge.report(), report_file, indent=4)
+    except ValueError as error:
+        print("Could not merge the options files.", error)
+        return False
+    except OSError as error:
+        print("Something went wrong while reading or writing to files.", error)
+        return False
+
+    print(
+        f"Merged into {output_path}: {len(merge.modpack_changes)} changed by the modpack, "
+        f"{len(merge.user_changes)} changed by you, {len(merge.conflicts)} conflicts."
+    )
+    for conflict in merge.conflicts:
+        print(
+            f"Conflict: {conflict['name']} was {conflict['old_default']}, the new release has "
+            f"{conflict['new_default']} and you have {conflict['saved']}. Kept the {conflict['resolved_to']} value."
+        )
+
+    return True
+
+
+def serve(argv: list[str]) -> bool:
+    """
+    Answers merge, diff, validate and backup requests as JSON-RPC on a local socket until interrupted, keeping
+    the parsed options files in memory between requests. Returns False if the service can't be started.
+    """
+    from classes.json_rpc import JsonRpcServer
+
+    parser = argparse.ArgumentParser(
+        prog="mcm_manager serve",
+        description="Serve merge, diff, validate and backup requests as JSON-RPC on a local socket.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVICE_PORT, help="Port to listen on.")
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of a port.")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHED_DOCUMENT_COUNT,
+        help="Number of parsed options files kept in memory.",
+    )
+    add_merge_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.stream:
+        parser.error("--stream can't be used with serve, the service keeps the options files in memory.")
+
+    cache = DocumentCache(lambda file_path: read_document(file_path, args), args.cache_size)
+    try:
+        server = JsonRpcServer(service_methods(cache, args), args.socket or (args.host, args.port))
+    except OSError as error:
+        print("Could not start the merge service.", error)
+        return False
+
+    print(f"Serving on {server.address}. Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped serving.")
+    finally:
+        server.close()
+
+    return True
+
+
+def service_methods(
+    cache: DocumentCache, args: argparse.Namespace
+) -> dict[str, typing.Callable[..., typing.Any]]:
+    """Returns the methods of the merge service, reading options files through cache."""
+    return {
+        "merge": functools.partial(service_merge, cache, args),
+        "diff": functools.partial(service_diff, cache, args),
+        "validate": functools.partial(service_validate, cache, args),
+        "backup": functools.partial(service_backup, cache, args),
+    }
+
+
+def service_merge(
+    cache: DocumentCache,
+    args: argparse.Namespace,
+    path: str,
+    settings_profile: str | None = None,
+    incremental: bool | None = None,
+) -> dict[str, typing.Any]:
+    """
+    Backs up axr_options.ltx in path and merges the user settings into it, like a run of the tool without
+    writing generated_user_settings.json. Raises ValueError if a section is missing and OSError on failure.
+    """
+    default_path = f"{path}/axr_options.ltx"
+    incremental = args.incremental if incremental is None else incremental
 
+    with DirectoryLock(path):
+        user_settings = read_user_settings(path, settings_profile or args.settings_profile)
+        default = cache.get(default_path)
+        user_settings, unmatched_rules = rule_resolver.resolve(user_settings, default)
 
-def check_create_required_files():
+        # Checked before anything is written, like in stream mode
+        for section_name in sorted({MCM_SECTION, *group_settings_by_section(user_settings)}):
+            default.parts(section_name)
+        unknown_settings = find_unknown_settings(default, user_settings)
+
+        backup = make_store_backup(path, datetime.now().strftime("%Y%m%d_%H%M%S"), args)
+        if incremental:
+            patch = SettingsPatch.for_user_settings(default_path, user_settings)
+            written = not patch.is_empty() or detect_compression(default_path) != args.output_compression
+            patch.apply(compression=args.output_compression)
+        else:
+            merged = merge_settings(default, user_settings)
+            written = merged != default.lines or detect_compression(default_path) != args.output_compression
+            if written:
+                write_options_file(default_path, merged, args.output_compression)
+
+        if written:
+            cache.invalidate(default_path)
+
+    return {
+        "written": written,
+        "backup": backup.to_dict() if backup else None,
+        "unknown_settings": unknown_settings,
+        "unmatched_rules": unmatched_rules,
+    }
+
+
+def service_diff(
+    cache: DocumentCache, args: argparse.Namespace, path: str, write: bool = False
+) -> dict[str, typing.Any]:
+    """
+    Returns the settings of axr_options_saved.ltx in path that differ from axr_options.ltx, as they would be
+    written to generated_user_settings.json, along with the names added, removed and changed. Also writes
+    generated_user_settings.json if write is set. Raises ValueError if a file has no [mcm] section.
+    """
+    with DirectoryLock(path):
+        default = cache.get(f"{path}/axr_options.ltx")
+        saved_path = f"{path}/axr_options_saved.ltx"
+        saved = cache.get(saved_path)
+        # Kept with the saved document and keyed on the default's contents, so no other document is held on to
+        generated_json, settings, diff = cache.memoized(
+            saved_path,
+            saved,
+            (default.content_hash(), args.diff_tolerance),
+            lambda: diff_documents(default, saved, args.diff_tolerance),
+        )
+        if write:
+            with open(f"{path}/generated_user_settings.json", "w") as generated_user_settings:
+                generated_user_settings.write(generated_json)
+
+    return {"settings": settings, **diff}
+
+
+def diff_documents(
+    default: LtxDocument, saved: LtxDocument, tolerance: float = 0.0
+) -> tuple[str, dict[str, typing.Any], dict[str, list[str]]]:
+    """
+    Returns the generated_user_settings.json contents for two documents, as text and parsed, along with the
+    names added, removed and changed. Raises ValueError if a document has no [mcm] section.
+    """
+    output = io.StringIO()
+    diff = write_settings_diff_json(
+        get_mcm_settings_getter(default), get_mcm_settings_getter(saved), output, tolerance
+    )
+    return output.getvalue(), json.loads(output.getvalue()), diff.to_dict()
+
+
+def service_validate(
+    cache: DocumentCache, args: argparse.Namespace, path: str, settings_profile: str | None = None
+) -> dict[str, list[str]]:
+    """
+    Returns the user settings of path that aren't present in axr_options.ltx and the rules that match nothing,
+    like the warnings of a run. Raises ValueError if the default file has no [mcm] section.
+    """
+    with DirectoryLock(path):
+        user_settings = read_user_settings(path, settings_profile or args.settings_profile)
+        default = cache.get(f"{path}/axr_options.ltx")
+
+    user_settings, unmatched_rules = rule_resolver.resolve(user_settings, default)
+    return {
+        "unknown_settings": find_unknown_settings(default, user_settings),
+        "unmatched_rules": unmatched_rules,
+    }
+
+
+def service_backup(cache: DocumentCache, args: argparse.Namespace, path: str) -> dict[str, typing.Any]:
+    """Backs up axr_options.ltx in path, returning the new backup or None if it was already stored."""
+    with DirectoryLock(path):
+        backup = make_store_backup(path, datetime.now().strftime("%Y%m%d_%H%M%S"), args)
+
+    return {"backup": backup.to_dict() if backup else None}
+
+
+def settings_history(argv: list[str]) -> bool:
+    """
+    Stores options files in the settings history database, or answers questions about how settings changed
+    across releases from it. Returns False on failure.
+    """
+    import sqlite3
+    from classes.settings_history import KINDS, SettingsHistory
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--path",
+        default=".",
+        help="Directory containing the options files, the backups directory and history.sqlite.",
+    )
+    common.add_argument("--database", help="History database to use. Defaults to history.sqlite in path.")
+
+    parser = argparse.ArgumentParser(
+        prog="mcm_manager history",
+        description="Keep and query the history of MCM settings across GAMMA releases.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", parents=[common], help="Store options files in the history.")
+    ingest.add_argument(
+        "files",
+        nargs="*",
+        help="Options files to store. Files with saved in their name are stored as saved files.",
+    )
+    ingest.add_argument("--release", help="Release the files belong to, e.g. 0.9.3. Required with files.")
+    ingest.add_argument(
+        "--backups",
+        action="store_true",
+        help="Store every backup in the backups directory of path, with its timestamp as the release.",
+    )
+
+    changes = commands.add_parser(
+        "changes", parents=[common], help="Show the releases in which a setting changed."
+    )
+    changes.add_argument(
+        "name", help='Setting name, e.g. "free_zoom/ads_mult" or "global_keybinds::debug_demo_record".'
+    )
+    changes.add_argument("--kind", choices=KINDS, default="default", help="Which files to look at.")
+
+    added = commands.add_parser("added", parents=[common], help="Show the settings a release added.")
+    added.add_argument("release", help="Release to compare with the release before it.")
+    added.add_argument("--removed", action="store_true", help="Show the settings the release removed instead.")
+    added.add_argument("--kind", choices=KINDS, default="default", help="Which files to look at.")
+
+    releases = commands.add_parser("releases", parents=[common], help="List the releases in the history.")
+    releases.add_argument("--kind", choices=KINDS, default="default", help="Which files to look at.")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest" and args.files and not args.release:
+        parser.error("--release is required when storing files.")
+
+    try:
+        with SettingsHistory(args.database or f"{args.path}/history.sqlite") as history:
+            if args.command == "ingest":
+                stored_count = 0
+                for file_path in args.files:
+                    kind = "saved" if "saved" in os.path.basename(file_path) else "default"
+                    stored_count += history.ingest_file(file_path, args.release, kind)
+                if args.backups:
+                    stored_count += history.ingest_backups(BackupStore(f"{args.path}/backups"))
+                print(f"Stored {stored_count} new files in the history.")
+            elif args.command == "changes":
+                print(f"{args.name}:")
+                for release, previous_value, value in history.setting_changes(args.name, args.kind):
+                    print(f"  {release}: {_history_value(previous_value)} -> {_history_value(value)}")
+            elif args.command == "added":
+                names = (history.removed_settings if args.removed else history.added_settings)(
+                    args.release, args.kind
+                )
+                for name in names:
+                    print(name)
+            else:
+                for release in history.releases(args.kind):
+                    print(release)
+    except ValueError as error:
+        print("Could not query the history.", error)
+        return False
+    except (OSError, sqlite3.Error) as error:
+        print("Something went wrong while reading or writing the history.", error)
+        return False
+
+    return True
+
+
+def _history_value(value: str | None) -> str:
+    return "(not present)" if value is None else value
+
+
+def record_history(
+    path: str, release: str, default: LtxDocument | None, saved: LtxDocument
+) -> None:
+    """
+    Stores axr_options.ltx and axr_options_saved.ltx in path in history.sqlite as release, using the documents
+    that were already parsed. Failing to store them is reported but doesn't stop the merge.
+    """
+    import sqlite3
+    from classes.settings_history import SettingsHistory
+
+    try:
+        with SettingsHistory(f"{path}/history.sqlite") as history:
+            history.ingest_file(f"{path}/axr_options.ltx", release, "default", default)
+            history.ingest_file(f"{path}/axr_options_saved.ltx", release, "saved", saved)
+    except (OSError, sqlite3.Error) as error:
+        print("Could not update the settings history.", error)
+
+
+def discover(argv: list[str]) -> bool:
+    """
+    Finds the options files in a GAMMA install and optionally merges the default file of the MCM values mod
+    and the game's own options file through the normal merge pipeline. Returns False on failure.
+    """
+    from classes.options_discovery import SCAN_WORKERS, OptionsFileScanner
+
+    parser = argparse.ArgumentParser(
+        prog="mcm_manager discover",
+        description="Find every axr_options.ltx in a GAMMA install, and optionally merge the ones found.",
+    )
+    parser.add_argument("install", help="GAMMA install directory to search, e.g. C:/GAMMA.")
+    parser.add_argument(
+        "--path",
+        default=".",
+        help="Directory containing settings.json, which the found files are merged in with --merge.",
+    )
+    parser.add_argument(
+        "--index",
+        help="File keeping what every directory of the install contained. Defaults to discovery_index.json "
+        "in path.",
+    )
+    parser.add_argument("--no-index", action="store_true", help="Search every directory, without the index.")
+    parser.add_argument(
+        "--workers", type=int, default=SCAN_WORKERS, help="Number of directories listed at the same time."
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Copy the found default and saved files to path as axr_options.ltx and axr_options_saved.ltx "
+        "and run the merge.",
+    )
+    parser.add_argument("--default", help="Found file to merge as axr_options.ltx, instead of picking one.")
+    parser.add_argument("--saved", help="Found file to merge as axr_options_saved.ltx, instead of picking one.")
+    add_merge_arguments(parser)
+    args = parser.parse_args(argv)
+
+    scanner = OptionsFileScanner(
+        args.install,
+        None if args.no_index else args.index or f"{args.path}/discovery_index.json",
+        args.workers,
+    )
+    try:
+        found = scanner.scan()
+    except OSError as error:
+        print("Could not search the install.", error)
+        return False
+
+    for discovered in found:
+        print(f"  {discovered.kind:<6} {discovered.path}")
+    print(
+        f"Found {len(found)} options files, listed {scanner.listed_directories} directories and reused "
+        f"{scanner.reused_directories} from the index."
+    )
+    if not args.merge:
+        return True
+
+    default_path = args.default or pick_discovered_default(found)
+    if default_path is None:
+        print("Found no axr_options.ltx of the MCM values mod to merge. Pick one with --default.")
+        return False
+    saved_path = args.saved or pick_discovered_saved(found)
+
+    try:
+        with DirectoryLock(args.path):
+            copy_discovered_file(default_path, args.path, "axr_options.ltx", args)
+            if saved_path is not None:
+                copy_discovered_file(saved_path, args.path, "axr_options_saved.ltx", args)
+        print(f"Merging {default_path}" + (f" and {saved_path}" if saved_path else ""))
+        run_merge(args.path, args)
+    except OSError as error:
+        print("Something went wrong while reading or writing to files.", error)
+        return False
+    except ProfileError as error:
+        print("Could not read the user settings. Is a profile not valid json or does it extend itself?", error)
+        return False
+    except ValueError as error:
+        print("Could not read the options files.", error)
+        return False
+
+    return True
+
+
+def pick_discovered_default(found: "list[DiscoveredFile]") -> str | None:
+    """Returns the most recently changed axr_options.ltx of an MCM values mod that wasn't renamed to saved."""
+    candidates = [
+        discovered
+        for discovered in found
+        if discovered.kind == "mod"
+        and "mcm values" in discovered.mod.lower()
+        and "saved" not in discovered.mod.lower()
+    ]
+    return max(candidates, key=lambda discovered: discovered.mtime_ns).path if candidates else None
+
+
+def pick_discovered_saved(found: "list[DiscoveredFile]") -> str | None:
+    """
+    Returns the options file the game last saved, falling back to the file of an MCM values mod renamed to
+    saved, or None if neither was found.
+    """
+    for candidates in (
+        [discovered for discovered in found if discovered.kind == "game"],
+        [
+            discovered
+            for discovered in found
+            if discovered.kind == "mod"
+            and "mcm values" in discovered.mod.lower()
+            and "saved" in discovered.mod.lower()
+        ],
+    ):
+        if candidates:
+            return max(candidates, key=lambda discovered: discovered.mtime_ns).path
+
+    return None
+
+
+def copy_discovered_file(source_path: str, path: str, name: str, args: argparse.Namespace) -> None:
+    """
+    Copies a found options file to name in path, backing up axr_options.ltx before it is replaced. Does nothing
+    if the files are the same. Raises OSError on failure.
+    """
+    import filecmp
+
+    destination_path = f"{path}/{name}"
+    if os.path.exists(destination_path):
+        if filecmp.cmp(source_path, destination_path, shallow=False):
+            return
+        if name == "axr_options.ltx":
+            make_store_backup(path, datetime.now().strftime("%Y%m%d_%H%M%S"), args)
+
+    shutil.copyfile(source_path, destination_path)
+
+
+def read_document(file_path: str, args: argparse.Namespace) -> LtxDocument:
+    """Reads and parses an options file, through its parse cache unless disabled. Raises OSError on failure."""
+    cache = ParseCache(file_path)
+    if args.clear_cache:
+        cache.clear()
+
+    if args.no_cache:
+        return LtxDocument.from_file(file_path)
+
+    return cache.load_document()
+
+
+def check_create_required_files(path: str):
     """Creates the required files if not present. Otherwise does nothing."""
     required_files = [
         f"{path}/settings.json",
@@ -54,8 +1264,25 @@ def check_create_required_files():
             open(file_path, "w").close()
 
 
+def resolve_setting_rules(
+    default: list[str] | LtxDocument, user_settings: dict[str, typing.Any]
+) -> dict[str, typing.Any]:
+    """
+    Replaces rules in the user settings, like "fftd/*/mapmpm" or "SMR/smr_loot/*_spawn", with the settings
+    of the default file they match. Warns about rules that don't match anything.
+    """
+    resolved_settings, unmatched_rules = rule_resolver.resolve(user_settings, LtxDocument.of(default))
+
+    if unmatched_rules:
+        print("The following rules don't match any setting in the default file:")
+        for rule in unmatched_rules:
+            print(f"  {rule} = {user_settings[rule]}")
+
+    return resolved_settings
+
+
 def print_settings_and_default_file_diff(
-    default: list[str], user_settings: dict[str, str]
+    default: list[str] | LtxDocument, user_settings: dict[str, str]
 ):
     """
     Check to see if any of our settings are not valid, as in not present in the default file.
@@ -63,21 +1290,12 @@ def print_settings_and_default_file_diff(
     This is mainly a warning to users that they might have settings that are not recognized by the game.
     """
     try:
-        raw_default_mcm_settings, _, _ = get_settings_section(default, "[mcm]\n")
-        default_mcm_settings_names = {
-            get_setting_from_line(line, "=").name if "=" in line else ""
-            for line in raw_default_mcm_settings
-        }
-
-        diff: list[str] = []
-        for setting_name, value in user_settings.items():
-            if setting_name not in default_mcm_settings_names:
-                diff.append(f"{setting_name} = {value}")
+        unknown_settings = find_unknown_settings(default, user_settings)
 
-        if diff:
+        if unknown_settings:
             print("The following settings are not present in the default file:")
-            for line in diff:
-                print(f"  {line}")
+            for setting_name in unknown_settings:
+                print(f"  {setting_name} = {user_settings[setting_name]}")
             print(
                 "This CAN mean that the game does not recognize these settings. If all settings are working, you can ignore this message."
             )
@@ -88,58 +1306,82 @@ def print_settings_and_default_file_diff(
         )
 
 
+def find_unknown_settings(
+    default: list[str] | LtxDocument, user_settings: dict[str, typing.Any]
+) -> list[str]:
+    """
+    Returns the names of the user settings that aren't present in the default file, looking up names with a
+    section:: prefix in their own section. Raises ValueError if the default file has no [mcm] section.
+    """
+    document = LtxDocument.of(default)
+    document.settings(MCM_SECTION)
+
+    unknown_settings: list[str] = []
+    for setting_name in user_settings:
+        section_name, key = split_setting_name(setting_name)
+        if not document.has_section(section_name) or key not in document.settings(section_name):
+            unknown_settings.append(setting_name)
+
+    return unknown_settings
+
+
 def create_json_file_from_user_and_default_settings_diff(
-    default: list[str], user_axr_ltx_settings: list[str], path: str
-):
+    default: list[str] | LtxDocument,
+    user_axr_ltx_settings: list[str] | LtxDocument,
+    path: str,
+    tolerance: float = 0.0,
+) -> SettingsDiff | None:
     """
     Generates a json file based on the difference in existing user defined axr_options.ltx and default axr_options.ltx
     The point of this is to not have to go through custom settings manually and compare with default.
+    The sorted [mcm] sections are diffed in one pass and the json is written while diffing. Values are compared by
+    type, numbers at most tolerance apart count as the same, and booleans and numbers are written as json types.
+    Returns the added, removed and changed setting names, or None if a file has no [mcm] section.
     """
     try:
-        raw_default_mcm_settings, _, _ = get_settings_section(default, "[mcm]\n")
-        raw_user_mcm_settings, _, _ = get_settings_section(
-            user_axr_ltx_settings, "[mcm]\n"
-        )
+        get_default_settings = get_mcm_settings_getter(default)
+        get_user_settings = get_mcm_settings_getter(user_axr_ltx_settings)
     except ValueError:
         print(
             "Could not create generated_user_settings.json. Is one of the files missing the MCM section?"
         )
-        return
+        return None
 
-    json_data: dict[str, typing.Any] = {}
+    with open(f"{path}/generated_user_settings.json", "w") as generated_user_settings:
+        return write_settings_diff_json(
+            get_default_settings, get_user_settings, generated_user_settings, tolerance
+        )
 
-    default_mcm_settings = parse_settings_from_lines(raw_default_mcm_settings)
-    user_mcm_settings = parse_settings_from_lines(raw_user_mcm_settings)
 
-    for user_setting_name, user_setting in user_mcm_settings.items():
-        if not default_mcm_settings.get(user_setting_name):
-            json_data[user_setting_name] = user_setting.value
-            continue
+def get_mcm_settings_getter(
+    source: list[str] | LtxDocument,
+) -> typing.Callable[[], typing.Iterable[tuple[str, ...]]]:
+    """
+    Returns a function giving the (name, value) items of the [mcm] section of source in file order.
+    Lines are tokenized all at once, like a document's sections. Raises ValueError if there is no [mcm] section.
+    """
+    if isinstance(source, LtxDocument):
+        settings = source.settings(MCM_SECTION)
+    else:
+        settings, _, _ = ltx_tokenizer.tokenize_settings(get_settings_section(source, "[mcm]\n")[0])
 
-        default_setting = default_mcm_settings[user_setting_name]
-        if user_setting.value != default_setting.value:
-            json_data[user_setting_name] = user_setting.value
+    return lambda: ((name, setting.value) for name, setting in settings.items())
 
-    with open(f"{path}/generated_user_settings.json", "w") as generated_user_settings:
-        generated_user_settings.writelines(json.dumps(json_data))
 
+def parse_settings_from_lines(lines: list[str] | bytes) -> dict[str, Setting]:
+    """
+    Parse settings from a list of lines, returning a dictionary of setting name to Setting object.
+    The bytes of a file can be given instead, they are decoded and split into lines first.
+    """
+    if isinstance(lines, bytes):
+        return ltx_tokenizer.parse_settings(lines)
 
-def parse_settings_from_lines(lines: list[str]) -> dict[str, Setting]:
-    """Parse settings from a list of lines, returning a dictionary of setting name to Setting object."""
-    settings: dict[str, Setting] = {}
-    for line in lines:
-        if "=" in line:
-            setting = get_setting_from_line(line, "=")
-            settings[setting.name] = setting
+    settings, _, _ = ltx_tokenizer.tokenize_settings(lines)
     return settings
 
 
 def get_setting_from_line(line: str, separator: str) -> Setting:
-    setting_data = line.strip().split(separator)
-    name = setting_data[0].strip()
-    value = setting_data[1].strip() if len(setting_data) >= 2 else ""
-
-    return Setting(name, value)
+    return Setting.from_line(line, separator)
 
 
 def make_file_backup(file_contents: list[str], path: str) -> None:
@@ -148,85 +1390,238 @@ def make_file_backup(file_contents: list[str], path: str) -> None:
         file.writelines(file_contents)
 
 
+def make_store_backup(path: str, timestamp: str, args: argparse.Namespace) -> BackupEntry | None:
+    """
+    Backs up axr_options.ltx in path to the backup store, unless identical contents are already stored.
+    Old backups are then pruned according to the retention arguments. Returns the new backup, or None if the
+    contents were already stored. Raises OSError on failure.
+    """
+    store = BackupStore(f"{path}/backups", args.backup_compression)
+    entry = store.snapshot_file(f"{path}/axr_options.ltx", timestamp)
+    store.apply_retention(args.keep_last, args.keep_daily, args.keep_weekly)
+    return entry
+
+
 def merge_settings(
-    default: list[str], user_settings: dict[str, typing.Any]
+    default: list[str] | LtxDocument, user_settings: dict[str, typing.Any]
 ) -> list[str]:
     """
     Merge the user settings with the default file.
     This will overwrite any existing settings in the default file with the corresponding new settings.
+    Names like "global_keybinds::debug_demo_record" go to their section, other names to the [mcm] section.
+    Every copy of a setting is updated, in every part of a section whose header is repeated. A setting that
+    isn't in the first part of its section is added to it, then the first part is sorted.
     """
-    applied_settings: set[str] = set()
     EIGHT_SPACES = (
         " " * 8
     )  # This is how MCM settings are indented in the default axr_options.ltx
 
+    document = LtxDocument.of(default)
+    merged = list(document.lines)
+    sections = {MCM_SECTION: {}, **group_settings_by_section(user_settings)}
+
     try:
-        mcm_settings, mcm_settings_start_index, mcm_settings_end_index = (
-            get_settings_section(default, "[mcm]\n")
-        )
+        section_merges: list[tuple[int, int, list[str]]] = []
+        for section_name, section_user_settings in sections.items():
+            _, section_start_index, section_end_index = document.section(section_name)
+            line_numbers = document.line_numbers(section_name)
 
-        # First pass: update existing default settings with user settings
-        for i, line in enumerate(mcm_settings):
-            if "=" not in line:
-                continue
+            # First pass: update every copy of the existing default settings, in every part of the section
+            unapplied_settings: list[str] = []
+            for setting_name, value in section_user_settings.items():
+                setting_line = f"{EIGHT_SPACES}{Setting(setting_name, value)}"
+                setting_line_numbers = (
+                    document.setting_line_numbers(section_name, setting_name)
+                    if setting_name in line_numbers and setting_name != ""
+                    else []
+                )
+                for line_number in setting_line_numbers:
+                    merged[line_number] = setting_line
+                # Like in stream mode, which can't look ahead, a setting missing from the first part is added to it
+                if not setting_line_numbers or setting_line_numbers[0] >= section_end_index:
+                    unapplied_settings.append(setting_line)
 
-            default_setting = get_setting_from_line(line, "=")
+            section_merges.append((section_start_index, section_end_index, unapplied_settings))
 
-            if default_setting.name in user_settings and default_setting.name != "":
-                user_setting = Setting(
-                    default_setting.name, user_settings[default_setting.name]
-                )
-                mcm_settings[i] = f"{EIGHT_SPACES}{user_setting}"
-                applied_settings.add(default_setting.name)
-
-        # Second pass: add any settings that weren't found in the default axr_options file
-        unapplied_settings = {
-            Setting(setting_name, value)
-            for setting_name, value in user_settings.items()
-            if setting_name not in applied_settings
-        }
-        for user_setting in unapplied_settings:
-            mcm_settings.append(
-                f"{EIGHT_SPACES}{user_setting}",
+        # Second pass: add any settings that weren't found to the first part of their section.
+        # Going from the end of the file keeps the indices of the earlier sections valid.
+        for section_start_index, section_end_index, unapplied_settings in sorted(section_merges, reverse=True):
+            merged[section_start_index + 1 : section_end_index] = iter_sorted_section(
+                merged[section_start_index + 1 : section_end_index], unapplied_settings
             )
 
-        return (
-            default[: mcm_settings_start_index + 1]
-            + sorted(mcm_settings)
-            + default[mcm_settings_end_index:]
-        )
+        return merged
     except ValueError as error:
-        print(
-            """
-        Could not merge settings. Failed to get mcm settings from default file.
-        This probably means that there is no MCM section in the default file.
+        print_merge_error(error)
+        return document.lines
+
+
+def iter_merged_settings(
+    default: typing.Iterable[str], user_settings: dict[str, typing.Any]
+) -> typing.Iterator[str]:
+    """
+    Streaming version of merge_settings, yields the same lines as merge_settings returns.
+    Lines are passed through as they are read. Only the first part of a section with user settings is held
+    in memory, since it has to be sorted. Like in merge_settings every copy of a setting is updated, and a
+    setting that isn't in the first part of its section, even if a later part has it, is added to the first part.
+    """
+    EIGHT_SPACES = " " * 8
+    sections = {MCM_SECTION: {}, **group_settings_by_section(user_settings)}
+    applied_settings: dict[str, set[str]] = {section_name: set() for section_name in sections}
+    seen_sections: set[str] = set()
+
+    current_section: str | None = None
+    section_part: list[str] | None = None  # Lines of the first part of the current section, if it is held
+    blank_lines: list[str] = []
+
+    def finish_part() -> typing.Iterator[str]:
+        if section_part is not None:
+            unapplied_settings = [
+                f"{EIGHT_SPACES}{Setting(setting_name, value)}"
+                for setting_name, value in sections[current_section].items()
+                if setting_name not in applied_settings[current_section]
+            ]
+            applied_settings[current_section].update(sections[current_section])
+            yield from iter_sorted_section(section_part, unapplied_settings)
+        yield from blank_lines
+        blank_lines.clear()
+
+    for line in default:
+        if line.startswith("["):
+            yield from finish_part()
+            current_section = line.strip()[1:-1]
+            section_part = (
+                [] if current_section in sections and current_section not in seen_sections else None
+            )
+            seen_sections.add(current_section)
+            yield line
+            continue
+
+        # Blank lines are held back until we know whether the section continues after them
+        if current_section is not None and line.strip(" ") == "\n":
+            blank_lines.append(line)
+            continue
+
+        if current_section in sections and "=" in line:
+            setting_name = get_setting_from_line(line, "=").name
+            section_user_settings = sections[current_section]
+            if setting_name in section_user_settings and setting_name != "":
+                line = f"{EIGHT_SPACES}{Setting(setting_name, section_user_settings[setting_name])}"
+                applied_settings[current_section].add(setting_name)
+
+        if section_part is not None:
+            section_part.extend(blank_lines)
+            section_part.append(line)
+            blank_lines.clear()
+        else:
+            yield from blank_lines
+            blank_lines.clear()
+            yield line
+
+    yield from finish_part()
+
+    for section_name in sections:
+        if section_name not in seen_sections:
+            print_merge_error(ValueError(f"[{section_name}] is not present in options file"))
+
+
+def write_merged_settings(
+    source_path: str,
+    destination_path: str,
+    user_settings: dict[str, typing.Any],
+    compression: str | None = None,
+) -> None:
+    """
+    Streams the merge of source_path and user settings into destination_path, compressed if compression is "gz"
+    or "xz". A compressed source is decompressed while it is read, so neither file is ever held in memory.
+    Output goes to a temporary file first, so source and destination can be the same file. Raises OSError on failure.
+    """
+    destination_directory = os.path.dirname(os.path.abspath(destination_path))
+
+    with open_input(source_path) as source, tempfile.NamedTemporaryFile(
+        "wb", dir=destination_directory, delete=False
+    ) as destination_file:
+        try:
+            with output_stream(destination_file, compression) as destination:
+                destination.writelines(iter_merged_settings(source, user_settings))
+        except BaseException:
+            destination_file.close()
+            os.unlink(destination_file.name)
+            raise
+
+    shutil.copymode(source_path, destination_file.name)
+    os.replace(destination_file.name, destination_path)
+
+
+def write_options_file(file_path: str, lines: list[str], compression: str | None = None) -> None:
+    """Writes lines to file_path, compressed if compression is "gz" or "xz". Raises OSError on failure."""
+    with open(file_path, "wb") as file, output_stream(file, compression) as options_file:
+        options_file.writelines(lines)
+
+
+def iter_sorted_section(
+    section_lines: list[str], added_lines: list[str]
+) -> typing.Iterator[str]:
+    """
+    Yields section_lines and added_lines in the same order as sorted(section_lines + added_lines), except that a
+    blank line stays right after the line it followed.
+    The game writes sections sorted. This relies on sorted being Timsort, whose run detection takes the whole section
+    as one sorted run, so only the few added lines are sorted and the two runs are merged in linear time. That is
+    O(n + k log k) like heapq.merge, without a Python call per line. Falls back to sorting line groups if
+    section_lines turns out not to be sorted.
+    """
+    if all(map(operator.le, section_lines, itertools.islice(section_lines, 1, None))):
+        # Blank lines sort before settings, so in a sorted section they can only be at the top, where they stay
+        return iter(sorted(itertools.chain(section_lines, added_lines)))
+
+    # Every line with the blank lines following it, the blank lines before any setting come first
+    leading_blank_lines: list[str] = []
+    groups: list[list[str]] = []
+    for line in section_lines:
+        if line.strip(" ") == "\n":
+            (groups[-1] if groups else leading_blank_lines).append(line)
+        else:
+            groups.append([line])
+
+    groups.extend([line] for line in added_lines)
+    groups.sort(key=operator.itemgetter(0))
+    return itertools.chain(leading_blank_lines, itertools.chain.from_iterable(groups))
+
+
+def print_merge_error(error: ValueError):
+    print(
+        """
+        Could not merge settings. Failed to get a section from the default file.
+        This probably means that there is no MCM section in the default file,
+        or a section:: prefix in settings.json names a section the default file doesn't have.
         """,
-            error,
-        )
-        return default
+        error,
+    )
 
 
 def get_settings_section(
-    file_contents: list[str], section_name: str
+    file_contents: list[str] | bytes, section_name: str
 ) -> tuple[list[str], int, int]:
     """
     Returns the provided section from an options file, along with start and end index for section.
+    The section runs until the next section header, without its trailing blank lines.
+    Only the first occurrence of a repeated section is returned, LtxDocument indexes all of them.
+    The bytes of a file can be given instead of lines, then only the lines of the section are decoded.
     Raises ValueError if section is not present.
 
     Example: mcm_settings = get_settings_section(file_contents, "[mcm]\\n")
     """
+    if isinstance(file_contents, bytes):
+        return ltx_tokenizer.section_lines(file_contents, section_name.strip()[1:-1])
+
     settings_section_start_index = file_contents.index(section_name)
-    settings_section_end_index = None
+    settings_section_end_index = settings_section_start_index + 1
     for i in range(settings_section_start_index + 1, len(file_contents)):
-        if file_contents[i].startswith("[") or file_contents[i].strip(" ") == "\n":
-            settings_section_end_index = (
-                i  # We only want actual settings, not new sections
-            )
-            break
-
-    # If we have start of mcm but no end, we assume the MCM settings are at the end of the file
-    if settings_section_end_index is None:
-        settings_section_end_index = len(file_contents)
+        if file_contents[i].startswith("["):
+            break  # We only want actual settings, not new sections
+        if file_contents[i].strip(" ") != "\n":
+            # Blank lines only belong to the section if more settings follow them
+            settings_section_end_index = i + 1
 
     mcm_settings = file_contents[
         settings_section_start_index
@@ -236,5 +1631,42 @@ def get_settings_section(
     return mcm_settings, settings_section_start_index, settings_section_end_index
 
 
+def iter_sections(
+    file_contents: typing.Iterable[str], section_names: typing.Collection[str]
+) -> typing.Iterator[str]:
+    """
+    Yields the header and lines of every part of the named sections while reading file_contents,
+    without trailing blank lines. Yields nothing if no section is present.
+
+    Example: mcm_lines = list(iter_sections(file, {"mcm"}))
+    """
+    in_section = False
+    blank_lines: list[str] = []
+
+    for line in file_contents:
+        if line.startswith("["):
+            in_section = line.strip()[1:-1] in section_names
+            blank_lines.clear()
+            if in_section:
+                yield line
+            continue
+
+        if not in_section:
+            continue
+
+        # Blank lines only belong to the section if more settings follow them
+        if line.strip(" ") == "\n":
+            blank_lines.append(line)
+            continue
+
+        yield from blank_lines
+        blank_lines.clear()
+        yield line
+
+
 if __name__ == "__main__":
-    main()
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+
+        multiprocessing.freeze_support()  # Batch mode uses worker processes, which needs this in the frozen exe
+    sys.exit(main())
@@ -3,14 +3,73 @@ Test runner for axr_options module.
 Run with: python run_tests.py [test_name]
 """
 
+import argparse
+import json
+import os
+import platform
 import sys
 import unittest
-from . import test_mcm_manager
+from benchmarks import run_benchmarks
+from . import (
+    test_mcm_manager,
+    test_ltx_document,
+    test_streaming_merge,
+    test_backup_store,
+    test_batch_merge,
+    test_parse_cache,
+    test_settings_patch,
+    test_file_watcher,
+    test_benchmarks,
+    test_instrumentation,
+    test_three_way_merge,
+    test_settings_diff,
+    test_section_settings,
+    test_setting_rules,
+    test_ltx_tokenizer,
+    test_settings_profile,
+    test_settings_history,
+    test_concurrent_loading,
+    test_merge_service,
+    test_options_discovery,
+    test_typed_values,
+    test_compression,
+)
+
+# Per machine, so it isn't checked in
+PERF_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "perf_baseline.json")
+PERF_THRESHOLD = 0.5
+
+TEST_MODULES = [
+    test_mcm_manager,
+    test_ltx_document,
+    test_streaming_merge,
+    test_backup_store,
+    test_batch_merge,
+    test_parse_cache,
+    test_settings_patch,
+    test_file_watcher,
+    test_benchmarks,
+    test_instrumentation,
+    test_three_way_merge,
+    test_settings_diff,
+    test_section_settings,
+    test_setting_rules,
+    test_ltx_tokenizer,
+    test_settings_profile,
+    test_settings_history,
+    test_concurrent_loading,
+    test_merge_service,
+    test_options_discovery,
+    test_typed_values,
+    test_compression,
+]
 
 def run_all_tests():
     """Run all test cases"""
     loader = unittest.TestLoader()
-    suite = loader.loadTestsFromModule(test_mcm_manager)
+    suite = unittest.TestSuite(
+        loader.loadTestsFromModule(module) for module in TEST_MODULES
+    )
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
     return result.wasSuccessful()
@@ -31,6 +90,64 @@ def run_specific_test(test_name: str):
         print(f"Test '{test_name}' not found!")
         return False
 
+def run_perf_checks(argv: list[str]) -> bool:
+    """
+    Times the parse, merge, diff and full pipeline scenarios on generated files and compares their fastest runs
+    with the baseline of this machine. Returns False if a scenario got slower than the threshold allows.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.run_tests --perf",
+        description="Fail when parsing, merging or diffing got slower than the stored baseline of this machine.",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Store the times of this run as the new baseline."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=PERF_THRESHOLD,
+        help="Fraction the fastest run may grow before it fails, e.g. 0.5 for 50%%.",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per scenario.")
+    parser.add_argument("--baseline", default=PERF_BASELINE_PATH, help="Baseline json file to compare with.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks.run_benchmarks(
+        run_benchmarks.PERF_SIZES,
+        args.repeat,
+        0.9,
+        run_benchmarks.PERF_BENCHMARKS,
+        trace_memory=False,
+        min_total_seconds=run_benchmarks.PERF_MIN_TOTAL_SECONDS,
+    )
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        run_benchmarks.write_results(args.baseline, results)
+        print(f"Stored the times of this run as the baseline in {args.baseline}")
+        return True
+
+    with open(args.baseline, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline["machine"] != platform.node():
+        print(
+            f"The baseline was measured on {baseline['machine']}, not on this machine. "
+            "Run with --update-baseline to measure one here."
+        )
+        return False
+
+    regressions = run_benchmarks.find_regressions(results, baseline["results"], args.threshold)
+    for result, previous in regressions:
+        print(
+            f"REGRESSION {result['benchmark']} on {result['lines']} lines: "
+            f"{result['min_seconds'] * 1000:.3f} ms, was {previous['min_seconds'] * 1000:.3f} ms "
+            f"({result['min_seconds'] / previous['min_seconds']:.2f}x)"
+        )
+    print(
+        f"{len(regressions)} of {len(results)} scenarios got more than {args.threshold:.0%} slower "
+        f"than the baseline of {baseline['created_at']}."
+    )
+    return not regressions
+
 def list_available_tests():
     """List all available test methods"""
     test_class = test_mcm_manager.TestAxrOptions
@@ -51,6 +168,11 @@ if __name__ == '__main__':
         # List available tests
         list_available_tests()
     
+    elif sys.argv[1] == '--perf':
+        # Compare the speed with the baseline of this machine
+        success = run_perf_checks(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
     elif sys.argv[1].startswith('test_'):
         # Run specific test
         test_name = sys.argv[1]
@@ -63,4 +185,6 @@ if __name__ == '__main__':
         print("  python run_tests.py                  # Run all tests")
         print("  python run_tests.py --list           # List available tests")
         print("  python run_tests.py test_name        # Run specific test")
+        print("  python run_tests.py --perf           # Compare speed with this machine's baseline")
+        print("  python run_tests.py --perf --update-baseline")
         sys.exit(1)
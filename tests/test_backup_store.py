@@ -0,0 +1,145 @@
+import unittest
+import tempfile
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.backup_store import BackupStore
+from classes.directory_lock import DirectoryLock
+
+
+class TestBackupStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.options_path = os.path.join(self.temp_dir.name, "axr_options.ltx")
+        self.store = BackupStore(os.path.join(self.temp_dir.name, "backups"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_options(self, contents: str):
+        with open(self.options_path, "w") as options_file:
+            options_file.write(contents)
+
+    def test_identical_snapshots_are_skipped(self):
+        """Test that a snapshot is only stored once per unique content"""
+        self.write_options("[mcm]\n        a = 1\n")
+
+        first_entry = self.store.snapshot_file(self.options_path, "20250101_120000")
+        second_entry = self.store.snapshot_file(self.options_path, "20250101_130000")
+
+        self.assertIsNotNone(first_entry)
+        self.assertIsNone(second_entry)
+        self.assertEqual(len(self.store.entries()), 1)
+
+    def test_identical_snapshot_becomes_the_newest(self):
+        """Test that backing up contents that are already stored keeps them as the newest snapshot"""
+        self.write_options("first\n")
+        first_entry = self.store.snapshot_file(self.options_path, "20250101_120000")
+        self.write_options("second\n")
+        self.store.snapshot_file(self.options_path, "20250102_120000")
+        self.write_options("first\n")
+        self.assertIsNone(self.store.snapshot_file(self.options_path, "20250103_120000"))
+
+        assert first_entry is not None
+        self.assertEqual(
+            [(entry.hash, entry.timestamp) for entry in self.store.entries()][-1],
+            (first_entry.hash, "20250103_120000"),
+        )
+        self.store.apply_retention(keep_last=1, keep_daily=0, keep_weekly=0)
+        self.assertEqual([entry.hash for entry in self.store.entries()], [first_entry.hash])
+
+    def test_restore_by_hash_and_timestamp(self):
+        """Test restoring snapshots by hash prefix and by timestamp prefix"""
+        self.write_options("first\n")
+        first_entry = self.store.snapshot_file(self.options_path, "20250101_120000")
+        self.write_options("second\n")
+        self.store.snapshot_file(self.options_path, "20250102_120000")
+
+        assert first_entry is not None
+        self.store.restore(first_entry.hash[:8], self.options_path)
+        with open(self.options_path, "r") as options_file:
+            self.assertEqual(options_file.read(), "first\n")
+
+        self.store.restore("20250102", self.options_path)
+        with open(self.options_path, "r") as options_file:
+            self.assertEqual(options_file.read(), "second\n")
+
+    def test_restore_unknown_reference(self):
+        """Test error when no snapshot matches"""
+        with self.assertRaises(ValueError):
+            self.store.restore("deadbeef", self.options_path)
+
+    def test_gzip_compression(self):
+        """Test storing and restoring with gzip instead of xz"""
+        store = BackupStore(os.path.join(self.temp_dir.name, "backups"), "gz")
+        self.write_options("gzip\n")
+
+        entry = store.snapshot_file(self.options_path, "20250101_120000")
+        self.write_options("changed\n")
+
+        assert entry is not None
+        self.assertTrue(entry.file_name.endswith(".gz"))
+        store.restore(entry.hash, self.options_path)
+        with open(self.options_path, "r") as options_file:
+            self.assertEqual(options_file.read(), "gzip\n")
+
+    def test_apply_retention(self):
+        """Test that only snapshots matching a retention rule are kept"""
+        timestamps = [
+            "20250101_100000",
+            "20250101_110000",
+            "20250102_100000",
+            "20250102_110000",
+            "20250103_100000",
+        ]
+        for i, timestamp in enumerate(timestamps):
+            self.write_options(f"version {i}\n")
+            self.store.snapshot_file(self.options_path, timestamp)
+
+        removed = self.store.apply_retention(keep_last=1, keep_daily=2, keep_weekly=0)
+
+        self.assertEqual(
+            [entry.timestamp for entry in removed],
+            ["20250101_100000", "20250101_110000", "20250102_100000"],
+        )
+        self.assertEqual(
+            [entry.timestamp for entry in self.store.entries()],
+            ["20250102_110000", "20250103_100000"],
+        )
+        self.assertEqual(len(os.listdir(self.store.directory)), 3)  # 2 snapshots and the index
+
+    def test_restore_command(self):
+        """Test that restore locks the directory and reports failures in its exit status"""
+        self.write_options("first\n")
+        entry = self.store.snapshot_file(self.options_path, "20250101_120000")
+        self.write_options("second\n")
+
+        assert entry is not None
+        with patch("mcm_manager.DirectoryLock", wraps=DirectoryLock) as lock, patch("builtins.print"):
+            self.assertEqual(mcm_manager.main(["restore", entry.hash[:8], "--path", self.temp_dir.name]), 0)
+        lock.assert_called_once_with(self.temp_dir.name)
+        with open(self.options_path, "r") as options_file:
+            self.assertEqual(options_file.read(), "first\n")
+        # What was overwritten is backed up
+        self.assertEqual(len(self.store.entries()), 2)
+
+        with patch("builtins.print") as mock_print:
+            self.assertEqual(mcm_manager.main(["restore", "deadbeef", "--path", self.temp_dir.name]), 1)
+        mock_print.assert_any_call("Could not restore backup.", unittest.mock.ANY)
+
+    def test_main_backs_up_once_per_content(self):
+        """Test that repeated runs without changes don't create new backups"""
+        self.write_options("[mcm]\n        a = 1\n")
+
+        with patch("builtins.print"):
+            mcm_manager.main([self.temp_dir.name])
+            mcm_manager.main([self.temp_dir.name])
+
+        self.assertEqual(len(self.store.entries()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
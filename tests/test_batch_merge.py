@@ -0,0 +1,118 @@
+import unittest
+import tempfile
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.directory_lock import DirectoryLock
+
+
+class TestBatchMerge(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.default_content = [
+            "[mcm]\n",
+            "        3d_scopes/chromatism             = true\n",
+            "        EA_settings/ea_debug             = false\n",
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_profile(self, name: str, settings: dict[str, object]) -> str:
+        profile_path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(profile_path)
+        with open(os.path.join(profile_path, "axr_options.ltx"), "w") as default_file:
+            default_file.writelines(self.default_content)
+        with open(os.path.join(profile_path, "settings.json"), "w") as settings_file:
+            json.dump(settings, settings_file)
+
+        return profile_path
+
+    def read_options(self, profile_path: str) -> list[str]:
+        with open(os.path.join(profile_path, "axr_options.ltx"), "r") as default_file:
+            return default_file.readlines()
+
+    def test_batch_merge_directories(self):
+        """Test merging several directories in one batch"""
+        first_path = self.create_profile("first", {"3d_scopes/chromatism": False})
+        second_path = self.create_profile("second", {"EA_settings/ea_debug": True})
+
+        with patch("builtins.print") as mock_print:
+            success = mcm_manager.batch_merge([first_path, second_path, "--workers", "2"])
+
+        self.assertTrue(success)
+        self.assertIn("        3d_scopes/chromatism = false\n", self.read_options(first_path))
+        self.assertIn("        EA_settings/ea_debug = true\n", self.read_options(second_path))
+        report = "".join(str(call) for call in mock_print.call_args_list)
+        self.assertIn("2 succeeded, 0 failed", report)
+
+    def test_batch_merge_manifest_with_failure(self):
+        """Test reading directories from a manifest and reporting failed directories"""
+        profile_path = self.create_profile("profile", {"3d_scopes/chromatism": False})
+        manifest_path = os.path.join(self.temp_dir.name, "manifest.txt")
+        with open(manifest_path, "w") as manifest:
+            manifest.write("# Profiles\nprofile\n\nmissing\n")
+
+        with patch("builtins.print") as mock_print:
+            success = mcm_manager.batch_merge(["--manifest", manifest_path])
+
+        self.assertFalse(success)
+        self.assertIn("        3d_scopes/chromatism = false\n", self.read_options(profile_path))
+        report = "".join(str(call) for call in mock_print.call_args_list)
+        self.assertIn("1 succeeded, 1 failed", report)
+
+    def test_directory_lock_is_exclusive(self):
+        """Test that a locked directory can't be locked again until released"""
+        with DirectoryLock(self.temp_dir.name):
+            with self.assertRaises(TimeoutError):
+                DirectoryLock(self.temp_dir.name, timeout=0.1).acquire()
+
+        with DirectoryLock(self.temp_dir.name, timeout=0.1):
+            pass
+
+        self.assertFalse(
+            os.path.exists(os.path.join(self.temp_dir.name, DirectoryLock.LOCK_FILE_NAME))
+        )
+
+    def test_lock_of_killed_process_is_taken_over(self):
+        """Test that the lock file left by a killed process doesn't keep the directory locked"""
+        holder = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys, time\n"
+                "from classes.directory_lock import DirectoryLock\n"
+                f"DirectoryLock({self.temp_dir.name!r}).acquire()\n"
+                "print('locked', flush=True)\n"
+                "time.sleep(60)\n",
+            ],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            self.assertEqual(holder.stdout.readline(), "locked\n")
+            lock_path = os.path.join(self.temp_dir.name, DirectoryLock.LOCK_FILE_NAME)
+            with open(lock_path) as lock_file:
+                self.assertEqual(lock_file.read(), str(holder.pid))
+            with self.assertRaises(TimeoutError):
+                DirectoryLock(self.temp_dir.name, timeout=0.1).acquire()
+        finally:
+            holder.kill()
+            holder.wait()
+            holder.stdout.close()
+
+        self.assertTrue(os.path.exists(lock_path))
+        with DirectoryLock(self.temp_dir.name, timeout=0.1):
+            with open(lock_path) as lock_file:
+                self.assertEqual(lock_file.read(), str(os.getpid()))
+        self.assertFalse(os.path.exists(lock_path))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
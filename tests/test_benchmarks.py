@@ -0,0 +1,109 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from benchmarks import generate, run_benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generated_options_file(self):
+        """Test that generated files have the requested size and a sorted, namespaced [mcm] section"""
+        lines = list(generate.generate_options_lines(5000))
+
+        mcm_lines, _, _ = mcm_manager.get_settings_section(lines, "[mcm]\n")
+        settings = mcm_manager.parse_settings_from_lines(mcm_lines)
+
+        self.assertAlmostEqual(len(lines), 5000, delta=10)
+        self.assertEqual(mcm_lines, sorted(mcm_lines))
+        self.assertTrue(all("/" in name for name in settings))
+        self.assertIn("", [setting.value for setting in settings.values()])
+
+    def test_generated_user_settings_overlap(self):
+        """Test that the requested fraction of user settings exist in the default file"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            generate.write_benchmark_files(temp_dir, 3000, overlap=0.5, user_setting_count=40)
+
+            with open(os.path.join(temp_dir, "settings.json"), "r") as settings_file:
+                user_settings = json.load(settings_file)
+            with open(os.path.join(temp_dir, "axr_options.ltx"), "r") as default_file:
+                mcm_lines, _, _ = mcm_manager.get_settings_section(default_file.readlines(), "[mcm]\n")
+
+        default_names = mcm_manager.parse_settings_from_lines(mcm_lines)
+        self.assertEqual(len(user_settings), 40)
+        self.assertEqual(sum(name in default_names for name in user_settings), 20)
+
+    def test_run_benchmarks_writes_results(self):
+        """Test a small benchmark run and its json output"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "results.json")
+
+            with patch("builtins.print"):
+                run_benchmarks.main(["--sizes", "500", "--repeat", "1", "--output", output_path])
+
+            with open(output_path, "r") as output_file:
+                results = json.load(output_file)["results"]
+
+        self.assertEqual(
+            [result["benchmark"] for result in results],
+            [benchmark.name for benchmark in run_benchmarks.BENCHMARKS],
+        )
+        self.assertTrue(all(result["peak_memory_bytes"] > 0 for result in results))
+
+    def test_find_regressions(self):
+        """Test that only results whose fastest run is slower than the threshold and the noise floor are regressions"""
+        baseline = [
+            {"benchmark": "merge_settings", "lines": 3000, "min_seconds": 0.010},
+            {"benchmark": "merge_settings", "lines": 30000, "min_seconds": 0.100},
+            {"benchmark": "main", "lines": 3000, "min_seconds": 0.001},
+        ]
+        results = [
+            {"benchmark": "merge_settings", "lines": 3000, "min_seconds": 0.014},
+            {"benchmark": "merge_settings", "lines": 30000, "min_seconds": 0.200},
+            {"benchmark": "main", "lines": 3000, "min_seconds": 0.0025},
+            {"benchmark": "main", "lines": 30000, "min_seconds": 9.0},
+        ]
+        regressions = run_benchmarks.find_regressions(results, baseline, 0.5)
+        self.assertEqual(regressions, [(results[1], baseline[1])])
+
+        # The whole pipeline has a higher noise floor than the in-memory benchmarks
+        baseline = [{"benchmark": "main", "lines": 3000, "min_seconds": 0.020}]
+        results = [{"benchmark": "main", "lines": 3000, "min_seconds": 0.040}]
+        self.assertEqual(run_benchmarks.find_regressions(results, baseline, 0.5), [])
+        results = [{"benchmark": "main", "lines": 3000, "min_seconds": 0.060}]
+        self.assertEqual(run_benchmarks.find_regressions(results, baseline, 0.5), [(results[0], baseline[0])])
+
+    def test_perf_gate(self):
+        """Test that --perf stores a missing baseline, passes when as fast and fails on a regression"""
+        from tests import run_tests
+
+        def results(merge_seconds: float) -> list[dict]:
+            return [{"benchmark": "merge_settings", "lines": 30000, "min_seconds": merge_seconds}]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            baseline_path = os.path.join(temp_dir, "perf_baseline.json")
+            argv = ["--baseline", baseline_path]
+            runs = [results(0.1), results(0.12), results(1.0)]
+            with patch("benchmarks.run_benchmarks.run_benchmarks", side_effect=runs), patch("builtins.print"):
+                self.assertTrue(run_tests.run_perf_checks(argv))
+                self.assertTrue(os.path.exists(baseline_path))
+                self.assertTrue(run_tests.run_perf_checks(argv))
+                self.assertFalse(run_tests.run_perf_checks(argv))
+
+            runs = [results(1.0), results(1.0)]
+            with patch("benchmarks.run_benchmarks.run_benchmarks", side_effect=runs), patch(
+                "builtins.print"
+            ), patch("platform.node", return_value="another-machine"):
+                self.assertFalse(run_tests.run_perf_checks(argv))
+                self.assertTrue(run_tests.run_perf_checks(argv + ["--update-baseline"]))
+
+            with open(baseline_path, "r") as baseline_file:
+                self.assertEqual(json.load(baseline_file)["results"], results(1.0))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
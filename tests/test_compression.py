@@ -0,0 +1,162 @@
+import unittest
+import tempfile
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.compression import COMPRESSORS, detect_compression, open_input
+from classes.ltx_document import LtxDocument
+from classes.three_way_merge import ThreeWayMerge
+
+DEFAULT_CONTENT = (
+    "[character_creation]\n"
+    "        new_game_difficulty              = normal\n"
+    " \n"
+    "[mcm]\n"
+    "        3d_scopes/chromatism             = true\n"
+    "        EA_settings/ea_debug             = false\n"
+    "        SMR/smr_amain/smr_enabled        = true\n"
+    " \n"
+)
+SAVED_CONTENT = (
+    "[mcm]\n"
+    "        3d_scopes/chromatism             = false\n"
+    "        EA_settings/ea_debug             = false\n"
+    "        SMR/smr_amain/smr_enabled        = true\n"
+    " \n"
+)
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, file_name: str, contents: str, compression: str | None = None) -> str:
+        file_path = os.path.join(self.path, file_name)
+        if compression:
+            with COMPRESSORS[compression](file_path, "wt") as file:
+                file.write(contents)
+        else:
+            with open(file_path, "w") as file:
+                file.write(contents)
+        return file_path
+
+    def read(self, file_name: str) -> str:
+        with open_input(os.path.join(self.path, file_name)) as file:
+            return file.read()
+
+    def test_detect_compression_by_magic_bytes(self):
+        """Test that compression is detected by the first bytes and not the file name"""
+        self.assertEqual(detect_compression(self.write("plain.ltx.gz", DEFAULT_CONTENT)), None)
+        self.assertEqual(detect_compression(self.write("a.ltx", DEFAULT_CONTENT, "gz")), "gz")
+        self.assertEqual(detect_compression(self.write("b.ltx", DEFAULT_CONTENT, "xz")), "xz")
+        self.assertEqual(detect_compression(self.write("empty.ltx", "")), None)
+
+    def test_compressed_documents_parse_like_plain(self):
+        """Test that a compressed options file gives the same document as the plain file"""
+        plain = LtxDocument.from_file(self.write("plain.ltx", DEFAULT_CONTENT))
+
+        for compression in COMPRESSORS:
+            with self.subTest(compression=compression):
+                document = LtxDocument.from_file(self.write(f"{compression}.ltx", DEFAULT_CONTENT, compression))
+                self.assertEqual(document.lines, plain.lines)
+                self.assertEqual(
+                    {name: setting.value for name, setting in document.settings("mcm").items()},
+                    {name: setting.value for name, setting in plain.settings("mcm").items()},
+                )
+
+    def test_main_reads_compressed_inputs(self):
+        """Test that the pipeline merges and diffs compressed inputs and writes a plain file by default"""
+        self.write("axr_options.ltx", DEFAULT_CONTENT, "gz")
+        self.write("axr_options_saved.ltx", SAVED_CONTENT, "xz")
+        self.write("settings.json", json.dumps({"EA_settings/ea_debug": True}))
+
+        with patch("builtins.print"):
+            mcm_manager.main([self.path, "--no-cache"])
+
+        self.assertIsNone(detect_compression(os.path.join(self.path, "axr_options.ltx")))
+        self.assertIn("        EA_settings/ea_debug = true\n", self.read("axr_options.ltx"))
+        self.assertEqual(json.loads(self.read("generated_user_settings.json")), {"3d_scopes/chromatism": False})
+
+    def test_output_compression_in_every_mode(self):
+        """Test that --output-compression writes the same merged file compressed in full, stream and incremental mode"""
+        self.write("settings.json", json.dumps({"EA_settings/ea_debug": True}))
+
+        for mode in ([], ["--stream"], ["--incremental"]):
+            self.write("axr_options.ltx", DEFAULT_CONTENT)
+            with patch("builtins.print"):
+                mcm_manager.main([self.path, "--no-cache", *mode])
+            expected = self.read("axr_options.ltx")
+
+            for compression in COMPRESSORS:
+                with self.subTest(mode=mode, compression=compression):
+                    self.write("axr_options.ltx", DEFAULT_CONTENT, "xz" if compression == "gz" else "gz")
+                    with patch("builtins.print"):
+                        mcm_manager.main([self.path, "--no-cache", "--output-compression", compression, *mode])
+
+                    self.assertEqual(detect_compression(os.path.join(self.path, "axr_options.ltx")), compression)
+                    self.assertEqual(self.read("axr_options.ltx"), expected)
+
+    def test_three_way_merge_of_compressed_files(self):
+        """Test that the three way merge reads compressed files and can compress its output"""
+        old_default = self.write("old.ltx", DEFAULT_CONTENT, "gz")
+        new_default = self.write("new.ltx", DEFAULT_CONTENT.replace("ea_debug             = false", "ea_debug = true"))
+        saved = self.write("saved.ltx", SAVED_CONTENT, "xz")
+        output_path = os.path.join(self.path, "merged.ltx")
+
+        ThreeWayMerge(old_default, new_default, saved).write(output_path, "gz")
+
+        self.assertEqual(detect_compression(output_path), "gz")
+        merged = self.read("merged.ltx")
+        self.assertIn("3d_scopes/chromatism             = false\n", merged)
+        self.assertIn("ea_debug = true\n", merged)
+
+    def test_large_archive_streams_in_bounded_memory(self):
+        """Test that a large compressed file is merged in stream mode without holding it in memory"""
+        source_path = os.path.join(self.path, "large.ltx.gz")
+        with gzip.open(source_path, "wt") as source:
+            for section in range(2500):
+                source.write(f"[section_{section:04}]\n")
+                source.writelines(f"        setting_{index:03} = value of {section} {index}\n" for index in range(100))
+                source.write(" \n")
+            source.write(SAVED_CONTENT)
+        decompressed_size = 0
+        with gzip.open(source_path, "rb") as source:
+            while chunk := source.read(1 << 20):
+                decompressed_size += len(chunk)
+        self.assertGreater(decompressed_size, 8 * 1024 * 1024)
+
+        user_settings = {"3d_scopes/chromatism": True, "section_1000::setting_050": "changed"}
+        destination_path = os.path.join(self.path, "merged.ltx.gz")
+        tracemalloc.start()
+        try:
+            # Not xz, whose encoder allocates a dictionary of tens of MiB whatever the size of the file
+            mcm_manager.write_merged_settings(source_path, destination_path, user_settings, "gz")
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak_memory, decompressed_size / 8)
+
+        plain_source_path = os.path.join(self.path, "large.ltx")
+        with gzip.open(source_path, "rb") as source, open(plain_source_path, "wb") as plain_source:
+            while chunk := source.read(1 << 20):
+                plain_source.write(chunk)
+        plain_destination_path = os.path.join(self.path, "merged.ltx")
+        mcm_manager.write_merged_settings(plain_source_path, plain_destination_path, user_settings)
+
+        with gzip.open(destination_path, "rb") as merged, open(plain_destination_path, "rb") as plain_merged:
+            self.assertEqual(hashlib.sha256(merged.read()).digest(), hashlib.sha256(plain_merged.read()).digest())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
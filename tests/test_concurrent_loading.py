@@ -0,0 +1,107 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+import threading
+from unittest.mock import ANY, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+
+
+class TestConcurrentLoading(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.default_content = ["[mcm]\n", "        a/b = 1\n", "        a/c = 2\n"]
+        self.default_path = os.path.join(self.temp_dir.name, "axr_options.ltx")
+        with open(self.default_path, "w") as default_file:
+            default_file.writelines(self.default_content)
+        with open(os.path.join(self.temp_dir.name, "axr_options_saved.ltx"), "w") as saved_file:
+            saved_file.writelines(["[mcm]\n", "        a/b = 1\n", "        a/c = 3\n"])
+        with open(os.path.join(self.temp_dir.name, "settings.json"), "w") as settings_file:
+            json.dump({"a/b": 5}, settings_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_default_lines(self) -> list[str]:
+        with open(self.default_path, "r") as default_file:
+            return default_file.readlines()
+
+    def test_inputs_are_read_concurrently(self):
+        """Test that the three input files are being read at the same time once they are large enough"""
+        # Serial reads would never get all three threads to the barrier
+        barrier = threading.Barrier(3, timeout=5)
+        read_user_settings = mcm_manager.read_user_settings
+        read_parsed_document = mcm_manager.read_parsed_document
+
+        def wait_then(read):
+            def wrapper(*args):
+                barrier.wait()
+                return read(*args)
+
+            return wrapper
+
+        with patch("mcm_manager.read_user_settings", wait_then(read_user_settings)), patch(
+            "mcm_manager.read_parsed_document", wait_then(read_parsed_document)
+        ), patch("mcm_manager.CONCURRENT_IO_MIN_BYTES", 0), patch("builtins.print"):
+            result = mcm_manager.main([self.temp_dir.name, "--no-cache"])
+
+        self.assertIsNone(result)
+        self.assertIn("        a/b = 5\n", self.read_default_lines())
+        with open(os.path.join(self.temp_dir.name, "generated_user_settings.json"), "r") as generated_file:
+            self.assertEqual(json.load(generated_file), {"a/c": 3})
+
+    def test_small_inputs_are_read_without_threads(self):
+        """Test that small options files are read and written on the calling thread, without a thread pool"""
+        reading_threads = []
+        read_parsed_document = mcm_manager.read_parsed_document
+
+        def record_thread(*args):
+            reading_threads.append(threading.current_thread())
+            return read_parsed_document(*args)
+
+        with patch("mcm_manager.read_parsed_document", record_thread), patch(
+            "concurrent.futures.ThreadPoolExecutor", side_effect=AssertionError("thread pool started")
+        ), patch("builtins.print"):
+            result = mcm_manager.main([self.temp_dir.name, "--no-cache"])
+
+        self.assertIsNone(result)
+        self.assertEqual(reading_threads, [threading.current_thread()] * 2)
+        self.assertIn("        a/b = 5\n", self.read_default_lines())
+
+    def test_failed_backup_stops_the_write(self):
+        """Test that an error of the background backup is reported and nothing is merged"""
+        with patch("mcm_manager.make_store_backup", side_effect=OSError("disk full")), patch(
+            "builtins.print"
+        ) as mock_print:
+            result = mcm_manager.main([self.temp_dir.name, "--no-cache"])
+
+        self.assertEqual(result, 1)
+        mock_print.assert_any_call(
+            "Something went wrong while reading or writing to files.", ANY
+        )
+        self.assertIn("disk full", str(mock_print.call_args_list))
+        self.assertEqual(self.read_default_lines(), self.default_content)
+
+    def test_failed_read_is_reported(self):
+        """Test that a file that can't be read is reported like before, without merging anything"""
+        read_document = mcm_manager.read_document
+
+        def fail_saved(file_path, args):
+            if file_path.endswith("axr_options_saved.ltx"):
+                raise PermissionError("no access to axr_options_saved.ltx")
+            return read_document(file_path, args)
+
+        with patch("mcm_manager.read_document", fail_saved), patch("builtins.print") as mock_print:
+            result = mcm_manager.main([self.temp_dir.name, "--no-cache"])
+
+        self.assertEqual(result, 1)
+        self.assertIn("no access to axr_options_saved.ltx", str(mock_print.call_args_list))
+        self.assertEqual(self.read_default_lines(), self.default_content)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir.name, "backups")))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,109 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.file_watcher import FileWatcher
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.watched_path = os.path.join(self.temp_dir.name, "settings.json")
+        self.other_path = os.path.join(self.temp_dir.name, "axr_options.ltx")
+        for file_path in [self.watched_path, self.other_path]:
+            with open(file_path, "w") as file:
+                file.write("{}")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_later(self, file_path: str, contents: str, delay: float):
+        def write():
+            time.sleep(delay)
+            with open(file_path, "w") as file:
+                file.write(contents)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        return thread
+
+    def test_reports_changed_file(self):
+        """Test that only the changed file is reported"""
+        watcher = FileWatcher([self.watched_path, self.other_path], debounce=0.05, poll_interval=0.05)
+        try:
+            thread = self.write_later(self.watched_path, '{"a": 1}', 0.05)
+            changed_paths = watcher.wait_for_changes(timeout=5)
+            thread.join()
+        finally:
+            watcher.close()
+
+        self.assertEqual(changed_paths, {os.path.abspath(self.watched_path)})
+
+    def test_burst_is_reported_once(self):
+        """Test that changes within the debounce time are reported together"""
+        watcher = FileWatcher([self.watched_path, self.other_path], debounce=0.3, poll_interval=0.05)
+        try:
+            threads = [
+                self.write_later(self.watched_path, '{"a": 1}', 0.05),
+                self.write_later(self.other_path, "[mcm]\n", 0.15),
+            ]
+            changed_paths = watcher.wait_for_changes(timeout=5)
+            for thread in threads:
+                thread.join()
+        finally:
+            watcher.close()
+
+        self.assertEqual(
+            changed_paths,
+            {os.path.abspath(self.watched_path), os.path.abspath(self.other_path)},
+        )
+
+    def test_polling_without_inotify(self):
+        """Test the polling fallback, and that nothing is reported on timeout"""
+        with patch("classes.file_watcher._Inotify.create", return_value=None):
+            watcher = FileWatcher([self.watched_path], debounce=0.05, poll_interval=0.05)
+
+        self.assertFalse(watcher.uses_inotify)
+        self.assertEqual(watcher.wait_for_changes(timeout=0.1), set())
+
+        thread = self.write_later(self.watched_path, '{"a": 1}', 0.05)
+        self.assertEqual(
+            watcher.wait_for_changes(timeout=5), {os.path.abspath(self.watched_path)}
+        )
+        thread.join()
+
+    def test_watch_reruns_only_the_merge_for_settings(self):
+        """Test that a settings.json change merges again without regenerating generated_user_settings.json"""
+        with open(self.other_path, "w") as default_file:
+            default_file.write("[mcm]\n        a/setting = 1\n")
+        args = mcm_manager.parse_arguments([self.temp_dir.name, "--watch"])
+
+        def change_settings(*_):
+            if change_settings.called:
+                raise KeyboardInterrupt
+            change_settings.called = True
+            with open(self.watched_path, "w") as settings_file:
+                json.dump({"a/setting": 2}, settings_file)
+            return {os.path.abspath(self.watched_path)}
+
+        change_settings.called = False
+
+        with patch.object(FileWatcher, "wait_for_changes", side_effect=change_settings), patch(
+            "mcm_manager.create_json_file_from_user_and_default_settings_diff"
+        ) as create_json, patch("builtins.print"):
+            mcm_manager.watch(self.temp_dir.name, args)
+
+        self.assertEqual(create_json.call_count, 1)  # Only the first run
+        with open(self.other_path, "r") as default_file:
+            self.assertIn("        a/setting = 2\n", default_file.readlines())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.instrumentation import Instrumentation, PhaseStats, NULL_PHASE, instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.temp_dir.name, "axr_options.ltx"), "w") as default_file:
+            default_file.write("[mcm]\n        a/setting = 1\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_disabled_phase_does_nothing(self):
+        """Test that phases aren't recorded when nothing is listening"""
+        disabled_instrumentation = Instrumentation()
+
+        with disabled_instrumentation.phase("merge") as phase:
+            phase.count(lines=1)
+
+        self.assertIs(phase, NULL_PHASE)
+        self.assertEqual(disabled_instrumentation.phases, [])
+
+    def test_enabled_phase_records_stats(self):
+        """Test recording time, memory and counts of a phase"""
+        enabled_instrumentation = Instrumentation()
+        enabled_instrumentation.enable()
+        try:
+            with enabled_instrumentation.phase("merge") as phase:
+                data = list(range(10000))
+                phase.count(lines=len(data))
+        finally:
+            enabled_instrumentation.disable()
+
+        stats = enabled_instrumentation.phases[0]
+        self.assertEqual(stats.name, "merge")
+        self.assertEqual(stats.counts, {"lines": 10000})
+        self.assertGreater(stats.seconds, 0)
+        self.assertGreater(stats.peak_memory_bytes or 0, 0)
+        self.assertIn("merge", enabled_instrumentation.summary())
+
+    def test_tracing_started_elsewhere_keeps_running(self):
+        """Test that disabling only stops memory tracing that enabling started, not an embedding program's"""
+        import tracemalloc
+
+        tracemalloc.start()
+        try:
+            profiled_instrumentation = Instrumentation()
+            profiled_instrumentation.enable()
+            profiled_instrumentation.disable()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+        profiled_instrumentation.enable()
+        profiled_instrumentation.disable()
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_registered_collector_receives_phases(self):
+        """Test that an embedding program can collect the phases of a run"""
+        collected: list[PhaseStats] = []
+        instrumentation.register_collector(collected.append)
+        try:
+            with patch("builtins.print"):
+                mcm_manager.main([self.temp_dir.name])
+        finally:
+            instrumentation.unregister_collector(collected.append)
+
+        names = [stats.name for stats in collected]
+        # The backup and generated_user_settings.json are written in the background, next to the merge
+        self.assertCountEqual(
+            names, ["read", "backup", "resolve_rules", "validate", "merge", "write", "generate_json"]
+        )
+        self.assertEqual(
+            [name for name in names if name not in ("backup", "generate_json")],
+            ["read", "resolve_rules", "validate", "merge", "write"],
+        )
+        self.assertLess(names.index("backup"), names.index("write"))
+        self.assertTrue(all(stats.peak_memory_bytes is None for stats in collected))
+
+    def test_main_writes_stats_json(self):
+        """Test the --stats-json output of a run"""
+        stats_path = os.path.join(self.temp_dir.name, "stats.json")
+
+        with patch("builtins.print"):
+            mcm_manager.main([self.temp_dir.name, "--stats-json", stats_path])
+
+        with open(stats_path, "r") as stats_file:
+            stats = json.load(stats_file)
+
+        self.assertIn("merge", [phase["name"] for phase in stats["phases"]])
+        self.assertGreater(stats["total_seconds"], 0)
+        self.assertFalse(instrumentation.enabled)
+
+    def test_profiled_phases_run_one_after_another(self):
+        """Test that recorded phases don't overlap, so none of them reports the peak memory of another"""
+        stats_path = os.path.join(self.temp_dir.name, "stats.json")
+
+        with patch("builtins.print"):
+            mcm_manager.main([self.temp_dir.name, "--stats-json", stats_path])
+
+        with open(stats_path, "r") as stats_file:
+            stats = json.load(stats_file)
+
+        self.assertEqual(
+            [phase["name"] for phase in stats["phases"]],
+            ["read", "backup", "generate_json", "resolve_rules", "validate", "merge", "write"],
+        )
+        # Wall clock time, which can't be less than phases that ran one after another
+        self.assertGreaterEqual(stats["total_seconds"], sum(phase["seconds"] for phase in stats["phases"]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
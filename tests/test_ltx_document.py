@@ -0,0 +1,146 @@
+import unittest
+import tempfile
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.ltx_document import LtxDocument, MCM_SECTION
+from classes.settings_patch import SettingsPatch
+
+
+class TestLtxDocument(unittest.TestCase):
+    def setUp(self):
+        """Set up test data based on real axr_options.ltx structure"""
+        self.sample_content = [
+            "[character_creation]\n",
+            "        new_game_azazel_mode             =\n",
+            "        new_game_difficulty              = normal\n",
+            " \n",
+            "[mcm]\n",
+            "        21_game/card_game_21_minimum_rate = 500\n",
+            "        3d_scopes/chromatism             = true\n",
+            "        EA_settings/ea_debug             = false\n",
+            " \n",
+            "[modded_exes]\n",
+            "        some_exe_setting                 = value\n",
+        ]
+
+    def test_section_matches_get_settings_section(self):
+        """Test that the indexed section is the same as a rescan with get_settings_section"""
+        document = LtxDocument(self.sample_content)
+
+        for section_name in ["character_creation", "mcm", "modded_exes"]:
+            self.assertEqual(
+                document.section(section_name),
+                mcm_manager.get_settings_section(
+                    self.sample_content, f"[{section_name}]\n"
+                ),
+            )
+
+    def test_settings_and_line_numbers(self):
+        """Test the per section setting and line number maps"""
+        document = LtxDocument(self.sample_content)
+
+        settings = document.settings(MCM_SECTION)
+        self.assertEqual(settings["3d_scopes/chromatism"].value, "true")
+        self.assertEqual(settings["EA_settings/ea_debug"].value, "false")
+        self.assertEqual(document.line_numbers(MCM_SECTION)["3d_scopes/chromatism"], 6)
+        self.assertEqual(
+            document.settings("character_creation")["new_game_azazel_mode"].value, ""
+        )
+
+    def test_missing_section(self):
+        """Test error when section doesn't exist"""
+        document = LtxDocument(self.sample_content)
+
+        self.assertFalse(document.has_section("nonexistent"))
+        with self.assertRaises(ValueError):
+            document.section("nonexistent")
+        with self.assertRaises(ValueError):
+            document.settings("nonexistent")
+
+    def test_of_reuses_document(self):
+        """Test that an existing document is not tokenized again"""
+        document = LtxDocument(self.sample_content)
+
+        self.assertIs(LtxDocument.of(document), document)
+        self.assertEqual(LtxDocument.of(self.sample_content).lines, self.sample_content)
+
+    def test_settings_are_compact_and_shared(self):
+        """Test that settings have no __dict__ and identical names and values in two documents are stored once"""
+        first_document = LtxDocument(self.sample_content)
+        # Copies, so the lines of the two documents are different objects
+        second_document = LtxDocument([(line + " ")[:-1] for line in self.sample_content])
+
+        first_setting = first_document.settings(MCM_SECTION)["3d_scopes/chromatism"]
+        second_setting = second_document.settings(MCM_SECTION)["3d_scopes/chromatism"]
+
+        self.assertFalse(hasattr(first_setting, "__dict__"))
+        self.assertIs(first_setting.name, second_setting.name)
+        self.assertIs(first_setting.value, second_setting.value)
+        self.assertEqual(repr(first_setting), "3d_scopes/chromatism = true\n")
+
+    def test_repeated_and_discontiguous_sections(self):
+        """Test that every part of a repeated section is indexed and blank lines inside a section don't end it"""
+        lines = [
+            "[mcm]\n",
+            "        a/setting                        = 1\n",
+            " \n",
+            "        b/setting                        = 2\n",
+            " \n",
+            "[options]\n",
+            "        option                           = x\n",
+            "[mcm]\n",
+            "        a/setting                        = 3\n",
+            "        c/setting                        = 4\n",
+        ]
+        document = LtxDocument(lines)
+
+        self.assertEqual(document.parts(MCM_SECTION), [(0, 4), (7, 10)])
+        self.assertEqual(document.section(MCM_SECTION), (lines[1:4], 0, 4))
+        self.assertEqual(
+            {name: setting.value for name, setting in document.settings(MCM_SECTION).items()},
+            {"a/setting": "3", "b/setting": "2", "c/setting": "4"},
+        )
+        self.assertEqual(document.line_numbers(MCM_SECTION)["b/setting"], 3)
+        self.assertEqual(document.setting_line_numbers(MCM_SECTION, "a/setting"), [1, 8])
+        self.assertEqual(document.setting_line_numbers(MCM_SECTION, "b/setting"), [3])
+        self.assertEqual(document.setting_line_numbers(MCM_SECTION, "missing"), [])
+        self.assertEqual(mcm_manager.get_settings_section(lines, "[mcm]\n"), (lines[1:4], 0, 4))
+        self.assertEqual(
+            list(mcm_manager.iter_sections(lines, {"mcm"})), lines[:4] + lines[7:]
+        )
+
+    def test_merge_settings_updates_every_copy(self):
+        """Test that every copy of a repeated setting is updated, in the merge and in an incremental patch"""
+        lines = [
+            "[mcm]\n",
+            "        a/setting                        = 1\n",
+            "        a/setting                        = 2\n",
+            "        b/setting                        = 2\n",
+        ]
+
+        self.assertEqual(
+            mcm_manager.merge_settings(lines, {"a/setting": 5}),
+            ["[mcm]\n", "        a/setting = 5\n", "        a/setting = 5\n", lines[3]],
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            options_path = os.path.join(temp_dir, "axr_options.ltx")
+            with open(options_path, "w") as options_file:
+                options_file.writelines(lines)
+            patch = SettingsPatch.for_user_settings(options_path, {"a/setting": 5})
+        self.assertEqual([(change.line, change.old_value) for change in patch.changes], [(1, "1"), (2, "2")])
+
+    def test_merge_settings_accepts_document(self):
+        """Test that merging a document gives the same result as merging lines"""
+        settings = {"3d_scopes/chromatism": False, "new_setting": 1}
+
+        self.assertEqual(
+            mcm_manager.merge_settings(LtxDocument(self.sample_content), settings),
+            mcm_manager.merge_settings(self.sample_content, settings),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,104 @@
+import unittest
+import tempfile
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes import ltx_tokenizer
+from classes.ltx_document import LtxDocument, MCM_SECTION
+from classes.setting import Setting
+
+
+def settings_by_section(document: LtxDocument) -> dict[str, dict[str, str]]:
+    return {
+        section_name: {name: setting.value for name, setting in document.settings(section_name).items()}
+        for section_name in document.section_parts
+    }
+
+
+class TestLtxTokenizer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.options_path = os.path.join(self.temp_dir.name, "axr_options.ltx")
+        self.sample_content = (
+            b"; comment before any section\n"
+            b"[character_creation]\n"
+            b"        new_game_azazel_mode             =\n"
+            b"        new_game_difficulty              = normal\n"
+            b" \n"
+            b"[mcm]\n"
+            b"        3d_scopes/chromatism             = true\n"
+            b"\n"
+            b"        EA_settings/ea_command           = a=b = c\n"
+            b"        no value here\n"
+            b"  \n"
+            b"[modded_exes]\n"
+            b"        some_exe_setting                 = value\n"
+            b"[mcm]\n"
+            b"        zzz/last                         = 1"
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_options(self, contents: bytes):
+        with open(self.options_path, "wb") as options_file:
+            options_file.write(contents)
+
+    def assert_same_as_lines(self, contents: bytes):
+        self.write_options(contents)
+        with open(self.options_path, "r") as options_file:
+            expected = LtxDocument(options_file.readlines())
+
+        document = LtxDocument.from_file(self.options_path)
+
+        self.assertEqual(document.lines, expected.lines)
+        self.assertEqual(document.section_parts, expected.section_parts)
+        for section_name in expected.section_parts:
+            self.assertEqual(document.line_numbers(section_name), expected.line_numbers(section_name))
+        self.assertEqual(settings_by_section(document), settings_by_section(expected))
+
+    def test_same_document_as_lines(self):
+        """Test that tokenizing the bytes gives the same document as tokenizing the lines"""
+        self.assert_same_as_lines(self.sample_content)
+        self.assert_same_as_lines(self.sample_content.replace(b"\n", b"\r\n"))
+        self.assert_same_as_lines(self.sample_content.replace(b"\n", b"\r"))
+        self.assert_same_as_lines(b"")
+
+    def test_value_containing_separator(self):
+        """Test that lines are only split on their first '='"""
+        self.write_options(self.sample_content)
+
+        settings = LtxDocument.from_file(self.options_path).settings(MCM_SECTION)
+
+        self.assertEqual(settings["EA_settings/ea_command"].value, "a=b = c")
+        self.assertEqual(Setting.from_line("        name = a=b\n").value, "a=b")
+        for line in self.sample_content.decode().splitlines(keepends=True):
+            if "=" in line:
+                expected = Setting.from_line(line)
+                self.assertEqual(settings.get(expected.name, expected).value, expected.value)
+
+    def test_drop_in_for_section_and_settings(self):
+        """Test that get_settings_section and parse_settings_from_lines give the same results for bytes"""
+        lines = self.sample_content.decode().splitlines(keepends=True)
+
+        for section_name in ["[character_creation]\n", "[mcm]\n", "[modded_exes]\n"]:
+            self.assertEqual(
+                mcm_manager.get_settings_section(self.sample_content, section_name),
+                mcm_manager.get_settings_section(lines, section_name),
+            )
+        with self.assertRaises(ValueError):
+            mcm_manager.get_settings_section(self.sample_content, "[nonexistent]\n")
+
+        self.assertEqual(
+            {
+                name: setting.value
+                for name, setting in mcm_manager.parse_settings_from_lines(self.sample_content).items()
+            },
+            {name: setting.value for name, setting in mcm_manager.parse_settings_from_lines(lines).items()},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
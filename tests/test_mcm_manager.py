@@ -191,6 +191,34 @@ class TestAxrOptions(unittest.TestCase):
 
         self.assertEqual(setting_names, sorted(setting_names))
 
+    def test_iter_sorted_section_sorted_input(self):
+        """Test that added lines are merged into an already sorted section in sorted order"""
+        section = [
+            f"{self.EIGHT_SPACES}a/setting = 1\n",
+            f"{self.EIGHT_SPACES}c/setting = 3\n",
+            f"{self.EIGHT_SPACES}e/setting = 5\n",
+        ]
+        added = [
+            f"{self.EIGHT_SPACES}f/setting = 6\n",
+            f"{self.EIGHT_SPACES}b/setting = 2\n",
+        ]
+
+        result = list(mcm_manager.iter_sorted_section(section, added))
+
+        self.assertEqual(result, sorted(section + added))
+
+    def test_iter_sorted_section_unsorted_input(self):
+        """Test falling back to a full sort when the section isn't sorted"""
+        section = [
+            f"{self.EIGHT_SPACES}c/setting = 3\n",
+            f"{self.EIGHT_SPACES}a/setting = 1\n",
+        ]
+        added = [f"{self.EIGHT_SPACES}b/setting = 2\n"]
+
+        result = list(mcm_manager.iter_sorted_section(section, added))
+
+        self.assertEqual(result, sorted(section + added))
+
     def test_merge_settings_no_mcm_section(self):
         """Test handling when no MCM section exists"""
         content_no_mcm = [
@@ -325,10 +353,10 @@ class TestAxrOptions(unittest.TestCase):
             # - 3d_scopes/parallax_shadow: true -> false
             # - SMR/smr_amain/smr_enabled: true -> false
             expected = {
-                "21_game/card_game_21_minimum_rate": "600",
-                "21_game/value_card_21_max_rate": "1600",
-                "3d_scopes/parallax_shadow": "false",
-                "SMR/smr_amain/smr_enabled": "false"
+                "21_game/card_game_21_minimum_rate": 600,
+                "21_game/value_card_21_max_rate": 1600,
+                "3d_scopes/parallax_shadow": False,
+                "SMR/smr_amain/smr_enabled": False
             }
             
             self.assertEqual(result, expected)
@@ -381,5 +409,33 @@ class TestAxrOptions(unittest.TestCase):
             self.assertEqual(result["new_user_setting1"], "custom_value")
             self.assertEqual(result["new_user_setting2"], "another_value")
 
+    def test_subcommand_modules_are_not_imported(self):
+        """Test that importing mcm_manager doesn't import what only the subcommands and --profile use"""
+        import subprocess
+
+        subcommand_modules = [
+            "sqlite3",
+            "concurrent.futures",
+            "multiprocessing",
+            "tracemalloc",
+            "classes.json_rpc",
+            "classes.settings_history",
+            "classes.file_watcher",
+            "classes.options_discovery",
+        ]
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import sys, mcm_manager; print([name for name in {subcommand_modules} if name in sys.modules])",
+            ],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), "[]")
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,197 @@
+import unittest
+import argparse
+import tempfile
+import json
+import os
+import socket
+import sys
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.document_cache import DocumentCache
+from classes.json_rpc import (
+    INVALID_INPUT,
+    INVALID_PARAMS,
+    METHOD_NOT_FOUND,
+    PARSE_ERROR,
+    JsonRpcClient,
+    JsonRpcError,
+    JsonRpcServer,
+)
+
+
+class TestMergeService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directories = [os.path.join(self.temp_dir.name, name) for name in ["low_end", "high_end"]]
+        for directory in self.directories:
+            os.mkdir(directory)
+            self.write(directory, "axr_options.ltx", "[mcm]\n        a/b = 1\n        a/c = 2\n")
+            self.write(directory, "axr_options_saved.ltx", "[mcm]\n        a/b = 1\n        a/c = 3\n        a/d = 4\n")
+            self.write(directory, "settings.json", json.dumps({"a/b": 5, "a/x": 1, "z/*": 0}))
+
+        parser = argparse.ArgumentParser()
+        mcm_manager.add_merge_arguments(parser)
+        self.args = parser.parse_args(["--no-cache"])
+        self.cache = DocumentCache(lambda file_path: mcm_manager.read_document(file_path, self.args))
+
+        self.server = JsonRpcServer(mcm_manager.service_methods(self.cache, self.args), ("127.0.0.1", 0))
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.close()
+        self.temp_dir.cleanup()
+
+    def write(self, directory: str, name: str, contents: str):
+        with open(os.path.join(directory, name), "w") as file:
+            file.write(contents)
+
+    def read(self, directory: str, name: str) -> str:
+        with open(os.path.join(directory, name), "r") as file:
+            return file.read()
+
+    def test_validate_and_diff_use_cached_documents(self):
+        """Test that warm files aren't parsed again and a changed file is"""
+        with JsonRpcClient(self.server.address) as client:
+            result = client.call("validate", path=self.directories[0])
+            self.assertEqual(result, {"unknown_settings": ["a/x"], "unmatched_rules": ["z/*"]})
+
+            diff = client.call("diff", path=self.directories[0])
+            self.assertEqual(diff["settings"], {"a/c": 3, "a/d": 4})
+            self.assertEqual(diff["added"], ["a/d"])
+            self.assertEqual(diff["changed"], ["a/c"])
+            self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+            client.call("diff", path=self.directories[0], write=True)
+            self.assertEqual((self.cache.hits, self.cache.misses), (3, 2))
+            self.assertEqual(
+                json.loads(self.read(self.directories[0], "generated_user_settings.json")),
+                {"a/c": 3, "a/d": 4},
+            )
+
+            self.write(self.directories[0], "axr_options.ltx", "[mcm]\n        a/b = 1\n        a/x = 2\n")
+            stat = os.stat(os.path.join(self.directories[0], "axr_options.ltx"))
+            os.utime(
+                os.path.join(self.directories[0], "axr_options.ltx"),
+                ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000),
+            )
+            result = client.call("validate", path=self.directories[0])
+            self.assertEqual(result["unknown_settings"], [])
+            self.assertEqual(self.cache.misses, 3)
+
+    def test_diffs_are_kept_with_cached_documents(self):
+        """Test that a diff is computed once while its documents are cached and dropped with them"""
+        cache = DocumentCache(cached_document_count=2)
+        methods = mcm_manager.service_methods(cache, self.args)
+        diff_documents = mcm_manager.diff_documents
+        diffed = []
+
+        def record_diff(*args):
+            diffed.append(args)
+            return diff_documents(*args)
+
+        with patch("mcm_manager.diff_documents", record_diff):
+            first = methods["diff"](path=self.directories[0])
+            self.assertEqual(methods["diff"](path=self.directories[0]), first)
+            self.assertEqual(len(diffed), 1)
+
+            # The documents of the other directory evict both, their diff goes with them
+            methods["diff"](path=self.directories[1])
+            self.assertEqual(methods["diff"](path=self.directories[0]), first)
+            self.assertEqual(len(diffed), 3)
+
+    def test_merge_and_backup(self):
+        """Test that merge backs up and writes the file, and that a missing section writes nothing"""
+        directory = self.directories[0]
+        with JsonRpcClient(self.server.address) as client:
+            result = client.call("merge", path=directory)
+            self.assertTrue(result["written"])
+            self.assertIsNotNone(result["backup"])
+            self.assertEqual(result["unknown_settings"], ["a/x"])
+            self.assertIn("        a/b = 5\n", self.read(directory, "axr_options.ltx"))
+
+            self.assertFalse(client.call("merge", path=directory)["written"])
+            self.assertIsNone(client.call("backup", path=directory)["backup"])
+
+            self.write(directory, "settings.json", json.dumps({"no_such_section::a": 1, "a/b": 6}))
+            merged_contents = self.read(directory, "axr_options.ltx")
+            with self.assertRaises(JsonRpcError) as context:
+                client.call("merge", path=directory)
+            self.assertEqual(context.exception.code, INVALID_INPUT)
+            self.assertIn("no_such_section", context.exception.message)
+            self.assertEqual(self.read(directory, "axr_options.ltx"), merged_contents)
+
+    def test_protocol_errors(self):
+        """Test the errors for unknown methods, bad params and lines that aren't json"""
+        with JsonRpcClient(self.server.address) as client:
+            with self.assertRaises(JsonRpcError) as context:
+                client.call("format_disk")
+            self.assertEqual(context.exception.code, METHOD_NOT_FOUND)
+
+            with self.assertRaises(JsonRpcError) as context:
+                client.call("validate", directory=self.directories[0])
+            self.assertEqual(context.exception.code, INVALID_PARAMS)
+
+            # The connection is still usable after errors
+            self.assertEqual(client.call("validate", path=self.directories[1])["unmatched_rules"], ["z/*"])
+
+        with socket.create_connection(self.server.address, timeout=5) as connection:
+            connection.sendall(b'{"jsonrpc": "2.0", "method": "backup", "params": {"path": "."}}\n{not json\n')
+            response = json.loads(connection.makefile("rb").readline())
+        self.assertEqual(response["error"]["code"], PARSE_ERROR)
+
+    def test_concurrent_requests(self):
+        """Test that many clients merging and validating at the same time all get correct answers"""
+        errors: list[Exception] = []
+
+        def run_client(directory: str):
+            try:
+                with JsonRpcClient(self.server.address) as client:
+                    for _ in range(5):
+                        client.call("merge", path=directory)
+                        self.assertEqual(client.call("validate", path=directory)["unknown_settings"], [])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [
+            threading.Thread(target=run_client, args=(directory,))
+            for directory in self.directories * 4
+        ]
+        with patch("builtins.print"):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        for directory in self.directories:
+            contents = self.read(directory, "axr_options.ltx")
+            self.assertEqual(contents.count("a/b = 5"), 1)
+            self.assertEqual(contents.count("a/x = 1"), 1)
+            self.assertFalse(os.path.exists(os.path.join(directory, ".mcm_manager.lock")))
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not supported")
+    def test_unix_socket(self):
+        """Test the service on a Unix socket"""
+        socket_path = os.path.join(self.temp_dir.name, "mcm_manager.sock")
+        server = JsonRpcServer(mcm_manager.service_methods(self.cache, self.args), socket_path)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.start()
+        try:
+            with JsonRpcClient(socket_path) as client:
+                self.assertEqual(client.call("validate", path=self.directories[0])["unmatched_rules"], ["z/*"])
+        finally:
+            server.shutdown()
+            server_thread.join()
+            server.close()
+
+        self.assertFalse(os.path.exists(socket_path))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
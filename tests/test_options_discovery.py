@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.backup_store import BackupStore
+from classes.options_discovery import OptionsFileScanner
+
+DEFAULT_MOD = "G.A.M.M.A. MCM values - Rename to keep your personal changes"
+
+
+class TestOptionsDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.install = os.path.join(self.temp_dir.name, "GAMMA")
+        self.tool = os.path.join(self.temp_dir.name, "mcm_manager")
+        os.mkdir(self.tool)
+
+        self.write(f"mods/{DEFAULT_MOD}/gamedata/configs/axr_options.ltx", "[mcm]\n        a/b = 1\n        a/c = 2\n")
+        self.write("mods/Other mod/gamedata/configs/axr_options.ltx", "[mcm]\n        o/a = 1\n")
+        self.write("mods/Other mod/gamedata/configs/mod_system_other.ltx", "")
+        # Never read by the game, so it must not be found
+        self.write("mods/Other mod/gamedata/textures/ui/axr_options.ltx", "")
+        self.write("Anomaly/appdata/axr_options.ltx", "[mcm]\n        a/b = 1\n        a/c = 3\n")
+        self.write("Anomaly/bin/readme.txt", "")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, relative_path: str, contents: str):
+        file_path = os.path.join(self.install, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as file:
+            file.write(contents)
+
+    def test_scan_finds_options_files_and_prunes_gamedata(self):
+        """Test that the options files are found and classified, and nothing below gamedata but configs is listed"""
+        scanner = OptionsFileScanner(self.install, workers=4)
+        found = scanner.scan()
+
+        self.assertEqual(
+            [(discovered.kind, discovered.mod, os.path.relpath(discovered.path, self.install)) for discovered in found],
+            [
+                ("game", None, os.path.join("Anomaly", "appdata", "axr_options.ltx")),
+                ("mod", DEFAULT_MOD, os.path.join("mods", DEFAULT_MOD, "gamedata", "configs", "axr_options.ltx")),
+                ("mod", "Other mod", os.path.join("mods", "Other mod", "gamedata", "configs", "axr_options.ltx")),
+            ],
+        )
+        # GAMMA, Anomaly, appdata, bin, mods, two mods, their gamedata and configs, but not textures or ui
+        self.assertEqual(scanner.listed_directories, 11)
+
+    def test_index_only_lists_changed_directories(self):
+        """Test that a second scan reuses the index and only lists the directories whose mtime changed"""
+        index_path = os.path.join(self.tool, "discovery_index.json")
+        with patch("classes.options_discovery.MTIME_GRANULARITY_NS", -1):
+            OptionsFileScanner(self.install, index_path).scan()
+
+            scanner = OptionsFileScanner(self.install, index_path)
+            self.assertEqual(len(scanner.scan()), 3)
+            self.assertEqual((scanner.listed_directories, scanner.reused_directories), (0, 11))
+
+            self.write("mods/New mod/gamedata/configs/axr_options_saved.ltx", "")
+            found = scanner.scan()
+            # mods itself and the three new directories
+            self.assertEqual((scanner.listed_directories, scanner.reused_directories), (4, 10))
+            self.assertIn(
+                os.path.join(self.install, "mods", "New mod", "gamedata", "configs", "axr_options_saved.ltx"),
+                [discovered.path for discovered in found],
+            )
+
+            # Saving a file doesn't change the mtime of its directory, the file is stat'ed again all the same
+            game_file_path = os.path.join(self.install, "Anomaly", "appdata", "axr_options.ltx")
+            appdata_mtime_ns = os.stat(os.path.dirname(game_file_path)).st_mtime_ns
+            os.utime(game_file_path, ns=(1_000_000_000, 2_000_000_000))
+            os.utime(os.path.dirname(game_file_path), ns=(appdata_mtime_ns, appdata_mtime_ns))
+            found = scanner.scan()
+            self.assertEqual(scanner.listed_directories, 0)
+            self.assertEqual(
+                [discovered.mtime_ns for discovered in found if discovered.path == game_file_path], [2_000_000_000]
+            )
+
+        # An index of another install isn't used
+        scanner = OptionsFileScanner(self.tool, index_path)
+        self.assertEqual(scanner.scan(), [])
+        self.assertEqual(scanner.reused_directories, 0)
+
+    def test_discover_merges_found_files(self):
+        """Test that discover --merge copies the found files to the tool directory and merges them"""
+        with open(os.path.join(self.tool, "settings.json"), "w") as settings_file:
+            json.dump({"a/b": 5}, settings_file)
+        with open(os.path.join(self.tool, "axr_options.ltx"), "w") as old_file:
+            old_file.write("[mcm]\n        a/b = 0\n")
+
+        with patch("builtins.print"):
+            result = mcm_manager.main(["discover", self.install, "--path", self.tool, "--merge", "--no-cache"])
+        self.assertEqual(result, 0)
+
+        with open(os.path.join(self.tool, "axr_options.ltx"), "r") as merged_file:
+            merged = merged_file.read()
+        self.assertIn("        a/b = 5\n", merged)
+        self.assertIn("        a/c = 2\n", merged)
+        with open(os.path.join(self.tool, "generated_user_settings.json"), "r") as generated_file:
+            self.assertEqual(json.load(generated_file), {"a/c": 3})
+        # The file that was replaced and the copied default are both backed up
+        self.assertEqual(len(BackupStore(os.path.join(self.tool, "backups")).entries()), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.tool, "discovery_index.json")))
+
+    def test_discover_without_default_fails(self):
+        """Test that discover --merge fails without an MCM values mod to merge"""
+        os.remove(os.path.join(self.install, "mods", DEFAULT_MOD, "gamedata", "configs", "axr_options.ltx"))
+        with patch("builtins.print") as print_mock:
+            result = mcm_manager.main(["discover", self.install, "--path", self.tool, "--merge", "--no-index"])
+
+        self.assertEqual(result, 1)
+        print_mock.assert_any_call("Found no axr_options.ltx of the MCM values mod to merge. Pick one with --default.")
+        self.assertFalse(os.path.exists(os.path.join(self.tool, "axr_options.ltx")))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
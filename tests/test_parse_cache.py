@@ -0,0 +1,120 @@
+import unittest
+import tempfile
+import os
+import pickle
+import sys
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from classes.ltx_document import LtxDocument, MCM_SECTION
+from classes.parse_cache import ParseCache, MTIME_GRANULARITY_NS
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.options_path = os.path.join(self.temp_dir.name, "axr_options.ltx")
+        self.write_options("[mcm]\n        a/setting = 1\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_options(self, contents: str, mtime_ns: int | None = None):
+        with open(self.options_path, "w") as options_file:
+            options_file.write(contents)
+        if mtime_ns is not None:
+            os.utime(self.options_path, ns=(mtime_ns, mtime_ns))
+
+    def test_warm_load_skips_parsing(self):
+        """Test that a second load comes from the cache without tokenizing the file"""
+        # Old enough that size and mtime alone are trusted
+        old_mtime_ns = os.stat(self.options_path).st_mtime_ns - 2 * MTIME_GRANULARITY_NS
+        os.utime(self.options_path, ns=(old_mtime_ns, old_mtime_ns))
+        ParseCache(self.options_path).load_document()
+
+        with patch.object(LtxDocument, "from_file", side_effect=AssertionError):
+            with patch("classes.parse_cache.hash_file", side_effect=AssertionError):
+                document = ParseCache(self.options_path).load_document()
+
+        self.assertEqual(document.settings(MCM_SECTION)["a/setting"].value, "1")
+
+    def test_cached_document_has_mcm_settings(self):
+        """Test that the [mcm] section is tokenized before the document is pickled, so a warm run doesn't tokenize it"""
+        cache = ParseCache(self.options_path)
+        cache.load_document()
+
+        with open(cache.cache_path, "rb") as cache_file:
+            document = pickle.load(cache_file)["document"]
+        self.assertEqual(document.section_settings[MCM_SECTION]["a/setting"].value, "1")
+        self.assertEqual(document.section_line_numbers[MCM_SECTION], {"a/setting": 1})
+
+        with patch("classes.ltx_document.tokenize_settings", side_effect=AssertionError):
+            self.assertEqual(document.settings(MCM_SECTION)["a/setting"].value, "1")
+
+    def test_same_contents_with_new_mtime_uses_hash(self):
+        """Test that touching the file without changing it still uses the cache"""
+        ParseCache(self.options_path).load_document()
+        self.write_options("[mcm]\n        a/setting = 1\n", mtime_ns=1_000_000_000)
+
+        with patch.object(LtxDocument, "from_file", side_effect=AssertionError):
+            document = ParseCache(self.options_path).load_document()
+
+        self.assertEqual(document.settings(MCM_SECTION)["a/setting"].value, "1")
+
+    def test_changed_contents_with_same_size_and_mtime(self):
+        """Test that a change that keeps size and mtime is still detected"""
+        self.write_options("[mcm]\n        a/setting = 1\n", mtime_ns=1_000_000_000)
+        ParseCache(self.options_path).load_document()
+
+        self.write_options("[mcm]\n        a/setting = 2\n", mtime_ns=1_000_000_000)
+        document = ParseCache(self.options_path).load_document()
+
+        self.assertEqual(document.settings(MCM_SECTION)["a/setting"].value, "2")
+
+    def test_broken_cache_is_parsed_again(self):
+        """Test that a corrupt cache file is ignored and rewritten"""
+        cache = ParseCache(self.options_path)
+        with open(cache.cache_path, "wb") as cache_file:
+            cache_file.write(b"not a pickle")
+
+        document = cache.load_document()
+
+        self.assertEqual(document.settings(MCM_SECTION)["a/setting"].value, "1")
+        self.assertEqual(
+            ParseCache(self.options_path).load_document().lines, document.lines
+        )
+
+    def test_concurrent_writes_of_the_same_file(self):
+        """Test that threads writing the cache of the same file at once each write their own temporary file"""
+        barrier = threading.Barrier(2, timeout=5)
+        dump = pickle.dump
+
+        def dump_together(*args):
+            barrier.wait()
+            dump(*args)
+
+        with patch("pickle.dump", dump_together), patch("builtins.print") as mock_print:
+            threads = [threading.Thread(target=ParseCache(self.options_path).load_document) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        mock_print.assert_not_called()
+        cache_name = os.path.basename(ParseCache(self.options_path).cache_path)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), sorted(["axr_options.ltx", cache_name]))
+
+    def test_clear(self):
+        """Test removing the cache file"""
+        cache = ParseCache(self.options_path)
+        cache.load_document()
+        self.assertTrue(os.path.exists(cache.cache_path))
+
+        cache.clear()
+
+        self.assertFalse(os.path.exists(cache.cache_path))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
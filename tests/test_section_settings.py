@@ -0,0 +1,134 @@
+import unittest
+import tempfile
+import argparse
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.ltx_document import group_settings_by_section, split_setting_name
+from classes.settings_patch import SettingsPatch
+
+
+class TestSectionSettings(unittest.TestCase):
+    def setUp(self):
+        self.EIGHT_SPACES = " " * 8
+        self.sample_content = [
+            "[character_creation]\n",
+            "        new_game_azazel_mode             =\n",
+            "        new_game_difficulty              = normal\n",
+            " \n",
+            "[global_keybinds]\n",
+            "        debug_demo_record                = DIK_NUMPAD0\n",
+            " \n",
+            "[mcm]\n",
+            "        3d_scopes/chromatism             = true\n",
+            "        EA_settings/ea_debug             = false\n",
+            " \n",
+        ]
+        self.user_settings = {
+            "3d_scopes/chromatism": False,
+            "global_keybinds::debug_demo_record": "DIK_F1",
+            "character_creation::new_game_difficulty": "hard",
+            "character_creation::new_game_story_mode": True,
+        }
+
+    def test_split_setting_name(self):
+        """Test that names without a section prefix belong to [mcm]"""
+        self.assertEqual(split_setting_name("3d_scopes/chromatism"), ("mcm", "3d_scopes/chromatism"))
+        self.assertEqual(
+            split_setting_name("global_keybinds::debug_demo_record"), ("global_keybinds", "debug_demo_record")
+        )
+        self.assertEqual(
+            group_settings_by_section(self.user_settings),
+            {
+                "mcm": {"3d_scopes/chromatism": False},
+                "global_keybinds": {"debug_demo_record": "DIK_F1"},
+                "character_creation": {"new_game_difficulty": "hard", "new_game_story_mode": True},
+            },
+        )
+
+    def test_merge_settings_other_sections(self):
+        """Test that section:: settings are updated and added in their own section"""
+        result = mcm_manager.merge_settings(self.sample_content, self.user_settings)
+
+        self.assertEqual(
+            result,
+            [
+                "[character_creation]\n",
+                "        new_game_azazel_mode             =\n",
+                f"{self.EIGHT_SPACES}new_game_difficulty = hard\n",
+                f"{self.EIGHT_SPACES}new_game_story_mode = true\n",
+                " \n",
+                "[global_keybinds]\n",
+                f"{self.EIGHT_SPACES}debug_demo_record = DIK_F1\n",
+                " \n",
+                "[mcm]\n",
+                f"{self.EIGHT_SPACES}3d_scopes/chromatism = false\n",
+                "        EA_settings/ea_debug             = false\n",
+                " \n",
+            ],
+        )
+
+    def test_stream_and_incremental_match_merge_settings(self):
+        """Test that the streaming merge and the incremental patch apply section:: settings too"""
+        expected = mcm_manager.merge_settings(self.sample_content, self.user_settings)
+
+        self.assertEqual(
+            list(mcm_manager.iter_merged_settings(self.sample_content, self.user_settings)), expected
+        )
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            options_path = os.path.join(temp_dir, "axr_options.ltx")
+            with open(options_path, "w") as options_file:
+                options_file.writelines(self.sample_content)
+
+            SettingsPatch.for_user_settings(options_path, self.user_settings).apply()
+
+            with open(options_path, "r") as options_file:
+                patched = options_file.readlines()
+
+        self.assertIn("        debug_demo_record                = DIK_F1\n", patched)
+        self.assertIn("        new_game_difficulty              = hard\n", patched)
+        self.assertEqual(patched[3], f"{self.EIGHT_SPACES}new_game_story_mode = true\n")
+
+    def test_missing_section_merges_nothing(self):
+        """Test that a section:: prefix naming a missing section stops the merge in every mode"""
+        user_settings = {"3d_scopes/chromatism": False, "no_such_section::setting": 1}
+
+        with patch("builtins.print") as mock_print:
+            result = mcm_manager.merge_settings(self.sample_content, user_settings)
+        self.assertEqual(result, self.sample_content)
+        self.assertIn("no_such_section", str(mock_print.call_args_list))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            options_path = os.path.join(temp_dir, "axr_options.ltx")
+            with open(options_path, "w") as options_file:
+                options_file.writelines(self.sample_content)
+            args = argparse.Namespace(stream=True, incremental=False)
+
+            with patch("builtins.print"), patch("mcm_manager.make_store_backup"):
+                default = mcm_manager.read_default_document(temp_dir, args, user_settings)
+                mcm_manager.write_merged_default_file(temp_dir, default, user_settings, args)
+
+            with open(options_path, "r") as options_file:
+                self.assertEqual(options_file.readlines(), self.sample_content)
+
+    def test_validation_warns_about_unknown_section_keys(self):
+        """Test that the diff warning looks up section:: settings in their own section"""
+        user_settings = {
+            "global_keybinds::debug_demo_record": "DIK_F1",
+            "global_keybinds::unknown_bind": "DIK_F2",
+        }
+
+        with patch("builtins.print") as mock_print:
+            mcm_manager.print_settings_and_default_file_diff(self.sample_content, user_settings)
+
+        output = str(mock_print.call_args_list)
+        self.assertIn("global_keybinds::unknown_bind = DIK_F2", output)
+        self.assertNotIn("debug_demo_record", output)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
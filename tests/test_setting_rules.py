@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import hashlib
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.ltx_document import LtxDocument
+from classes.namespace_trie import NamespaceTrie
+from classes.setting_rules import RuleResolver
+
+
+class TestSettingRules(unittest.TestCase):
+    def setUp(self):
+        self.names = [
+            "SMR/smr_loot/ammo_spawn",
+            "SMR/smr_loot/meds_spawn",
+            "SMR/smr_loot/smr_loot_enabled",
+            "fftd/bpcfg/cost_coef",
+            "fftd/bpcfg/mapmpm",
+            "fftd/ftcfg/mapmpm",
+            "fftd/mapmpm",
+            "ssfx_module/ao/quality_mcm",
+            "ssfx_module/il/quality_mcm",
+        ]
+        self.default_content = (
+            ["[global_keybinds]\n", "        debug_demo_record                = DIK_NUMPAD0\n", " \n", "[mcm]\n"]
+            + [f"        {name:<32} = 0\n" for name in self.names]
+            + [" \n"]
+        )
+
+    def test_trie_match(self):
+        """Test glob segments, '*' staying within a namespace and '**' crossing namespaces"""
+        trie = NamespaceTrie(self.names)
+
+        self.assertEqual(trie.match("fftd/*/mapmpm"), ["fftd/bpcfg/mapmpm", "fftd/ftcfg/mapmpm"])
+        self.assertEqual(
+            trie.match("SMR/smr_loot/*_spawn"), ["SMR/smr_loot/ammo_spawn", "SMR/smr_loot/meds_spawn"]
+        )
+        self.assertCountEqual(
+            trie.match("fftd/**/mapmpm"), ["fftd/bpcfg/mapmpm", "fftd/ftcfg/mapmpm", "fftd/mapmpm"]
+        )
+        self.assertEqual(trie.match("fftd/bpcfg/*"), ["fftd/bpcfg/cost_coef", "fftd/bpcfg/mapmpm"])
+        self.assertEqual(trie.match("fftd/mapmpm"), ["fftd/mapmpm"])
+        self.assertEqual(trie.match("fftd/*"), ["fftd/mapmpm"])
+        self.assertEqual(trie.match("nothing/*"), [])
+
+    def test_explicit_names_override_rules(self):
+        """Test that explicit names win over rules and later rules over earlier ones"""
+        resolver = RuleResolver()
+        user_settings = {
+            "ssfx_module/*/quality_mcm": 1,
+            "ssfx_module/il/quality_mcm": 3,
+            "ssfx_module/a*/quality_mcm": 2,
+            "global_keybinds::debug_*": "DIK_F1",
+            "unknown/*": True,
+        }
+
+        resolved, unmatched_rules = resolver.resolve(user_settings, LtxDocument(self.default_content))
+
+        self.assertEqual(
+            resolved,
+            {
+                "ssfx_module/ao/quality_mcm": 2,
+                "ssfx_module/il/quality_mcm": 3,
+                "global_keybinds::debug_demo_record": "DIK_F1",
+            },
+        )
+        self.assertEqual(unmatched_rules, ["unknown/*"])
+
+    def test_matches_are_cached_per_file_contents(self):
+        """Test that an unchanged default file reuses its matches and a changed one doesn't"""
+        resolver = RuleResolver(cached_file_count=1)
+        user_settings = {"fftd/*/mapmpm": 1}
+
+        with patch("classes.setting_rules.NamespaceTrie", wraps=NamespaceTrie) as trie_class:
+            resolver.resolve(user_settings, LtxDocument(self.default_content))
+            resolver.resolve({**user_settings, "fftd/mapmpm": 2}, LtxDocument(list(self.default_content)))
+            self.assertEqual(trie_class.call_count, 1)
+
+            changed_content = self.default_content[:-1] + ["        fftd/xcfg/mapmpm                 = 0\n"]
+            resolved, _ = resolver.resolve(user_settings, LtxDocument(changed_content))
+            self.assertEqual(trie_class.call_count, 2)
+
+        self.assertIn("fftd/xcfg/mapmpm", resolved)
+
+    def test_content_hash_is_computed_once_per_document(self):
+        """Test that resolving against the same document again doesn't hash its lines again"""
+        resolver = RuleResolver()
+        document = LtxDocument(self.default_content)
+
+        with patch("classes.ltx_document.hashlib.sha256", wraps=hashlib.sha256) as sha256:
+            resolver.resolve({"fftd/*/mapmpm": 1}, document)
+            resolver.resolve({"ssfx_module/*/quality_mcm": 2}, document)
+            self.assertEqual(sha256.call_count, 1)
+
+        self.assertEqual(document.content_hash(), LtxDocument(list(self.default_content)).content_hash())
+
+    def test_main_applies_rules(self):
+        """Test that the merge writes the settings matched by a rule"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, "axr_options.ltx"), "w") as default_file:
+                default_file.writelines(self.default_content)
+            with open(os.path.join(temp_dir, "axr_options_saved.ltx"), "w") as saved_file:
+                saved_file.writelines(self.default_content)
+            with open(os.path.join(temp_dir, "settings.json"), "w") as settings_file:
+                json.dump({"fftd/*/mapmpm": 1}, settings_file)
+
+            with patch("builtins.print"):
+                mcm_manager.main([temp_dir, "--no-cache"])
+
+            with open(os.path.join(temp_dir, "axr_options.ltx"), "r") as default_file:
+                lines = default_file.readlines()
+
+        self.assertIn("        fftd/bpcfg/mapmpm = 1\n", lines)
+        self.assertIn("        fftd/ftcfg/mapmpm = 1\n", lines)
+        self.assertIn("        fftd/mapmpm                      = 0\n", lines)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,140 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.ltx_document import LtxDocument
+
+
+class TestSettingsDiff(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.default_content = [
+            "[character_creation]\n",
+            "        new_game_difficulty              = normal\n",
+            " \n",
+            "[mcm]\n",
+            "        3d_scopes/chromatism             = true\n",
+            "        EA_settings/ea_debug             =\n",
+            "        SMR/smr_amain/smr_enabled        = true\n",
+            "        zzz/removed                      = 1\n",
+            " \n",
+        ]
+        self.user_content = [
+            "[mcm]\n",
+            "        3d_scopes/chromatism             = false\n",
+            "        EA_settings/ea_debug             =\n",
+            "        SMR/smr_amain/smr_enabled        = true\n",
+            "        aaa/\"quoted\"                     = 2\n",
+            " \n",
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_json(self, default, user) -> tuple[str, object]:
+        diff = mcm_manager.create_json_file_from_user_and_default_settings_diff(
+            default, user, self.temp_dir.name
+        )
+        with open(os.path.join(self.temp_dir.name, "generated_user_settings.json"), "r") as json_file:
+            return json_file.read(), diff
+
+    def test_json_matches_json_dumps(self):
+        """Test that the incrementally written json is the same as json.dumps of the differences"""
+        contents, _ = self.create_json(self.default_content, self.user_content)
+
+        self.assertEqual(
+            contents, json.dumps({"3d_scopes/chromatism": False, 'aaa/"quoted"': 2})
+        )
+
+    def test_added_removed_and_changed(self):
+        """Test that differences are reported separately, and an empty default value isn't treated as missing"""
+        _, diff = self.create_json(self.default_content, self.user_content)
+
+        self.assertEqual(diff.added, ['aaa/"quoted"'])
+        self.assertEqual(diff.removed, ["zzz/removed"])
+        self.assertEqual(diff.changed, ["3d_scopes/chromatism"])
+
+    def test_documents_and_lines_give_same_json(self):
+        """Test that parsed documents give the same json as lines"""
+        from_lines, _ = self.create_json(self.default_content, self.user_content)
+        from_documents, _ = self.create_json(
+            LtxDocument(self.default_content), LtxDocument(self.user_content)
+        )
+
+        self.assertEqual(from_documents, from_lines)
+
+    def test_unsorted_section(self):
+        """Test that an unsorted section is diffed after sorting, without leftovers of the first attempt"""
+        user_content = [self.user_content[0]] + self.user_content[1:-1][::-1] + [self.user_content[-1]]
+
+        contents, diff = self.create_json(self.default_content, user_content)
+
+        self.assertEqual(json.loads(contents), {"3d_scopes/chromatism": False, 'aaa/"quoted"': 2})
+        self.assertEqual(
+            diff.to_dict(),
+            {"added": ['aaa/"quoted"'], "removed": ["zzz/removed"], "changed": ["3d_scopes/chromatism"]},
+        )
+
+    def test_typed_values_and_tolerance(self):
+        """Test that numbers spelled differently aren't differences and numbers within tolerance are the same"""
+        default_content = ["[mcm]\n", "        a/float = 0.8\n", "        a/int = 1\n", "        a/near = 2.0\n"]
+        user_content = ["[mcm]\n", "        a/float = 0.80\n", "        a/int = 1.0\n", "        a/near = 2.05\n"]
+
+        contents, diff = self.create_json(default_content, user_content)
+        self.assertEqual(json.loads(contents), {"a/near": 2.05})
+        self.assertEqual(diff.changed, ["a/near"])
+
+        mcm_manager.create_json_file_from_user_and_default_settings_diff(
+            default_content, user_content, self.temp_dir.name, 0.1
+        )
+        with open(os.path.join(self.temp_dir.name, "generated_user_settings.json"), "r") as json_file:
+            self.assertEqual(json.load(json_file), {})
+
+    def test_values_that_dont_round_trip_stay_text(self):
+        """Test that numbers a float would write back differently, or couldn't hold, are written as text"""
+        default_content = ["[mcm]\n", "        a/huge = 1\n", "        a/padded = 0.5\n", "        a/zero = 1\n"]
+        user_content = ["[mcm]\n", "        a/huge = 1e999\n", "        a/padded = 0.80\n", "        a/zero = -0\n"]
+
+        contents, _ = self.create_json(default_content, user_content)
+        self.assertEqual(contents, json.dumps({"a/huge": "1e999", "a/padded": "0.80", "a/zero": "-0"}))
+
+        merged = mcm_manager.merge_settings(default_content, json.loads(contents))
+        self.assertEqual(merged[1:], user_content[1:])
+
+    def test_generated_json_merges_back(self):
+        """Test that merging the generated json into the default file gives the user's values back"""
+        contents, _ = self.create_json(self.default_content, self.user_content)
+
+        merged = mcm_manager.merge_settings(self.default_content, json.loads(contents))
+        self.assertIn("        3d_scopes/chromatism = false\n", merged)
+        self.assertIn('        aaa/"quoted" = 2\n', merged)
+
+    def test_diff_in_batches(self):
+        """Test that a section larger than a batch of columns gives the same differences"""
+        default_content = ["[mcm]\n"] + [f"        a/{index:05} = {index}\n" for index in range(10000)]
+        user_content = ["[mcm]\n"] + [
+            f"        a/{index:05} = {index + 1 if index % 1000 == 0 else index}.0\n" for index in range(10000)
+        ]
+
+        contents, diff = self.create_json(default_content, user_content)
+        self.assertEqual(json.loads(contents), {f"a/{index:05}": index + 1.0 for index in range(0, 10000, 1000)})
+        self.assertEqual(len(diff.changed), 10)
+
+    def test_missing_section(self):
+        """Test that no json file is written when a file has no [mcm] section"""
+        diff = mcm_manager.create_json_file_from_user_and_default_settings_diff(
+            self.default_content, self.default_content[:3], self.temp_dir.name
+        )
+
+        self.assertIsNone(diff)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+        with self.assertRaises(ValueError):
+            mcm_manager.get_mcm_settings_getter(LtxDocument(self.default_content[:3]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
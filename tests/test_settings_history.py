@@ -0,0 +1,121 @@
+import unittest
+import tempfile
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.backup_store import BackupStore
+from classes.ltx_document import LtxDocument
+from classes.settings_history import SettingsHistory
+
+
+class TestSettingsHistory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.temp_dir.name, "history.sqlite")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_options(self, name: str, settings: dict[str, str]) -> str:
+        file_path = os.path.join(self.temp_dir.name, name)
+        with open(file_path, "w") as options_file:
+            options_file.write("[global_keybinds]\n        debug_demo_record = DIK_NUMPAD0\n \n[mcm]\n")
+            options_file.writelines(f"        {name} = {value}\n" for name, value in settings.items())
+        return file_path
+
+    def test_queries_across_releases(self):
+        """Test the history of a setting and the settings added and removed, with releases in natural order"""
+        with SettingsHistory(self.database_path) as history:
+            for release, settings in [
+                ("0.9", {"free_zoom/ads_mult": "1", "old/key": "0"}),
+                ("0.10", {"free_zoom/ads_mult": "0.5"}),
+                ("0.9.2", {"free_zoom/ads_mult": "1", "new/key": "1"}),
+            ]:
+                history.ingest_file(self.write_options(f"{release}.ltx", settings), release, "default")
+
+            self.assertEqual(history.releases(), ["0.9", "0.9.2", "0.10"])
+            self.assertEqual(
+                history.setting_changes("free_zoom/ads_mult"), [("0.9", None, "1"), ("0.10", "1", "0.5")]
+            )
+            self.assertEqual(
+                history.setting_history("global_keybinds::debug_demo_record"),
+                [("0.9", "DIK_NUMPAD0"), ("0.9.2", "DIK_NUMPAD0"), ("0.10", "DIK_NUMPAD0")],
+            )
+            self.assertEqual(history.added_settings("0.9.2"), ["new/key"])
+            self.assertEqual(history.removed_settings("0.9.2"), ["old/key"])
+            self.assertEqual(history.removed_settings("0.10"), ["new/key"])
+            self.assertEqual(history.releases("saved"), [])
+            with self.assertRaises(ValueError):
+                history.added_settings("1.0")
+
+            plan = history.connection.execute(
+                "EXPLAIN QUERY PLAN SELECT value FROM settings WHERE release = ? AND key = ?", ("0.9", "a")
+            ).fetchall()
+            self.assertIn("settings_release_key", str(plan))
+
+    def test_stored_hashes_are_not_parsed_again(self):
+        """Test that known files are skipped or copied without parsing, and a new file replaces its release"""
+        file_path = self.write_options("axr_options.ltx", {"a": "1", "b": "2"})
+
+        with SettingsHistory(self.database_path) as history, patch(
+            "classes.settings_history.LtxDocument.from_file", wraps=LtxDocument.from_file
+        ) as from_file:
+            self.assertTrue(history.ingest_file(file_path, "0.9", "default"))
+            self.assertFalse(history.ingest_file(file_path, "0.9", "default"))
+            self.assertTrue(history.ingest_file(file_path, "0.10", "default"))
+            self.assertTrue(history.ingest_file(file_path, "0.10", "saved"))
+            self.assertEqual(from_file.call_count, 1)
+
+            self.write_options("axr_options.ltx", {"a": "3"})
+            self.assertTrue(history.ingest_file(file_path, "0.10", "default"))
+            self.assertEqual(from_file.call_count, 2)
+
+            self.assertEqual(history.setting_history("a"), [("0.9", "1"), ("0.10", "3")])
+            self.assertEqual(history.setting_history("b", "saved"), [("0.10", "2")])
+            self.assertEqual(history.connection.execute("SELECT COUNT(*) FROM settings").fetchone()[0], 8)
+
+    def test_ingest_backups(self):
+        """Test that backups are stored with their timestamp as release and only decompressed once"""
+        file_path = self.write_options("axr_options.ltx", {"a": "1"})
+        store = BackupStore(os.path.join(self.temp_dir.name, "backups"))
+        store.snapshot_file(file_path, "20250101_120000")
+        self.write_options("axr_options.ltx", {"a": "2"})
+        store.snapshot_file(file_path, "20250201_120000")
+
+        with SettingsHistory(self.database_path) as history:
+            self.assertEqual(history.ingest_backups(store), 2)
+            with patch.object(store, "read_snapshot") as read_snapshot:
+                self.assertEqual(history.ingest_backups(store), 0)
+            read_snapshot.assert_not_called()
+
+            self.assertEqual(
+                history.setting_changes("a"), [("20250101_120000", None, "1"), ("20250201_120000", "1", "2")]
+            )
+
+    def test_merge_records_history_and_command_queries_it(self):
+        """Test that --history-release stores the files before merging and the history command reads them"""
+        self.write_options("axr_options.ltx", {"free_zoom/ads_mult": "1"})
+        self.write_options("axr_options_saved.ltx", {"free_zoom/ads_mult": "2"})
+        with open(os.path.join(self.temp_dir.name, "settings.json"), "w") as settings_file:
+            settings_file.write('{"free_zoom/ads_mult": 3}')
+
+        with patch("builtins.print"):
+            mcm_manager.main([self.temp_dir.name, "--no-cache", "--history-release", "0.9.3"])
+
+        with patch("builtins.print") as mock_print:
+            result = mcm_manager.main(
+                ["history", "changes", "free_zoom/ads_mult", "--path", self.temp_dir.name]
+            )
+        self.assertEqual(result, 0)
+        self.assertIn("0.9.3: (not present) -> 1", str(mock_print.call_args_list))
+
+        with patch("builtins.print") as mock_print:
+            mcm_manager.main(["history", "releases", "--kind", "saved", "--path", self.temp_dir.name])
+        mock_print.assert_called_once_with("0.9.3")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,222 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.backup_store import BackupStore
+from classes.settings_patch import SettingsPatch
+
+
+class TestSettingsPatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.options_path = os.path.join(self.temp_dir.name, "axr_options.ltx")
+        self.sample_content = (
+            b"[character_creation]\r\n"
+            b"        new_game_difficulty              = normal\r\n"
+            b" \r\n"
+            b"[mcm]\r\n"
+            b"        3d_scopes/chromatism             = true\r\n"
+            b"        EA_settings/ea_debug             =\r\n"
+            b"        SMR/smr_amain/smr_enabled        = true\r\n"
+            b" \r\n"
+            b"[modded_exes]\r\n"
+            b"        some_exe_setting                 = value\r\n"
+        )
+        self.write_options(self.sample_content)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_options(self, contents: bytes):
+        with open(self.options_path, "wb") as options_file:
+            options_file.write(contents)
+
+    def read_options(self) -> bytes:
+        with open(self.options_path, "rb") as options_file:
+            return options_file.read()
+
+    def test_replace_keeps_alignment(self):
+        """Test that only the value of a changed setting is replaced"""
+        patch = SettingsPatch.for_user_settings(
+            self.options_path,
+            {"3d_scopes/chromatism": False, "EA_settings/ea_debug": True},
+        )
+        patch.apply()
+
+        self.assertEqual(
+            self.read_options(),
+            self.sample_content.replace(
+                b"chromatism             = true", b"chromatism             = false"
+            ).replace(b"ea_debug             =\r\n", b"ea_debug             = true\r\n"),
+        )
+
+    def test_insert_in_sorted_position(self):
+        """Test that new settings are inserted at their sorted position with the file's line endings"""
+        SettingsPatch.for_user_settings(
+            self.options_path, {"BBB/new": 1, "zzz/new": "value"}
+        ).apply()
+
+        lines = self.read_options().splitlines(keepends=True)
+        self.assertEqual(lines[5], b"        BBB/new = 1\r\n")
+        self.assertEqual(lines[8], b"        zzz/new = value\r\n")
+        self.assertEqual(len(lines), 12)
+
+    def test_unchanged_file_is_not_written(self):
+        """Test that the file is left alone when the settings are already applied"""
+        os.utime(self.options_path, ns=(1_000_000_000, 1_000_000_000))
+
+        patch = SettingsPatch.for_user_settings(
+            self.options_path, {"3d_scopes/chromatism": True}
+        )
+        patch.apply()
+
+        self.assertTrue(patch.is_empty())
+        self.assertEqual(os.stat(self.options_path).st_mtime_ns, 1_000_000_000)
+
+    def test_insert_at_end_without_newline(self):
+        """Test inserting after a last line that has no line ending"""
+        self.write_options(b"[mcm]\n        a/setting = 1")
+
+        SettingsPatch.for_user_settings(self.options_path, {"b/setting": 2}).apply()
+
+        self.assertEqual(
+            self.read_options(), b"[mcm]\n        a/setting = 1\n        b/setting = 2\n"
+        )
+
+    def test_missing_section(self):
+        """Test error when the section doesn't exist"""
+        self.write_options(b"[character_creation]\n")
+
+        with self.assertRaises(ValueError):
+            SettingsPatch.for_user_settings(self.options_path, {"a": 1})
+
+    def test_plan(self):
+        """Test that the plan lists every changed line with its setting, old and new value"""
+        settings_patch = SettingsPatch.for_user_settings(
+            self.options_path,
+            {"3d_scopes/chromatism": False, "BBB/new": 1, "character_creation::new_game_difficulty": "hard"},
+        )
+
+        self.assertEqual(
+            settings_patch.plan(),
+            {
+                "version": 1,
+                "line_count": 10,
+                "changes": [
+                    [1, "replace", "character_creation::new_game_difficulty", "normal", "hard"],
+                    [4, "replace", "3d_scopes/chromatism", "true", "false"],
+                    [5, "insert", "BBB/new", None, "1"],
+                ],
+            },
+        )
+
+    def test_saved_plan_and_undo(self):
+        """Test that a saved plan writes the same file as the patch, and its reverse plan restores the original"""
+        user_settings = {"3d_scopes/chromatism": False, "BBB/new": 1, "zzz/new": "value", "modded_exes::a": 2}
+        settings_patch = SettingsPatch.for_user_settings(self.options_path, user_settings)
+        plan = json.loads(json.dumps(settings_patch.plan()))
+
+        settings_patch.apply()
+        patched_content = self.read_options()
+        self.write_options(self.sample_content)
+
+        planned_patch = SettingsPatch.from_plan(self.options_path, plan)
+        reverse_plan = json.loads(json.dumps(planned_patch.reverse_plan()))
+        planned_patch.apply()
+        self.assertEqual(self.read_options(), patched_content)
+
+        SettingsPatch.from_plan(self.options_path, reverse_plan).apply()
+        self.assertEqual(self.read_options(), self.sample_content)
+
+    def test_stale_plan_is_refused(self):
+        """Test that a plan isn't applied to a file that changed since it was made"""
+        plan = SettingsPatch.for_user_settings(self.options_path, {"3d_scopes/chromatism": False}).plan()
+
+        self.write_options(self.sample_content.replace(b"chromatism             = true", b"chromatism = 1"))
+        with self.assertRaises(ValueError):
+            SettingsPatch.from_plan(self.options_path, plan)
+
+        self.write_options(self.sample_content + b"        other = 1\r\n")
+        with self.assertRaises(ValueError):
+            SettingsPatch.from_plan(self.options_path, plan)
+
+    def test_malformed_plan_is_refused(self):
+        """Test that changes without the shape and types of a planned change are refused"""
+        for change in [
+            5,
+            [4, "replace", "3d_scopes/chromatism", "true"],
+            [4, "replace", "3d_scopes/chromatism", "true", None],
+            [4, "replace", 7, "true", "false"],
+            [True, "replace", "3d_scopes/chromatism", "true", "false"],
+            [5, "insert", "BBB/new", None, 1],
+            [5, "delete", "3d_scopes/chromatism", "true", "false"],
+        ]:
+            with self.subTest(change=change), self.assertRaises(ValueError):
+                SettingsPatch.from_plan(self.options_path, {"version": 1, "line_count": 10, "changes": [change]})
+
+    def test_plan_checks_the_section(self):
+        """Test that a change of a setting in one section doesn't match the same name in another section"""
+        plan = {
+            "version": 1,
+            "line_count": 10,
+            "changes": [[1, "replace", "modded_exes::new_game_difficulty", "normal", "hard"]],
+        }
+        with self.assertRaises(ValueError):
+            SettingsPatch.from_plan(self.options_path, plan)
+
+        plan["changes"][0][2] = "new_game_difficulty"
+        with self.assertRaises(ValueError):
+            SettingsPatch.from_plan(self.options_path, plan)
+
+    def test_dry_run_and_apply_plan(self):
+        """Test that --dry-run writes nothing but the plan, and --apply-plan and its undo plan change the file"""
+        with open(os.path.join(self.temp_dir.name, "settings.json"), "w") as settings_file:
+            json.dump({"3d_scopes/*": False, "BBB/new": 1}, settings_file)
+        plan_path = os.path.join(self.temp_dir.name, "plan.json")
+        undo_path = os.path.join(self.temp_dir.name, "undo_plan.json")
+
+        with patch("builtins.print"):
+            result = mcm_manager.main(
+                [self.temp_dir.name, "--incremental", "--dry-run", "--plan-output", plan_path, "--no-cache"]
+            )
+        self.assertEqual(result, 0)
+        self.assertEqual(self.read_options(), self.sample_content)
+        self.assertNotIn("backups", os.listdir(self.temp_dir.name))
+
+        with patch("builtins.print"):
+            self.assertEqual(mcm_manager.main([self.temp_dir.name, "--incremental", "--apply-plan", plan_path]), 0)
+        self.assertIn(b"chromatism             = false\r\n", self.read_options())
+        self.assertIn(b"        BBB/new = 1\r\n", self.read_options())
+        # The file is backed up before the plan is applied, like before a merge
+        self.assertEqual(len(BackupStore(os.path.join(self.temp_dir.name, "backups")).entries()), 1)
+
+        # The plan was made for the file before it was applied
+        with patch("builtins.print") as print_mock:
+            self.assertEqual(mcm_manager.main([self.temp_dir.name, "--incremental", "--apply-plan", plan_path]), 1)
+        print_mock.assert_any_call("Could not apply the plan.", unittest.mock.ANY)
+
+        with patch("builtins.print"):
+            self.assertEqual(
+                mcm_manager.main(
+                    [self.temp_dir.name, "--incremental", "--apply-plan", undo_path, "--undo-output", plan_path]
+                ),
+                0,
+            )
+        self.assertEqual(self.read_options(), self.sample_content)
+
+    def test_plans_need_incremental(self):
+        """Test that plans are refused without --incremental, whose changes are the only ones a plan can hold"""
+        for arguments in (["--dry-run"], ["--apply-plan", "plan.json"]):
+            with self.subTest(arguments=arguments), patch("sys.stderr"):
+                with self.assertRaises(SystemExit):
+                    mcm_manager.main([self.temp_dir.name, *arguments])
+        self.assertEqual(self.read_options(), self.sample_content)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,140 @@
+import unittest
+import tempfile
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.settings_profile import ProfileError, ProfileResolver
+
+
+class TestSettingsProfile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.temp_dir.name, "profiles"))
+        self.write_profile(
+            "profiles/base.json",
+            {"ssfx_module/*/quality_mcm": 2, "ssfx_module/ao/quality_mcm": 3, "fftd/mapmpm": 1},
+        )
+        self.write_profile(
+            "profiles/low_end.json",
+            {"extends": ["base.json"], "ssfx_module/*/quality_mcm": 0, "3d_scopes/chromatism": False},
+        )
+        self.write_profile("settings.json", {"extends": ["profiles/low_end.json"], "fftd/mapmpm": 5})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_profile(self, name: str, profile: object):
+        with open(os.path.join(self.temp_dir.name, name), "w") as profile_file:
+            json.dump(profile, profile_file)
+
+    def test_layers_override_the_profiles_they_extend(self):
+        """Test that each layer overrides its bases and that keys set again move after the rules they override"""
+        resolved = ProfileResolver().resolve(os.path.join(self.temp_dir.name, "settings.json"))
+
+        self.assertEqual(
+            list(resolved.items()),
+            [
+                ("ssfx_module/ao/quality_mcm", 3),
+                ("ssfx_module/*/quality_mcm", 0),
+                ("3d_scopes/chromatism", False),
+                ("fftd/mapmpm", 5),
+            ],
+        )
+
+    def test_unchanged_layers_are_not_resolved_again(self):
+        """Test that the resolved stack is cached until any of its layers changes"""
+        resolver = ProfileResolver()
+        settings_path = os.path.join(self.temp_dir.name, "settings.json")
+
+        with patch("classes.settings_profile.json.loads", wraps=json.loads) as loads:
+            first = resolver.resolve(settings_path)
+            first["fftd/mapmpm"] = 10
+            self.assertEqual(resolver.resolve(settings_path)["fftd/mapmpm"], 5)
+            self.assertEqual(loads.call_count, 3)
+
+            self.write_profile("profiles/base.json", {"fftd/mapmpm": 1, "fftd/bpcfg/mapmpm": 4})
+            resolved = resolver.resolve(settings_path)
+            self.assertEqual(loads.call_count, 6)
+
+        self.assertEqual(resolved["fftd/bpcfg/mapmpm"], 4)
+        self.assertNotIn("ssfx_module/ao/quality_mcm", resolved)
+        self.assertEqual(
+            sorted(resolver.layer_paths(settings_path)),
+            sorted(
+                os.path.abspath(os.path.join(self.temp_dir.name, name))
+                for name in ["settings.json", "profiles/low_end.json", "profiles/base.json"]
+            ),
+        )
+
+    def test_invalid_profiles(self):
+        """Test that cycles, profiles that aren't objects and files that aren't json raise ProfileError"""
+        resolver = ProfileResolver()
+        self.write_profile("profiles/base.json", {"extends": ["../settings.json"]})
+        with self.assertRaises(ProfileError):
+            resolver.resolve(os.path.join(self.temp_dir.name, "settings.json"))
+
+        self.write_profile("profiles/base.json", ["fftd/mapmpm"])
+        with self.assertRaises(ProfileError):
+            resolver.resolve(os.path.join(self.temp_dir.name, "settings.json"))
+
+        self.write_profile("profiles/base.json", {"extends": 1})
+        with self.assertRaises(ProfileError):
+            resolver.resolve(os.path.join(self.temp_dir.name, "settings.json"))
+
+        with open(os.path.join(self.temp_dir.name, "profiles/base.json"), "w") as profile_file:
+            profile_file.write("{not json")
+        with self.assertRaises(ProfileError):
+            resolver.resolve(os.path.join(self.temp_dir.name, "settings.json"))
+
+    def test_main_reports_profile_and_options_file_errors_apart(self):
+        """Test that only errors of the profiles are reported as errors of the user settings"""
+        for name in ["axr_options.ltx", "axr_options_saved.ltx"]:
+            with open(os.path.join(self.temp_dir.name, name), "w") as options_file:
+                options_file.write("[mcm]\n        fftd/mapmpm = 0\n")
+        self.write_profile("profiles/base.json", {"extends": ["../settings.json"]})
+
+        with patch("builtins.print") as mock_print:
+            self.assertEqual(mcm_manager.main([self.temp_dir.name, "--no-cache"]), 1)
+        self.assertIn("Could not read the user settings.", mock_print.call_args[0][0])
+
+        self.write_profile("profiles/base.json", {})
+        with open(os.path.join(self.temp_dir.name, "axr_options.ltx"), "wb") as options_file:
+            options_file.write(b"[mcm]\n        fftd/mapmpm = \xff\xfe\n")
+        with patch("builtins.print") as mock_print, patch("locale.getpreferredencoding", return_value="utf-8"):
+            self.assertEqual(mcm_manager.main([self.temp_dir.name, "--no-cache"]), 1)
+        mock_print.assert_called_with("Could not read the options files.", unittest.mock.ANY)
+        self.assertIsInstance(mock_print.call_args[0][1], UnicodeDecodeError)
+
+    def test_main_merges_the_selected_profile(self):
+        """Test that --settings-profile picks the leaf layer and the merge uses the resolved settings"""
+        default_content = [
+            "[mcm]\n",
+            "        fftd/mapmpm                      = 0\n",
+            "        ssfx_module/ao/quality_mcm       = 1\n",
+            "        ssfx_module/il/quality_mcm       = 1\n",
+        ]
+        for name in ["axr_options.ltx", "axr_options_saved.ltx"]:
+            with open(os.path.join(self.temp_dir.name, name), "w") as options_file:
+                options_file.writelines(default_content)
+        self.write_profile("profiles/high_end.json", {"extends": "base.json", "ssfx_module/il/quality_mcm": 4})
+
+        with patch("builtins.print"):
+            result = mcm_manager.main(
+                [self.temp_dir.name, "--no-cache", "--settings-profile", "profiles/high_end.json"]
+            )
+
+        with open(os.path.join(self.temp_dir.name, "axr_options.ltx"), "r") as options_file:
+            lines = options_file.readlines()
+
+        self.assertIsNone(result)
+        self.assertIn("        fftd/mapmpm = 1\n", lines)
+        self.assertIn("        ssfx_module/ao/quality_mcm = 3\n", lines)
+        self.assertIn("        ssfx_module/il/quality_mcm = 4\n", lines)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,150 @@
+import unittest
+import tempfile
+import tracemalloc
+import os
+import sys
+from typing import Any, Iterator
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+
+
+def generate_options_file(line_count: int) -> Iterator[str]:
+    """Yields a synthetic axr_options.ltx with a small [mcm] section and a large [options] section."""
+    yield "[character_creation]\n"
+    yield "        new_game_difficulty              = normal\n"
+    yield " \n"
+    yield "[mcm]\n"
+    for i in range(1000):
+        yield f"        mod_{i // 100:02d}/sub/key_{i:04d}         = {i}\n"
+    yield " \n"
+    yield "[options]\n"
+    for i in range(line_count - 1007):
+        yield f"        option_{i:07d}                   = {i % 7}\n"
+
+
+class TestStreamingMerge(unittest.TestCase):
+    def setUp(self):
+        self.sample_default_axr_content = [
+            "[character_creation]\n",
+            "        new_game_difficulty              = normal\n",
+            " \n",
+            "[mcm]\n",
+            "        21_game/card_game_21_minimum_rate = 500\n",
+            "        3d_scopes/chromatism             = true\n",
+            "        3d_scopes/nvg_blur               = false\n",
+            "        EA_settings/ea_debug             = false\n",
+            " \n",
+            "[modded_exes]\n",
+            "        some_exe_setting                 = value\n",
+        ]
+        self.sample_settings: dict[str, Any] = {
+            "3d_scopes/chromatism": False,
+            "3d_scopes/nvg_blur": True,
+            "new_setting/test": 123,
+            "another_setting": "string_value",
+        }
+
+    def test_iter_merged_settings_matches_merge_settings(self):
+        """Test that streaming gives the same lines as merge_settings"""
+        self.assertEqual(
+            list(
+                mcm_manager.iter_merged_settings(
+                    self.sample_default_axr_content, self.sample_settings
+                )
+            ),
+            mcm_manager.merge_settings(
+                self.sample_default_axr_content, self.sample_settings
+            ),
+        )
+
+    def test_iter_merged_settings_mcm_at_end(self):
+        """Test streaming when the MCM section is at the end of the file"""
+        content_at_end = self.sample_default_axr_content[:8]
+
+        self.assertEqual(
+            list(mcm_manager.iter_merged_settings(content_at_end, self.sample_settings)),
+            mcm_manager.merge_settings(content_at_end, self.sample_settings),
+        )
+
+    def test_iter_merged_settings_duplicates_and_repeated_section(self):
+        """Test that duplicate keys, a repeated [mcm] header and a blank line in the section merge the same way"""
+        content = [
+            "[mcm]\n",
+            "        b/dup                            = 1\n",
+            "        a/first                          = 1\n",
+            " \n",
+            "        b/dup                            = 2\n",
+            "        c/last                           = 1\n",
+            " \n",
+            "[modded_exes]\n",
+            "        some_exe_setting                 = value\n",
+            "[mcm]\n",
+            "        b/dup                            = 3\n",
+            "        d/later                          = 1\n",
+        ]
+        settings = {"b/dup": 9, "d/later": 8, "e/new": 7}
+
+        merged = mcm_manager.merge_settings(content, settings)
+        self.assertEqual(list(mcm_manager.iter_merged_settings(content, settings)), merged)
+        self.assertEqual(
+            merged,
+            [
+                "[mcm]\n",
+                "        a/first                          = 1\n",
+                " \n",
+                "        b/dup = 9\n",
+                "        b/dup = 9\n",
+                "        c/last                           = 1\n",
+                "        d/later = 8\n",
+                "        e/new = 7\n",
+                " \n",
+                "[modded_exes]\n",
+                "        some_exe_setting                 = value\n",
+                "[mcm]\n",
+                "        b/dup = 9\n",
+                "        d/later = 8\n",
+            ],
+        )
+
+    def test_iter_merged_settings_no_mcm_section(self):
+        """Test that content without a MCM section is passed through unchanged"""
+        content_no_mcm = ["[character_creation]\n", "        setting = value\n"]
+
+        with patch("builtins.print"):
+            result = list(mcm_manager.iter_merged_settings(content_no_mcm, {"a": 1}))
+
+        self.assertEqual(result, content_no_mcm)
+
+    def test_write_merged_settings_million_lines(self):
+        """Test streaming a million line file in place, with flat memory and the same output as merge_settings"""
+        settings: dict[str, Any] = {
+            "mod_03/sub/key_0300": "changed",
+            "mod_09/sub/key_0999": True,
+            "aaa_new/setting": 1,
+        }
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            options_path = os.path.join(temp_dir, "axr_options.ltx")
+            with open(options_path, "w") as options_file:
+                options_file.writelines(generate_options_file(1_000_000))
+
+            with open(options_path, "r") as options_file:
+                expected = mcm_manager.merge_settings(options_file.readlines(), settings)
+
+            tracemalloc.start()
+            try:
+                mcm_manager.write_merged_settings(options_path, options_path, settings)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            with open(options_path, "r") as options_file:
+                self.assertEqual(options_file.readlines(), expected)
+
+            self.assertLess(peak, 4 * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
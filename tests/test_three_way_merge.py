@@ -0,0 +1,171 @@
+import unittest
+import tempfile
+import contextlib
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mcm_manager
+from classes.three_way_merge import ThreeWayMerge, merge_join
+
+
+def options_lines(settings: dict[str, str]) -> list[str]:
+    return (
+        ["[character_creation]\n", "        new_game_difficulty              = normal\n", " \n", "[mcm]\n"]
+        + [f"        {name:<32} = {value}\n" for name, value in settings.items()]
+        + [" \n", "[modded_exes]\n", "        some_exe_setting                 = value\n"]
+    )
+
+
+class TestThreeWayMerge(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.old_path = self.write("old.ltx", {"a/kept": "1", "b/modpack": "1", "c/user": "1", "d/both": "1", "e/removed": "1"})
+        self.new_path = self.write("new.ltx", {"a/kept": "1", "b/modpack": "2", "c/user": "1", "d/both": "2", "f/added": "1"})
+        self.saved_path = self.write("saved.ltx", {"a/kept": "1", "b/modpack": "1", "c/user": "3", "d/both": "3", "e/removed": "1"})
+        self.output_path = os.path.join(self.temp_dir.name, "merged.ltx")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, file_name: str, settings: dict[str, str] | list[str]) -> str:
+        file_path = os.path.join(self.temp_dir.name, file_name)
+        with open(file_path, "w") as options_file:
+            options_file.writelines(options_lines(settings) if isinstance(settings, dict) else settings)
+        return file_path
+
+    def read_output(self) -> list[str]:
+        with open(self.output_path, "r") as output_file:
+            return output_file.readlines()
+
+    def test_merge_rules(self):
+        """Test that modpack changes, user changes, conflicts, removals and additions are resolved"""
+        merge = ThreeWayMerge(self.old_path, self.new_path, self.saved_path)
+        merge.write(self.output_path)
+
+        self.assertEqual(
+            self.read_output(),
+            options_lines({"a/kept": "1", "b/modpack": "2", "c/user": "3", "d/both": "3", "f/added": "1"}),
+        )
+        self.assertEqual(merge.modpack_changes, ["b/modpack", "e/removed", "f/added"])
+        self.assertEqual(merge.user_changes, ["c/user"])
+        self.assertEqual(
+            merge.conflicts,
+            [{"name": "d/both", "old_default": "1", "new_default": "2", "saved": "3", "resolved_to": "saved"}],
+        )
+
+    def test_prefer_new(self):
+        """Test that conflicts can be resolved in favour of the new release"""
+        ThreeWayMerge(self.old_path, self.new_path, self.saved_path, prefer="new").write(self.output_path)
+
+        self.assertIn("        d/both                           = 2\n", self.read_output())
+
+    def test_unsorted_section_falls_back_to_sorting(self):
+        """Test that an unsorted section gives the same result as a sorted one"""
+        lines = options_lines({"c/user": "3", "a/kept": "1", "e/removed": "1", "b/modpack": "1", "d/both": "3"})
+        self.write("saved.ltx", lines)
+
+        merge = ThreeWayMerge(self.old_path, self.new_path, self.saved_path)
+        merge.write(self.output_path)
+
+        self.assertEqual(
+            self.read_output(),
+            options_lines({"a/kept": "1", "b/modpack": "2", "c/user": "3", "d/both": "3", "f/added": "1"}),
+        )
+        self.assertEqual(len(merge.conflicts), 1)
+
+    def test_comments_of_new_default_are_kept(self):
+        """Test that the lines of the new default's section without '=' are carried over to the merged file"""
+        new_lines = [
+            "[character_creation]\n",
+            "        new_game_difficulty              = normal\n",
+            " \n",
+            "[mcm]\n",
+            "        ; Settings of the modpack\n",
+            "        a/kept                           = 1\n",
+            "        b/modpack                        = 2\n",
+            " \n",
+            "        ; Changed by the user\n",
+            "        c/user                           = 1\n",
+            "        d/both                           = 2\n",
+            "        f/added                          = 1\n",
+            "        ; End of the settings\n",
+            " \n",
+            "[modded_exes]\n",
+            "        some_exe_setting                 = value\n",
+        ]
+        self.write("new.ltx", new_lines)
+
+        for saved_settings in (
+            {"a/kept": "1", "b/modpack": "1", "c/user": "3", "d/both": "3", "e/removed": "1"},
+            {"d/both": "3", "a/kept": "1", "e/removed": "1", "c/user": "3", "b/modpack": "1"},
+        ):
+            with self.subTest(saved_settings=saved_settings):
+                self.write("saved.ltx", saved_settings)
+                ThreeWayMerge(self.old_path, self.new_path, self.saved_path).write(self.output_path)
+
+                expected = list(new_lines)
+                expected[expected.index("        c/user                           = 1\n")] = (
+                    "        c/user                           = 3\n"
+                )
+                expected[expected.index("        d/both                           = 2\n")] = (
+                    "        d/both                           = 3\n"
+                )
+                self.assertEqual(self.read_output(), expected)
+
+        # The user removed the setting, its comment stays
+        self.write("saved.ltx", {"a/kept": "1", "b/modpack": "1", "d/both": "3", "e/removed": "1"})
+        ThreeWayMerge(self.old_path, self.new_path, self.saved_path).write(self.output_path)
+        output = self.read_output()
+        self.assertIn("        ; Changed by the user\n", output)
+        self.assertNotIn("        c/user                           = 1\n", output)
+
+    def test_merge_join(self):
+        """Test that merge_join pairs up names of several sorted sources"""
+        rows = list(merge_join([("a", "1", "a1"), ("c", "1", "c1")], [("b", "2", "b2"), ("c", "2", "c2")]))
+
+        self.assertEqual(
+            rows,
+            [
+                ("a", [("a", "1", "a1"), None]),
+                ("b", [None, ("b", "2", "b2")]),
+                ("c", [("c", "1", "c1"), ("c", "2", "c2")]),
+            ],
+        )
+
+    def test_missing_section(self):
+        """Test that the command fails without an [mcm] section and leaves no output"""
+        self.write("saved.ltx", ["[character_creation]\n"])
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            result = mcm_manager.main(
+                ["three-way", self.old_path, self.new_path, self.saved_path, "--output", self.output_path]
+            )
+
+        self.assertEqual(result, 1)
+        self.assertIn("Could not merge", output.getvalue())
+        self.assertFalse(os.path.exists(self.output_path))
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ["new.ltx", "old.ltx", "saved.ltx"])
+
+    def test_command_writes_report(self):
+        """Test the three-way command with a report file"""
+        report_path = os.path.join(self.temp_dir.name, "report.json")
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            result = mcm_manager.main(
+                ["three-way", self.old_path, self.new_path, self.saved_path, "--output", self.output_path,
+                 "--report", report_path]
+            )
+
+        self.assertEqual(result, 0)
+        self.assertIn("1 conflicts", output.getvalue())
+        with open(report_path, "r") as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["user_changes"], ["c/user"])
+        self.assertEqual(report["conflicts"][0]["name"], "d/both")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,47 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from classes.setting import Setting
+from classes.typed_values import BOOL, FLOAT, INT, TEXT, ValueColumn, changed_rows, json_value, parse_value
+
+
+class TestTypedValues(unittest.TestCase):
+    def test_parse_value(self):
+        """Test that values are classified, and numbers that don't fit a double stay text"""
+        self.assertEqual(parse_value("true"), (BOOL, True))
+        self.assertEqual(parse_value("false"), (BOOL, False))
+        self.assertEqual(parse_value("-12"), (INT, -12))
+        self.assertEqual(parse_value("0.8"), (FLOAT, 0.8))
+        self.assertEqual(parse_value("-2.5"), (FLOAT, -2.5))
+        self.assertEqual(parse_value("1e+16"), (FLOAT, 1e16))
+        self.assertEqual(parse_value("0.80"), (FLOAT, 0.8))
+        self.assertEqual(parse_value(".5"), (FLOAT, 0.5))
+        self.assertEqual(parse_value("1e3"), (FLOAT, 1000.0))
+        self.assertEqual(parse_value("-0"), (INT, 0))
+        for text in ["", "True", "007", "+1", "1,0,0", "nan", "inf", "DIK_F1", "9007199254740993", "1e999", "-1e999"]:
+            self.assertEqual(parse_value(text), (TEXT, text))
+
+    def test_json_value(self):
+        """Test that every value is written back as the same text, numbers that wouldn't be as their text"""
+        self.assertEqual(json_value("true", *parse_value("true")), True)
+        self.assertEqual(json_value("-12", *parse_value("-12")), -12)
+        self.assertEqual(json_value("0.8", *parse_value("0.8")), 0.8)
+        for text in ["true", "-12", "0.8", "1.0", "1e+16", "DIK_F1", ""]:
+            self.assertEqual(Setting("name", json_value(text, *parse_value(text))).format_value(), text)
+        for text in ["0.80", ".5", "1e3", "-0", "1.00", "1e999", "0.1000000000000000055511151231257827"]:
+            self.assertEqual(json_value(text, *parse_value(text)), text)
+
+    def test_changed_rows(self):
+        """Test that numbers are compared by value within tolerance and other values by kind and value"""
+        default = ValueColumn(["0.8", "1", "true", "1", "abc", "2.0", "10", "0.8"])
+        user = ValueColumn(["0.8", "1.0", "false", "true", "abc", "2.05", "11", "0.80"])
+
+        self.assertEqual(changed_rows(default, user), [False, False, True, True, False, True, True, False])
+        self.assertEqual(changed_rows(default, user, 0.1), [False, False, True, True, False, False, True, False])
+        self.assertEqual(len(default), 8)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)